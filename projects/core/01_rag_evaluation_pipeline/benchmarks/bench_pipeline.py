@@ -0,0 +1,229 @@
+"""
+RAG Evaluation Pipeline - Overhead Benchmarks
+
+Times the pipeline's own code (not the RAG system or the judge) on
+synthetic datasets, so regressions in evaluation overhead show up
+before release.
+
+Usage:
+    python bench_pipeline.py                          # 1k, 10k, 100k
+    python bench_pipeline.py --sizes 1000 --repeat 5
+    python bench_pipeline.py --save results/main.json
+    python bench_pipeline.py --compare results/main.json --tolerance 0.25
+
+With --compare the script exits non-zero if any benchmark's median time
+is slower than the baseline by more than the tolerance.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import statistics
+import tempfile
+from typing import Callable
+
+import numpy as np
+import yaml
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../reference')))
+
+import rag_eval_pipeline as eval_pipe
+
+
+CATEGORIES = [
+    'simple_factual', 'how_to', 'troubleshooting',
+    'comparison', 'complex', 'out_of_scope', 'ambiguous'
+]
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+
+
+# =============================================================================
+# SYNTHETIC DATA
+# =============================================================================
+
+def make_examples(n: int, seed: int = 0) -> list[dict]:
+    """Golden-dataset examples with 1-3 relevant chunks each."""
+    rng = random.Random(seed)
+    examples = []
+    for i in range(n):
+        chunk_ids = [f"doc{i % 500}_chunk{rng.randrange(50)}" for _ in range(rng.randint(1, 3))]
+        examples.append({
+            'id': f"ex-{i:07d}",
+            'query': f"How do I configure feature {i % 97} for workspace {i}?",
+            'category': CATEGORIES[i % len(CATEGORIES)],
+            'reference_answer': f"Open settings, choose feature {i % 97} and save.",
+            'relevant_documents': [{'doc_id': f"doc{i % 500}", 'chunk_ids': chunk_ids}]
+        })
+    return examples
+
+
+def make_results(n: int, seed: int = 0) -> tuple[list[dict], list[float]]:
+    """Per-example result records in the shape run_evaluation produces."""
+    rng = random.Random(seed)
+    results, latencies = [], []
+    for i in range(n):
+        latency = rng.lognormvariate(7.0, 0.4)
+        latencies.append(latency)
+        results.append({
+            'id': f"ex-{i:07d}",
+            'category': CATEGORIES[i % len(CATEGORIES)],
+            'retrieval': {
+                'precision': rng.random(),
+                'recall': rng.random(),
+                'mrr': rng.random()
+            },
+            'generation': {c: rng.uniform(1, 5) for c in eval_pipe.JUDGE_CRITERIA + ('overall',)},
+            'latency_ms': latency
+        })
+    return results, latencies
+
+
+class NoOpRAG:
+    """RAG system that returns a fixed answer instantly."""
+
+    def query(self, query: str, top_k: int = 5) -> eval_pipe.RAGResult:
+        ids = [f"doc0_chunk{i}" for i in range(top_k)]
+        return eval_pipe.RAGResult(
+            query=query,
+            retrieval=eval_pipe.RetrievalResult(ids, ["chunk"] * top_k, [1.0] * top_k, 0.0),
+            generation=eval_pipe.GenerationResult("answer", 0, 0, 0.0),
+            total_latency_ms=0.0
+        )
+
+
+class NoOpJudge(eval_pipe.JudgeBackend):
+    """Judge that returns a constant, valid verdict."""
+
+    VERDICT = json.dumps({c: 4 for c in eval_pipe.JUDGE_CRITERIA} | {'reasoning': 'noop'})
+
+    def complete(self, request: eval_pipe.JudgeRequest) -> str:
+        return self.VERDICT
+
+
+# =============================================================================
+# BENCHMARKS
+# =============================================================================
+
+def _timeit(fn: Callable[[], object], repeat: int) -> dict:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return {
+        'median_s': statistics.median(times),
+        'min_s': min(times),
+        'repeat': repeat
+    }
+
+
+def run_benchmarks(sizes: list[int], repeat: int, workdir: str) -> dict:
+    """Run every benchmark at every size. Returns {'name[size]': timing}."""
+    timings = {}
+
+    for n in sizes:
+        # Large sizes are dominated by a single run; fewer repeats keep it practical
+        reps = max(1, repeat if n < 100_000 else repeat // 3)
+        examples = make_examples(n)
+        results, latencies = make_results(n)
+        config = eval_pipe.EvalConfig(golden_dataset_path=os.path.join(workdir, f"golden_{n}.yaml"))
+        with open(config.golden_dataset_path, 'w') as f:
+            yaml.safe_dump({'examples': examples}, f)
+
+        retrieved = [[f"doc{i % 500}_chunk{j}" for j in range(5)] for i in range(n)]
+        relevant = [
+            [cid for doc in ex['relevant_documents'] for cid in doc['chunk_ids']]
+            for ex in examples
+        ]
+
+        current = eval_pipe.aggregate_results(results, latencies, config)
+        baseline = eval_pipe.aggregate_results(*make_results(n, seed=1), config)
+
+        cases = {
+            'evaluate_retrieval': lambda: [
+                eval_pipe.evaluate_retrieval(r, rel) for r, rel in zip(retrieved, relevant)
+            ],
+            'aggregate_results': lambda: eval_pipe.aggregate_results(results, latencies, config),
+            'detect_drift': lambda: eval_pipe.detect_drift(current, baseline),
+            'diff_results': lambda: eval_pipe.diff_results(current, baseline),
+            'generate_report_markdown': lambda: eval_pipe.generate_report(current, 'markdown'),
+            'generate_report_json': lambda: eval_pipe.generate_report(current, 'json'),
+            'load_golden_dataset': lambda: eval_pipe.load_golden_dataset(config.golden_dataset_path),
+            'run_evaluation_noop': lambda: eval_pipe.run_evaluation(NoOpRAG(), config, backend=NoOpJudge()),
+        }
+
+        for name, fn in cases.items():
+            timing = _timeit(fn, reps)
+            timing['per_example_us'] = timing['median_s'] / n * 1e6
+            timings[f"{name}[{n}]"] = timing
+            print(f"{name:<28} n={n:<8} median={timing['median_s'] * 1000:10.2f}ms "
+                  f"({timing['per_example_us']:.2f}us/example)")
+
+    return timings
+
+
+def compare(timings: dict, baseline: dict, tolerance: float) -> list[dict]:
+    """Return benchmarks that are slower than baseline by more than tolerance."""
+    regressions = []
+    for name, timing in timings.items():
+        if name not in baseline:
+            continue
+        before = baseline[name]['median_s']
+        after = timing['median_s']
+        if before > 0 and (after - before) / before > tolerance:
+            regressions.append({
+                'benchmark': name,
+                'baseline_s': before,
+                'current_s': after,
+                'change': (after - before) / before
+            })
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--save', help="Write timings to this JSON file")
+    parser.add_argument('--compare', help="Baseline JSON file to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="Allowed slowdown before flagging a regression (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        timings = run_benchmarks(args.sizes, args.repeat, workdir)
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, 'w') as f:
+            json.dump({
+                'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'python': platform.python_version(),
+                'numpy': np.__version__,
+                'machine': platform.machine(),
+                'timings': timings
+            }, f, indent=2)
+        print(f"\nSaved results to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['timings']
+        regressions = compare(timings, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) over {args.tolerance:.0%}:")
+            for r in regressions:
+                print(f"  {r['benchmark']}: {r['baseline_s'] * 1000:.2f}ms -> "
+                      f"{r['current_s'] * 1000:.2f}ms ({r['change']:+.0%})")
+            return 1
+        print(f"\nNo regressions over {args.tolerance:.0%}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
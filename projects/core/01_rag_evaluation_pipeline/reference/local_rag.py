@@ -0,0 +1,281 @@
+"""
+Local RAG System - Offline Reference for Benchmarks
+
+A small, dependency-light RAG system that runs entirely in-process:
+hashed bag-of-words embeddings, an exact or IVF vector index, and a
+templated extractive generator. It is NOT a good RAG system; it exists
+so run_evaluation can be exercised and load-tested end to end on a
+machine with no network and no API keys.
+
+Requirements:
+    pip install numpy pyyaml
+"""
+
+import os
+import re
+import json
+import time
+from pathlib import Path
+from typing import Optional, Union
+import numpy as np
+
+from rag_eval_pipeline import (
+    RetrievalResult, GenerationResult, RAGResult, HashingEmbedder, tokenize
+)
+
+
+# =============================================================================
+# TOKENS
+# =============================================================================
+
+def count_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token)."""
+    return max(1, len(text) // 4)
+
+
+# =============================================================================
+# VECTOR INDEXES
+# =============================================================================
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first, ties broken by lower index."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < len(scores):
+        # Keep every score tied with the k-th best so tie-breaking is deterministic
+        kth = scores[np.argpartition(-scores, k - 1)[k - 1]]
+        candidates = np.flatnonzero(scores >= kth)
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind='stable')][:k]
+
+
+class ExactIndex:
+    """Brute-force inner-product search over a dense matrix."""
+    
+    def __init__(self):
+        self.ids: list[str] = []
+        self.vectors = np.empty((0, 0), dtype=np.float32)
+    
+    def add(self, ids: list[str], vectors: np.ndarray):
+        self.ids.extend(ids)
+        self.vectors = vectors if self.vectors.size == 0 else np.vstack([self.vectors, vectors])
+    
+    def search(self, query: np.ndarray, k: int) -> tuple[list[str], list[float]]:
+        if not self.ids:
+            return [], []
+        scores = self.vectors @ query
+        top = _top_k(scores, k)
+        return [self.ids[i] for i in top], scores[top].tolist()
+    
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+class IVFIndex:
+    """
+    Inverted-file approximate index.
+    
+    Vectors are clustered with spherical k-means into `n_lists` cells;
+    a query scans only the `n_probe` cells with the closest centroids.
+    Recall vs speed is tuned with n_probe (n_probe == n_lists is exact).
+    """
+    
+    def __init__(self, n_lists: Optional[int] = None, n_probe: int = 4,
+                 iterations: int = 10, seed: int = 0):
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.iterations = iterations
+        self.seed = seed
+        self.ids: list[str] = []
+        self.vectors = np.empty((0, 0), dtype=np.float32)
+        self.centroids: Optional[np.ndarray] = None
+        self.lists: list[np.ndarray] = []
+        self._dirty = True
+    
+    def add(self, ids: list[str], vectors: np.ndarray):
+        self.ids.extend(ids)
+        self.vectors = vectors if self.vectors.size == 0 else np.vstack([self.vectors, vectors])
+        self._dirty = True
+    
+    def build(self):
+        """Cluster the vectors and build the inverted lists."""
+        n = len(self.ids)
+        n_lists = min(self.n_lists or max(1, int(np.sqrt(n))), n)
+        rng = np.random.default_rng(self.seed)
+        centroids = self.vectors[rng.choice(n, size=n_lists, replace=False)].copy()
+        
+        for _ in range(self.iterations):
+            assignment = np.argmax(self.vectors @ centroids.T, axis=1)
+            for c in range(n_lists):
+                members = self.vectors[assignment == c]
+                if len(members):
+                    centroid = members.sum(axis=0)
+                    norm = np.linalg.norm(centroid)
+                    centroids[c] = centroid / norm if norm else centroid
+        
+        assignment = np.argmax(self.vectors @ centroids.T, axis=1)
+        self.centroids = centroids
+        self.lists = [np.flatnonzero(assignment == c) for c in range(n_lists)]
+        self._dirty = False
+    
+    def search(self, query: np.ndarray, k: int) -> tuple[list[str], list[float]]:
+        if not self.ids:
+            return [], []
+        if self._dirty:
+            self.build()
+        probe = _top_k(self.centroids @ query, self.n_probe)
+        candidates = np.sort(np.concatenate([self.lists[c] for c in probe]))
+        scores = self.vectors[candidates] @ query
+        top = _top_k(scores, k)
+        return [self.ids[i] for i in candidates[top]], scores[top].tolist()
+    
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+# =============================================================================
+# GENERATION
+# =============================================================================
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+class TemplateGenerator:
+    """
+    Extractive answer generator.
+    
+    Picks the retrieved sentences with the most word overlap with the
+    query and wraps them in a fixed template.
+    """
+    
+    NO_ANSWER = "I don't have information about that in the documentation."
+    
+    def __init__(self, max_sentences: int = 2):
+        self.max_sentences = max_sentences
+    
+    def generate(self, query: str, chunks: list[str]) -> str:
+        query_words = set(tokenize(query))
+        scored = []
+        for rank, chunk in enumerate(chunks):
+            for sentence in _SENTENCE_RE.split(chunk.strip()):
+                overlap = len(query_words & set(tokenize(sentence)))
+                if overlap:
+                    scored.append((-overlap, rank, sentence))
+        if not scored:
+            return self.NO_ANSWER
+        best = [sentence for _, _, sentence in sorted(scored)[:self.max_sentences]]
+        return "Based on the documentation: " + " ".join(best)
+
+
+# =============================================================================
+# LOCAL RAG SYSTEM
+# =============================================================================
+
+class LocalRAGSystem:
+    """
+    Offline RAG system with .retrieve(), .generate() and .query().
+    
+    Usage:
+        rag = LocalRAGSystem.from_directory("docs/", index="ivf")
+        results = run_evaluation(rag, config, backend=HeuristicJudge())
+    """
+    
+    def __init__(
+        self,
+        corpus: dict[str, str],
+        index: str = "exact",
+        embedder: Optional[HashingEmbedder] = None,
+        generator: Optional[TemplateGenerator] = None,
+        simulated_generation_ms: float = 0.0,
+        **index_kwargs
+    ):
+        """
+        Args:
+            corpus: Mapping of chunk ID to chunk text
+            index: "exact" (brute force) or "ivf" (approximate)
+            embedder: Embedder to use (defaults to HashingEmbedder)
+            generator: Answer generator (defaults to TemplateGenerator)
+            simulated_generation_ms: Extra sleep per generation, to mimic
+                an LLM's latency in load tests
+            **index_kwargs: Passed to IVFIndex (n_lists, n_probe, ...)
+        """
+        if index == "exact":
+            self.index = ExactIndex()
+        elif index == "ivf":
+            self.index = IVFIndex(**index_kwargs)
+        else:
+            raise ValueError(f"Unknown index type: {index}")
+        
+        self.embedder = embedder or HashingEmbedder()
+        self.generator = generator or TemplateGenerator()
+        self.simulated_generation_ms = simulated_generation_ms
+        self.chunks = dict(corpus)
+        
+        ids = list(self.chunks)
+        if ids:
+            self.index.add(ids, self.embedder.embed([self.chunks[i] for i in ids]))
+            if isinstance(self.index, IVFIndex):
+                self.index.build()
+    
+    @classmethod
+    def from_directory(cls, path: Union[str, Path], **kwargs) -> "LocalRAGSystem":
+        """
+        Build from a directory of .md/.txt files.
+        
+        Each file is split on blank lines; chunk IDs are `<stem>_<NNN>`
+        (e.g. `import_001`), matching the golden dataset guidelines.
+        """
+        corpus = {}
+        for file in sorted(Path(path).rglob("*")):
+            if file.suffix not in (".md", ".txt"):
+                continue
+            paragraphs = [p.strip() for p in re.split(r"\n\s*\n", file.read_text()) if p.strip()]
+            for n, paragraph in enumerate(paragraphs, 1):
+                corpus[f"{file.stem}_{n:03d}"] = paragraph
+        return cls(corpus, **kwargs)
+    
+    @classmethod
+    def from_jsonl(cls, path: Union[str, os.PathLike], **kwargs) -> "LocalRAGSystem":
+        """Build from a JSONL file with one {"id": ..., "text": ...} per line."""
+        corpus = {}
+        with open(path, 'r') as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    corpus[record['id']] = record['text']
+        return cls(corpus, **kwargs)
+    
+    def retrieve(self, query: str, top_k: int = 5) -> RetrievalResult:
+        start = time.perf_counter()
+        ids, scores = self.index.search(self.embedder.embed([query])[0], top_k)
+        return RetrievalResult(
+            chunk_ids=ids,
+            chunks=[self.chunks[i] for i in ids],
+            scores=scores,
+            latency_ms=(time.perf_counter() - start) * 1000
+        )
+    
+    def generate(self, query: str, retrieval: RetrievalResult) -> GenerationResult:
+        start = time.perf_counter()
+        answer = self.generator.generate(query, retrieval.chunks)
+        if self.simulated_generation_ms:
+            time.sleep(self.simulated_generation_ms / 1000)
+        return GenerationResult(
+            answer=answer,
+            input_tokens=count_tokens(query) + sum(count_tokens(c) for c in retrieval.chunks),
+            output_tokens=count_tokens(answer),
+            latency_ms=(time.perf_counter() - start) * 1000
+        )
+    
+    def query(self, query: str, top_k: int = 5) -> RAGResult:
+        start = time.perf_counter()
+        retrieval = self.retrieve(query, top_k)
+        generation = self.generate(query, retrieval)
+        return RAGResult(
+            query=query,
+            retrieval=retrieval,
+            generation=generation,
+            total_latency_ms=(time.perf_counter() - start) * 1000
+        )
@@ -0,0 +1,376 @@
+"""
+Online Evaluation - Sampling Production Traffic
+
+Tails JSONL request/response logs, samples a configurable fraction of
+traffic per category, scores the samples in a bounded worker pool and
+emits rolling EvalResults windows that detect_drift() can compare with
+the offline (golden dataset) baseline.
+
+Expected log record (one JSON object per line):
+    {
+        "timestamp": 1735689600.0,          # epoch seconds or ISO 8601
+        "request_id": "req-123",
+        "category": "how_to",               # optional, default "unknown"
+        "query": "...",
+        "response": "...",
+        "chunk_ids": ["auth_001", ...],
+        "chunks": ["...", ...],
+        "latency_ms": 812.5,
+        "relevant_chunk_ids": [...],        # optional (rarely known in prod)
+        "reference_answer": "..."           # optional
+    }
+
+Requirements:
+    pip install numpy pyyaml
+"""
+
+import os
+import json
+import time
+import random
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Iterator, Optional
+
+from rag_eval_pipeline import (
+    EvalConfig, EvalResults, RetrievalMetrics, JudgeBackend, JudgeParseError,
+    JudgeBackendError, GroundednessChecker, evaluate_retrieval, evaluate_generation,
+    aggregate_results, detect_drift, make_result_record, unscored_generation
+)
+
+logger = logging.getLogger(__name__)
+
+
+# =============================================================================
+# LOG TAILING
+# =============================================================================
+
+def tail_jsonl(
+    path: str,
+    stop: Optional[threading.Event] = None,
+    poll_interval: float = 0.5,
+    from_start: bool = False
+) -> Iterator[dict]:
+    """
+    Follow a JSONL log like `tail -F`, yielding parsed records.
+    
+    Partial trailing lines are buffered until complete. If the file is
+    rotated or truncated, reading restarts from the top of the new file.
+    Malformed lines are skipped.
+    """
+    stop = stop or threading.Event()
+    f = None
+    inode = None
+    buffer = ""
+    
+    while not stop.is_set():
+        if f is None:
+            try:
+                f = open(path, 'r')
+            except FileNotFoundError:
+                stop.wait(poll_interval)
+                continue
+            inode = os.fstat(f.fileno()).st_ino
+            if not from_start:
+                f.seek(0, os.SEEK_END)
+            from_start = True  # Files that appear later are read in full
+        
+        chunk = f.read()
+        if chunk:
+            buffer += chunk
+            *lines, buffer = buffer.split("\n")
+            for line in lines:
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+            continue
+        
+        # No new data: check for rotation or truncation
+        try:
+            stat = os.stat(path)
+            if stat.st_ino != inode or stat.st_size < f.tell():
+                f.close()
+                f, buffer = None, ""
+                continue
+        except FileNotFoundError:
+            pass
+        stop.wait(poll_interval)
+    
+    if f is not None:
+        f.close()
+
+
+def _record_time(record: dict) -> float:
+    value = record.get('timestamp')
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+        except ValueError:
+            pass
+    return time.time()
+
+
+# =============================================================================
+# SAMPLING
+# =============================================================================
+
+class CategoryReservoir:
+    """
+    Per-category sampling for one window.
+    
+    Each record is first kept with its category's sample rate; kept
+    records go into a fixed-size reservoir (Algorithm R) per category, so
+    a traffic spike in one category cannot blow up scoring cost.
+    """
+    
+    def __init__(self, sample_rates: dict, default_rate: float,
+                 max_per_category: int, rng: random.Random):
+        self.sample_rates = sample_rates
+        self.default_rate = default_rate
+        self.max_per_category = max_per_category
+        self.rng = rng
+        self.seen: dict = {}
+        self.candidates: dict = {}
+        self.samples: dict = {}
+    
+    def offer(self, record: dict) -> bool:
+        """Offer a record; returns True if it is (currently) in the sample."""
+        category = record.get('category', 'unknown')
+        self.seen[category] = self.seen.get(category, 0) + 1
+        if self.rng.random() >= self.sample_rates.get(category, self.default_rate):
+            return False
+        
+        n = self.candidates[category] = self.candidates.get(category, 0) + 1
+        reservoir = self.samples.setdefault(category, [])
+        if n <= self.max_per_category:
+            reservoir.append(record)
+            return True
+        slot = self.rng.randrange(n)
+        if slot < self.max_per_category:
+            reservoir[slot] = record
+            return True
+        return False
+    
+    def records(self) -> list[dict]:
+        return [record for reservoir in self.samples.values() for record in reservoir]
+
+
+# =============================================================================
+# ONLINE EVALUATOR
+# =============================================================================
+
+class OnlineEvaluator:
+    """
+    Continuous evaluation over sampled production traffic.
+    
+    Usage:
+        evaluator = OnlineEvaluator(config, backend=OpenAICompatibleJudge(),
+                                    default_rate=0.01, window_seconds=3600)
+        evaluator.run("logs/rag_requests.jsonl", stop_event)
+        drift = evaluator.compare_to_baseline(offline_results)
+    
+    A sampled record that can't be scored (e.g. "latency_ms": null) is
+    left out of its window and counted in record_failures and the
+    window's system['sampling']['failed']. A window that can't be
+    finalized is logged and kept in failed_windows instead of vanishing.
+    """
+    
+    def __init__(
+        self,
+        config: EvalConfig,
+        backend: Optional[JudgeBackend] = None,
+        groundedness_checker: Optional[GroundednessChecker] = None,
+        sample_rates: Optional[dict] = None,
+        default_rate: float = 0.01,
+        max_per_category: int = 200,
+        window_seconds: float = 3600.0,
+        max_workers: int = 8,
+        max_pending_windows: int = 2,
+        history: int = 24,
+        on_window: Optional[Callable[[EvalResults], None]] = None,
+        seed: Optional[int] = None
+    ):
+        self.config = config
+        self.backend = backend
+        self.groundedness_checker = groundedness_checker
+        self.sample_rates = sample_rates or {}
+        self.default_rate = default_rate
+        self.max_per_category = max_per_category
+        self.window_seconds = window_seconds
+        self.on_window = on_window
+        self.windows: deque = deque(maxlen=history)
+        self.failed_windows: deque = deque(maxlen=history)  # {window_start, window_end, error}
+        self.record_failures = 0
+        
+        self._rng = random.Random(seed)
+        self._pool = ThreadPoolExecutor(max_workers=max_workers)
+        self._pending = threading.BoundedSemaphore(max_pending_windows)
+        self._finalizers: list = []
+        self._lock = threading.Lock()
+        self._window_start: Optional[float] = None
+        self._reservoir = self._new_reservoir()
+    
+    def _new_reservoir(self) -> CategoryReservoir:
+        return CategoryReservoir(self.sample_rates, self.default_rate,
+                                 self.max_per_category, self._rng)
+    
+    # -------------------------------------------------------------------------
+    # Ingestion
+    # -------------------------------------------------------------------------
+    
+    def process_record(self, record: dict):
+        """Feed one log record; closes the window when its time is up."""
+        ts = _record_time(record)
+        if self._window_start is None:
+            self._window_start = ts
+        elif ts >= self._window_start + self.window_seconds:
+            self._close_window()
+            self._window_start = ts
+        self._reservoir.offer(record)
+    
+    def run(self, path: str, stop: Optional[threading.Event] = None,
+            from_start: bool = False, poll_interval: float = 0.5):
+        """Tail a JSONL log until stop is set, then flush the last window."""
+        for record in tail_jsonl(path, stop, poll_interval, from_start):
+            self.process_record(record)
+        self.flush()
+    
+    def flush(self):
+        """Close the current window and wait for all scoring to finish."""
+        self._close_window()
+        for finalizer in list(self._finalizers):
+            finalizer.join()
+        self._finalizers.clear()
+    
+    def close(self):
+        self.flush()
+        self._pool.shutdown()
+    
+    # -------------------------------------------------------------------------
+    # Scoring
+    # -------------------------------------------------------------------------
+    
+    def _close_window(self):
+        records = self._reservoir.records()
+        seen = dict(self._reservoir.seen)
+        window = (self._window_start, self._window_start + self.window_seconds
+                  if self._window_start is not None else None)
+        self._reservoir = self._new_reservoir()
+        if not records:
+            return
+        
+        # Backpressure: block ingestion if scoring falls too far behind
+        self._pending.acquire()
+        previous = self._finalizers[-1] if self._finalizers else None
+        finalizer = threading.Thread(
+            target=self._finalize_window, args=(records, seen, window, previous), daemon=True
+        )
+        self._finalizers = [t for t in self._finalizers if t.is_alive()] + [finalizer]
+        finalizer.start()
+    
+    def _finalize_window(self, records: list[dict], seen: dict, window: tuple,
+                         previous: Optional[threading.Thread]):
+        try:
+            results = [r for r in self._pool.map(self._score_or_skip, records) if r is not None]
+            failed = len(records) - len(results)
+            if not results:
+                raise ValueError(f"none of the {len(records)} sampled records could be scored")
+            latencies = [r['latency_ms'] for r in results]
+            evaluation = aggregate_results(results, latencies, self.config)
+            evaluation.config['source'] = 'online'
+            evaluation.system['sampling'] = {
+                'window_start': window[0],
+                'window_end': window[1],
+                'seen': seen,
+                'sampled': len(records),
+                'failed': failed
+            }
+            if previous is not None:
+                previous.join()  # Publish windows in time order
+            with self._lock:
+                self.windows.append(evaluation)
+            if self.on_window:
+                self.on_window(evaluation)
+        except Exception as e:
+            logger.exception("online evaluation window %s-%s failed", window[0], window[1])
+            with self._lock:
+                self.failed_windows.append({
+                    'window_start': window[0],
+                    'window_end': window[1],
+                    'error': f"{type(e).__name__}: {e}"
+                })
+        finally:
+            self._pending.release()
+    
+    def _score_or_skip(self, record: dict) -> Optional[dict]:
+        """_score_record(), or None (counted and logged) if the record is malformed."""
+        try:
+            return self._score_record(record)
+        except Exception:
+            logger.warning("skipping unscorable record %r", record.get('request_id'), exc_info=True)
+            with self._lock:
+                self.record_failures += 1
+            return None
+    
+    def _score_record(self, record: dict) -> dict:
+        latency_ms = float(record.get('latency_ms', 0.0))  # Malformed values fail before judging
+        chunk_ids = record.get('chunk_ids', [])
+        chunks = record.get('chunks', [])
+        response = record.get('response', '')
+        
+        if 'relevant_chunk_ids' in record:
+            retrieval_metrics = evaluate_retrieval(chunk_ids, record['relevant_chunk_ids'])
+        else:
+            nan = float('nan')
+            retrieval_metrics = RetrievalMetrics(nan, nan, nan, len(chunk_ids), 0)
+        
+        try:
+            generation_metrics = evaluate_generation(
+                query=record.get('query', ''),
+                context="\n".join(chunks),
+                response=response,
+                reference=record.get('reference_answer', ''),
+                evaluator_model=self.config.evaluator_model,
+                backend=self.backend,
+                max_parse_retries=self.config.judge_max_parse_retries
+            )
+        except (JudgeParseError, JudgeBackendError) as e:
+            generation_metrics = unscored_generation(f"Judge failed: {e}")
+        
+        result = make_result_record(
+            record.get('request_id', ''), record.get('category', 'unknown'),
+            retrieval_metrics, generation_metrics, latency_ms
+        )
+        if self.groundedness_checker is not None:
+            with self._lock:  # The n-gram index is not safe for concurrent use
+                self.groundedness_checker.index_chunks(chunk_ids, chunks)
+                grounding = self.groundedness_checker.check(response, chunk_ids)
+            result['grounding'] = {
+                'score': grounding.score,
+                'mean_support': grounding.mean_support,
+                'claims': [
+                    {'claim': c.claim, 'support': c.support, 'chunk_id': c.chunk_id}
+                    for c in grounding.claims
+                ]
+            }
+        return result
+    
+    # -------------------------------------------------------------------------
+    # Drift
+    # -------------------------------------------------------------------------
+    
+    def latest(self) -> Optional[EvalResults]:
+        with self._lock:
+            return self.windows[-1] if self.windows else None
+    
+    def compare_to_baseline(self, baseline: EvalResults, threshold: float = 0.1) -> Optional[dict]:
+        """detect_drift() of the most recent window against an offline baseline."""
+        current = self.latest()
+        return detect_drift(current, baseline, threshold) if current else None
@@ -11,11 +11,30 @@ Requirements:
 """
 
 import os
+import sys
+import re
 import json
+import math
+import queue
+import random
+import select
+import threading
+import http.client
+import urllib.parse
+import email.utils
+import zlib
+import hashlib
+import heapq
+import contextlib
+import contextvars
+import functools
 import yaml
 import time
-from dataclasses import dataclass
-from typing import Optional
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict, field
+from typing import Callable, Optional
 import numpy as np
 
 # Optional: uncomment if you have these installed
@@ -76,6 +95,307 @@ class GenerationMetrics:
     reasoning: str
 
 
+# =============================================================================
+# TRACING AND PROFILING
+# =============================================================================
+
+@dataclass
+class Span:
+    """One timed operation, exportable as an OpenTelemetry (OTLP JSON) span."""
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    start_ns: int
+    end_ns: int = 0
+    attributes: dict = field(default_factory=dict)
+    error: Optional[str] = None
+    
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+    
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+    
+    def to_otel(self) -> dict:
+        def value(v):
+            if isinstance(v, bool):
+                return {'boolValue': v}
+            if isinstance(v, int):
+                return {'intValue': str(v)}
+            if isinstance(v, float):
+                return {'doubleValue': v}
+            return {'stringValue': str(v)}
+        
+        span = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': 1,  # SPAN_KIND_INTERNAL
+            'startTimeUnixNano': str(self.start_ns),
+            'endTimeUnixNano': str(self.end_ns),
+            'attributes': [{'key': k, 'value': value(v)} for k, v in self.attributes.items()],
+            'status': {'code': 2, 'message': self.error} if self.error else {'code': 1}
+        }
+        if self.parent_id:
+            span['parentSpanId'] = self.parent_id
+        return span
+
+
+class InMemorySpanExporter:
+    """Keeps finished spans in a list (tests, notebooks)."""
+    
+    def __init__(self):
+        self.spans: list[Span] = []
+    
+    def export(self, spans: list[Span]):
+        self.spans.extend(spans)
+
+
+class JSONFileSpanExporter:
+    """
+    Appends spans to a file as OTLP JSON, one ExportTraceServiceRequest
+    per line (the OpenTelemetry Collector file exporter format), so the
+    file can be replayed into any OTLP-compatible backend.
+    """
+    
+    def __init__(self, path: str, service_name: str = "rag-eval-pipeline"):
+        self.path = path
+        self.service_name = service_name
+    
+    def export(self, spans: list[Span]):
+        if not spans:
+            return
+        payload = {'resourceSpans': [{
+            'resource': {'attributes': [
+                {'key': 'service.name', 'value': {'stringValue': self.service_name}}
+            ]},
+            'scopeSpans': [{
+                'scope': {'name': 'rag_eval_pipeline'},
+                'spans': [s.to_otel() for s in spans]
+            }]
+        }]}
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(payload) + "\n")
+
+
+class SamplingProfiler:
+    """
+    Low-overhead statistical profiler.
+    
+    A background thread samples every thread's current stack each
+    `interval` seconds and counts the innermost frames, so hot spots show
+    up without cProfile's per-call overhead.
+    """
+    
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples: dict = {}
+        self.total = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+    
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                code = frame.f_code
+                key = f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+                self.samples[key] = self.samples.get(key, 0) + 1
+                self.total += 1
+    
+    def top(self, n: int = 10) -> list[dict]:
+        """Most sampled frames: [{'frame', 'samples', 'share'}]."""
+        ranked = heapq.nlargest(n, self.samples.items(), key=lambda item: item[1])
+        return [
+            {'frame': frame, 'samples': count, 'share': count / self.total}
+            for frame, count in ranked
+        ]
+
+
+_CURRENT_SPAN: contextvars.ContextVar = contextvars.ContextVar('current_span', default=None)
+
+
+class Tracer:
+    """
+    Records nested spans and exports them in batches.
+    
+    Instrumented pipeline functions trace into the active tracer; with
+    none active they use a no-op tracer. The active tracer and the span
+    stack are context variables, so concurrent runs in different threads
+    each keep their own, and both follow the caller into worker threads
+    started with contextvars.copy_context().
+    
+    Usage:
+        with Tracer(JSONFileSpanExporter("spans.jsonl"), profile=True) as tracer:
+            results = run_evaluation(rag, config, backend=backend)
+        print(tracer.stage_summary())
+    """
+    
+    enabled = True
+    
+    def __init__(self, exporter=None, profile: bool = False,
+                 profile_interval: float = 0.005, batch_size: int = 512):
+        self.exporter = exporter if exporter is not None else InMemorySpanExporter()
+        self.profiler = SamplingProfiler(profile_interval) if profile else None
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._pending: list[Span] = []
+        self._stages: dict = {}
+        self._entered = 0
+    
+    def __enter__(self) -> "Tracer":
+        token = _ACTIVE_TRACER.set(self)
+        _TRACER_TOKENS.set(_TRACER_TOKENS.get() + (token,))
+        with self._lock:
+            self._entered += 1
+            start_profiler = self._entered == 1 and self.profiler
+        if start_profiler:
+            self.profiler.start()
+        return self
+    
+    def __exit__(self, *exc):
+        with self._lock:
+            self._entered -= 1
+            stop_profiler = self._entered == 0 and self.profiler
+        if stop_profiler:
+            self.profiler.stop()
+        tokens = _TRACER_TOKENS.get()
+        _TRACER_TOKENS.set(tokens[:-1])
+        _ACTIVE_TRACER.reset(tokens[-1])
+        self.flush()
+    
+    @contextlib.contextmanager
+    def span(self, name: str, **attributes):
+        parent = _CURRENT_SPAN.get()
+        span = Span(
+            name=name,
+            trace_id=parent.trace_id if parent else os.urandom(16).hex(),
+            span_id=os.urandom(8).hex(),
+            parent_id=parent.span_id if parent else None,
+            start_ns=time.time_ns(),
+            attributes=attributes
+        )
+        token = _CURRENT_SPAN.set(span)
+        start = time.perf_counter_ns()
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _CURRENT_SPAN.reset(token)
+            span.end_ns = span.start_ns + (time.perf_counter_ns() - start)
+            self._finish(span)
+    
+    def _finish(self, span: Span):
+        run_stages = _RUN_STAGES.get()
+        with self._lock:
+            for stages in (self._stages, run_stages):
+                if stages is not None:
+                    stage = stages.setdefault(span.name, [0, 0.0, 0.0])
+                    stage[0] += 1
+                    stage[1] += span.duration_ms
+                    stage[2] = max(stage[2], span.duration_ms)
+            self._pending.append(span)
+            batch = None
+            if len(self._pending) >= self.batch_size:
+                batch, self._pending = self._pending, []
+        if batch:
+            self.exporter.export(batch)
+    
+    def flush(self):
+        with self._lock:
+            batch, self._pending = self._pending, []
+        self.exporter.export(batch)
+    
+    def stage_summary(self, stages: Optional[dict] = None) -> dict:
+        """
+        Time by span name: {name: {'count', 'total_ms', 'mean_ms', 'max_ms'}}.
+        
+        Covers everything this tracer has recorded, or only the given
+        stages (as collected by run_stages()).
+        """
+        with self._lock:
+            summary = {
+                name: {'count': count, 'total_ms': total, 'mean_ms': total / count, 'max_ms': longest}
+                for name, (count, total, longest) in (self._stages if stages is None else stages).items()
+            }
+        return summary
+    
+    @staticmethod
+    @contextlib.contextmanager
+    def run_stages():
+        """Collect time by stage for spans finished inside the block (and its workers)."""
+        stages: dict = {}
+        token = _RUN_STAGES.set(stages)
+        try:
+            yield stages
+        finally:
+            _RUN_STAGES.reset(token)
+
+
+class _NoOpSpan:
+    def set_attribute(self, key: str, value):
+        pass
+
+
+class _NoOpTracer:
+    """Tracer used when tracing is off."""
+    
+    enabled = False
+    profiler = None
+    _span = _NoOpSpan()
+    
+    @contextlib.contextmanager
+    def span(self, name: str, **attributes):
+        yield self._span
+
+
+_NOOP_TRACER = _NoOpTracer()
+_ACTIVE_TRACER: contextvars.ContextVar = contextvars.ContextVar('active_tracer', default=_NOOP_TRACER)
+_TRACER_TOKENS: contextvars.ContextVar = contextvars.ContextVar('tracer_tokens', default=())
+_RUN_STAGES: contextvars.ContextVar = contextvars.ContextVar('run_stages', default=None)
+
+
+def set_tracer(tracer) -> object:
+    """Install a tracer in the current context (None disables tracing). Returns the previous one."""
+    previous = _ACTIVE_TRACER.get()
+    _ACTIVE_TRACER.set(tracer or _NOOP_TRACER)
+    return previous
+
+
+def get_tracer():
+    return _ACTIVE_TRACER.get()
+
+
+def traced(name: str):
+    """Decorator: run the function inside a span when a tracer is active."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            tracer = _ACTIVE_TRACER.get()
+            if not tracer.enabled:
+                return fn(*args, **kwargs)
+            with tracer.span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
 # =============================================================================
 # RETRIEVAL EVALUATION
 # =============================================================================
@@ -129,6 +449,514 @@ def evaluate_retrieval(
     )
 
 
+# =============================================================================
+# JUDGE BACKENDS
+# =============================================================================
+
+@dataclass
+class JudgeRequest:
+    """Everything a judge backend may need to score one example."""
+    prompt: str
+    model: str
+    query: str = ""
+    context: str = ""
+    response: str = ""
+    reference: str = ""
+
+
+class JudgeBackendError(Exception):
+    """Raised when a judge backend call fails (transport or HTTP error)."""
+    def __init__(self, message: str, status: Optional[int] = None,
+                 retry_after: Optional[float] = None):
+        self.status = status
+        self.retry_after = retry_after  # Seconds the provider asked us to wait
+        super().__init__(message)
+
+
+class JudgeBackend(ABC):
+    """Base class for judge backends. Returns the judge's raw text."""
+    
+    @abstractmethod
+    def complete(self, request: JudgeRequest) -> str:
+        pass
+    
+    def identity(self) -> str:
+        """
+        Stable name for what produces this backend's verdicts (cached
+        verdicts are keyed on it). Wrappers that only pace, meter, cache
+        or delay calls return their inner backend's identity.
+        """
+        return type(self).__name__
+
+
+class HTTPConnectionPool:
+    """
+    Thread-safe pool of keep-alive connections to a single host.
+    
+    Reusing connections avoids a TCP (and TLS) handshake per judge call.
+    Idle connections the server has already closed are discarded before
+    use. A request is retried on a fresh connection only if sending it on
+    a reused one failed; once sent, it is never replayed (judge calls are
+    POSTs, and a replay after a timeout would double the wait).
+    """
+    
+    def __init__(self, base_url: str, maxsize: int = 16, timeout: float = 60.0):
+        parts = urllib.parse.urlsplit(base_url)
+        if parts.scheme not in ('http', 'https'):
+            raise ValueError(f"Unsupported URL scheme: {base_url}")
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port
+        self.base_path = parts.path.rstrip('/')
+        self.timeout = timeout
+        self._idle = queue.LifoQueue(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self.connections_opened = 0
+    
+    def _new_connection(self) -> http.client.HTTPConnection:
+        with self._lock:
+            self.connections_opened += 1
+        conn_cls = (http.client.HTTPSConnection if self.scheme == 'https'
+                    else http.client.HTTPConnection)
+        return conn_cls(self.host, self.port, timeout=self.timeout)
+    
+    def request(self, method: str, path: str, body: bytes = None,
+                headers: dict = None) -> tuple[int, bytes, dict]:
+        """Send a request on a pooled connection and return (status, body, headers)."""
+        conn, reused = self._checkout()
+        try:
+            try:
+                conn.request(method, self.base_path + path, body=body, headers=headers or {})
+            except ConnectionError:
+                if not reused:
+                    raise
+                # The server closed the keep-alive connection as we wrote to
+                # it, so it never saw the request; send it once on a new one
+                conn.close()
+                conn = self._new_connection()
+                conn.request(method, self.base_path + path, body=body, headers=headers or {})
+            response = conn.getresponse()
+            data = response.read()
+        except BaseException:
+            conn.close()
+            raise
+        
+        if response.will_close:
+            conn.close()
+        else:
+            try:
+                self._idle.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+        return response.status, data, {k.lower(): v for k, v in response.getheaders()}
+    
+    def _checkout(self) -> tuple[http.client.HTTPConnection, bool]:
+        """An idle connection that is still open, or a new one; and whether it was reused."""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return self._new_connection(), False
+            if not _is_dropped(conn):
+                return conn, True
+            conn.close()
+    
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+def parse_retry_after(value: Optional[str], now: Optional[float] = None) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when - (time.time() if now is None else now))
+
+
+def _is_dropped(conn: http.client.HTTPConnection) -> bool:
+    """True if an idle connection was closed by the server (it reads as EOF)."""
+    if conn.sock is None:
+        return True
+    try:
+        readable, _, _ = select.select([conn.sock], [], [], 0)
+    except (OSError, ValueError):
+        return True
+    return bool(readable)
+
+
+_shared_pools: dict = {}
+_shared_pools_lock = threading.Lock()
+
+
+def get_http_pool(base_url: str, **kwargs) -> HTTPConnectionPool:
+    """Return the process-wide connection pool for base_url, creating it once."""
+    with _shared_pools_lock:
+        pool = _shared_pools.get(base_url)
+        if pool is None:
+            pool = _shared_pools[base_url] = HTTPConnectionPool(base_url, **kwargs)
+        return pool
+
+
+class OpenAICompatibleJudge(JudgeBackend):
+    """Judge backed by any OpenAI-compatible /chat/completions endpoint."""
+    
+    def __init__(
+        self,
+        base_url: str = "https://api.openai.com/v1",
+        api_key: Optional[str] = None,
+        temperature: float = 0.0,
+        pool: Optional[HTTPConnectionPool] = None
+    ):
+        self.api_key = api_key or os.environ.get("OPENAI_API_KEY", "")
+        self.temperature = temperature
+        self.pool = pool or get_http_pool(base_url)
+    
+    def complete(self, request: JudgeRequest) -> str:
+        body = json.dumps({
+            "model": request.model,
+            "messages": [{"role": "user", "content": request.prompt}],
+            "temperature": self.temperature
+        }).encode()
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.api_key}",
+            "Connection": "keep-alive"
+        }
+        
+        try:
+            status, data, response_headers = self.pool.request("POST", "/chat/completions", body, headers)
+        except (http.client.HTTPException, OSError) as e:
+            raise JudgeBackendError(f"Judge request failed: {e}")
+        
+        if status >= 400:
+            raise JudgeBackendError(
+                f"Judge endpoint returned {status}: {data[:200]!r}", status=status,
+                retry_after=parse_retry_after(response_headers.get("retry-after"))
+            )
+        
+        try:
+            return json.loads(data)["choices"][0]["message"]["content"]
+        except (ValueError, KeyError, IndexError, TypeError) as e:
+            raise JudgeBackendError(f"Malformed completion payload: {e}", status=status)
+
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def _word_set(text: str) -> set:
+    return set(_WORD_RE.findall(text.lower()))
+
+
+class HeuristicJudge(JudgeBackend):
+    """
+    Deterministic offline judge based on token overlap.
+    
+    Not a substitute for a real judge - it exists so the pipeline can be
+    run and benchmarked without a network or an API key.
+    """
+    
+    def complete(self, request: JudgeRequest) -> str:
+        response = _word_set(request.response)
+        
+        def coverage(source: str) -> float:
+            words = _word_set(source)
+            return len(words & response) / len(words) if words else 0.5
+        
+        def support(source: str) -> float:
+            words = _word_set(source)
+            return len(response & words) / len(response) if response else 0.0
+        
+        relevance = coverage(request.query)
+        completeness = coverage(request.reference)
+        groundedness = support(request.context)
+        accuracy = (completeness + groundedness) / 2
+        helpfulness = (relevance + completeness) / 2
+        
+        def to_scale(fraction: float) -> float:
+            return round(JUDGE_SCORE_MIN + (JUDGE_SCORE_MAX - JUDGE_SCORE_MIN) * fraction, 2)
+        
+        return json.dumps({
+            "relevance": to_scale(relevance),
+            "accuracy": to_scale(accuracy),
+            "completeness": to_scale(completeness),
+            "groundedness": to_scale(groundedness),
+            "helpfulness": to_scale(helpfulness),
+            "reasoning": "Heuristic token-overlap judge"
+        })
+
+
+class LatencyInjectingJudge(JudgeBackend):
+    """
+    Wraps another backend and adds artificial latency and errors.
+    
+    Use for load tests of the pipeline and scheduler without paying
+    for real judge calls.
+    """
+    
+    def __init__(
+        self,
+        inner: Optional[JudgeBackend] = None,
+        latency_ms: float = 200.0,
+        jitter_ms: float = 50.0,
+        error_rate: float = 0.0,
+        error_status: int = 429,
+        seed: int = 0
+    ):
+        self.inner = inner or HeuristicJudge()
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+    
+    def complete(self, request: JudgeRequest) -> str:
+        with self._lock:
+            delay = self.latency_ms + self._rng.uniform(-self.jitter_ms, self.jitter_ms)
+            fail = self._rng.random() < self.error_rate
+        time.sleep(max(delay, 0.0) / 1000)
+        if fail:
+            raise JudgeBackendError("Injected judge failure", status=self.error_status)
+        return self.inner.complete(request)
+    
+    def identity(self) -> str:
+        return self.inner.identity()
+
+
+# =============================================================================
+# JUDGE SCHEDULING (rate limits, backoff, retry budget)
+# =============================================================================
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at rate_per_minute.
+    
+    Callers reserve tokens up front (the balance may go negative) and then
+    sleep off the deficit, so concurrent waiters are served in arrival
+    order instead of all waking and racing for the same refill. A request
+    larger than the capacity is charged in full: it puts the bucket into
+    debt, which later callers wait out, so the long-run rate never
+    exceeds rate_per_minute.
+    """
+    
+    def __init__(
+        self,
+        rate_per_minute: float,
+        capacity: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep
+    ):
+        if rate_per_minute <= 0:
+            raise ValueError("rate_per_minute must be positive")
+        self.rate = rate_per_minute / 60.0  # tokens per second
+        self.capacity = capacity if capacity is not None else max(rate_per_minute / 10, 1.0)
+        self.tokens = self.capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._last = clock()
+        self._lock = threading.Lock()
+    
+    def acquire(self, amount: float = 1.0) -> float:
+        """Take amount tokens, blocking until available. Returns seconds waited."""
+        with self._lock:
+            now = self._clock()
+            self.tokens = min(self.capacity, self.tokens + (now - self._last) * self.rate)
+            self._last = now
+            self.tokens -= amount
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait > 0:
+            self._sleep(wait)
+        return wait
+
+
+class RetryBudget:
+    """
+    Caps retries to a fraction of total requests across the whole run.
+    
+    Per-call retry limits still let a struggling provider receive
+    max_retries times the normal load; a shared budget does not.
+    """
+    
+    def __init__(self, ratio: float = 0.1, min_retries: int = 10):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.requests = 0
+        self.retries = 0
+        self._lock = threading.Lock()
+    
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+    
+    def try_spend(self) -> bool:
+        """Reserve one retry if the budget allows it."""
+        with self._lock:
+            if self.retries < self.min_retries + self.ratio * self.requests:
+                self.retries += 1
+                return True
+            return False
+
+
+@dataclass
+class SchedulerStats:
+    """Counters reported by JudgeScheduler."""
+    requests: int = 0
+    successes: int = 0
+    failures: int = 0
+    retries: int = 0
+    rate_limited: int = 0
+    budget_exhausted: int = 0
+    throttle_seconds: float = 0.0
+    backoff_seconds: float = 0.0
+    estimated_tokens: int = 0  # Of successful calls only
+    first_request_at: Optional[float] = None
+    last_completion_at: Optional[float] = None
+    
+    def to_dict(self) -> dict:
+        elapsed = 0.0
+        if self.first_request_at is not None and self.last_completion_at is not None:
+            elapsed = self.last_completion_at - self.first_request_at
+        per_minute = 60.0 / elapsed if elapsed > 0 else 0.0
+        return {
+            'requests': self.requests,
+            'successes': self.successes,
+            'failures': self.failures,
+            'retries': self.retries,
+            'rate_limited': self.rate_limited,
+            'budget_exhausted': self.budget_exhausted,
+            'throttle_seconds': self.throttle_seconds,
+            'backoff_seconds': self.backoff_seconds,
+            'elapsed_seconds': elapsed,
+            'requests_per_minute': self.successes * per_minute,
+            'tokens_per_minute': self.estimated_tokens * per_minute
+        }
+
+
+RETRYABLE_STATUSES = {408, 409, 429}
+
+
+def _is_retryable(error: JudgeBackendError) -> bool:
+    """Transport errors, throttling and server errors are worth retrying."""
+    return error.status is None or error.status in RETRYABLE_STATUSES or error.status >= 500
+
+
+class JudgeScheduler(JudgeBackend):
+    """
+    Wraps a judge backend with provider-friendly pacing.
+    
+    Requests pass through separate requests-per-minute and tokens-per-minute
+    buckets. Retryable failures back off exponentially with full jitter (or
+    for as long as the provider's Retry-After asks, capped at max_delay)
+    and draw from a run-wide retry budget. Safe to share across threads.
+    """
+    
+    def __init__(
+        self,
+        backend: JudgeBackend,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        expected_output_tokens: int = 150,
+        max_retries: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        retry_budget: Optional[RetryBudget] = None,
+        seed: Optional[int] = None,
+        sleep: Callable[[float], None] = time.sleep
+    ):
+        self.backend = backend
+        self.request_bucket = (TokenBucket(requests_per_minute, sleep=sleep)
+                               if requests_per_minute else None)
+        self.token_bucket = (TokenBucket(tokens_per_minute, sleep=sleep)
+                             if tokens_per_minute else None)
+        self.expected_output_tokens = expected_output_tokens
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_budget = retry_budget or RetryBudget()
+        self.stats = SchedulerStats()
+        self._sleep = sleep
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+    
+    def estimate_tokens(self, request: JudgeRequest) -> int:
+        """Rough token estimate (~4 characters per token) plus expected output."""
+        return len(request.prompt) // 4 + self.expected_output_tokens
+    
+    def _throttle(self, tokens: int) -> float:
+        waited = 0.0
+        if self.request_bucket:
+            waited += self.request_bucket.acquire(1)
+        if self.token_bucket:
+            waited += self.token_bucket.acquire(tokens)
+        return waited
+    
+    def identity(self) -> str:
+        return self.backend.identity()
+    
+    def complete(self, request: JudgeRequest) -> str:
+        tokens = self.estimate_tokens(request)
+        self.retry_budget.record_request()
+        with self._lock:
+            self.stats.requests += 1
+            if self.stats.first_request_at is None:
+                self.stats.first_request_at = time.monotonic()
+        
+        attempt = 0
+        while True:
+            waited = self._throttle(tokens)
+            with self._lock:
+                self.stats.throttle_seconds += waited
+            
+            try:
+                text = self.backend.complete(request)
+            except JudgeBackendError as e:
+                with self._lock:
+                    if e.status == 429:
+                        self.stats.rate_limited += 1
+                if not _is_retryable(e) or attempt >= self.max_retries:
+                    self._record_failure()
+                    raise
+                if not self.retry_budget.try_spend():
+                    with self._lock:
+                        self.stats.budget_exhausted += 1
+                    self._record_failure()
+                    raise
+                
+                cap = min(self.max_delay, self.base_delay * 2 ** attempt)
+                with self._lock:
+                    if e.retry_after is not None:
+                        delay = min(self.max_delay, e.retry_after)
+                    else:
+                        delay = self._rng.uniform(0, cap)
+                    self.stats.retries += 1
+                    self.stats.backoff_seconds += delay
+                self._sleep(delay)
+                attempt += 1
+                continue
+            
+            with self._lock:
+                self.stats.successes += 1
+                self.stats.estimated_tokens += tokens
+                self.stats.last_completion_at = time.monotonic()
+            return text
+    
+    def _record_failure(self):
+        with self._lock:
+            self.stats.failures += 1
+            self.stats.last_completion_at = time.monotonic()
+
+
 # =============================================================================
 # GENERATION EVALUATION (LLM-as-Judge)
 # =============================================================================
@@ -209,13 +1037,152 @@ def evaluate_generation_mock(
     )
 
 
+JUDGE_CRITERIA = ('relevance', 'accuracy', 'completeness', 'groundedness', 'helpfulness')
+
+DEFAULT_JUDGE_WEIGHTS = {
+    'relevance': 0.2,
+    'accuracy': 0.3,
+    'completeness': 0.2,
+    'groundedness': 0.2,
+    'helpfulness': 0.1
+}
+
+JUDGE_SCORE_MIN = 1.0
+JUDGE_SCORE_MAX = 5.0
+
+_CODE_FENCE_RE = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL | re.IGNORECASE)
+
+
+class JudgeParseError(ValueError):
+    """Raised when a judge response cannot be turned into valid scores."""
+
+
+@dataclass
+class JudgeParseStats:
+    """Running counters for judge output parsing across an evaluation run."""
+    judge_calls: int = 0
+    parse_failures: int = 0
+    retries: int = 0
+    unrecoverable: int = 0
+
+    @property
+    def failure_rate(self) -> float:
+        """Fraction of judge calls whose output could not be parsed."""
+        return self.parse_failures / self.judge_calls if self.judge_calls else 0.0
+
+    def merge(self, other: 'JudgeParseStats'):
+        """Add another run's counters into this one."""
+        self.judge_calls += other.judge_calls
+        self.parse_failures += other.parse_failures
+        self.retries += other.retries
+        self.unrecoverable += other.unrecoverable
+    
+    def to_dict(self) -> dict:
+        return {
+            'judge_calls': self.judge_calls,
+            'parse_failures': self.parse_failures,
+            'retries': self.retries,
+            'unrecoverable': self.unrecoverable,
+            'parse_failure_rate': self.failure_rate
+        }
+
+
+def _iter_json_objects(text: str):
+    """Yield every JSON object embedded in text, fenced blocks first."""
+    decoder = json.JSONDecoder()
+    candidates = _CODE_FENCE_RE.findall(text) + [text]
+    
+    for candidate in candidates:
+        start = candidate.find('{')
+        while start != -1:
+            try:
+                obj, _ = decoder.raw_decode(candidate, start)
+            except json.JSONDecodeError:
+                obj = None
+            if isinstance(obj, dict):
+                yield obj
+            start = candidate.find('{', start + 1)
+
+
+def _coerce_score(name: str, value) -> float:
+    """Convert a raw judge score to a float clamped to the 1-5 scale."""
+    if isinstance(value, bool):
+        raise JudgeParseError(f"Score for '{name}' is not numeric: {value!r}")
+    try:
+        score = float(value)
+    except (TypeError, ValueError):
+        raise JudgeParseError(f"Score for '{name}' is not numeric: {value!r}")
+    if math.isnan(score):
+        raise JudgeParseError(f"Score for '{name}' is NaN")
+    return min(max(score, JUDGE_SCORE_MIN), JUDGE_SCORE_MAX)
+
+
+def parse_judge_response(text: str) -> dict:
+    """
+    Extract and validate the judge's JSON verdict.
+    
+    Tolerates prose or markdown code fences around the JSON object,
+    case differences in keys and numeric strings. Scores are clamped
+    to the 1-5 range.
+    
+    Args:
+        text: Raw text returned by the judge model
+    
+    Returns:
+        Dict with a float for each of JUDGE_CRITERIA plus 'reasoning'
+    
+    Raises:
+        JudgeParseError: If no object with all five criteria can be found
+    """
+    if not text or not text.strip():
+        raise JudgeParseError("Empty judge response")
+    
+    # Fast path: the judge followed instructions exactly
+    try:
+        objects = [json.loads(text)]
+    except json.JSONDecodeError:
+        objects = _iter_json_objects(text)
+    
+    for obj in objects:
+        if not isinstance(obj, dict):
+            continue
+        fields = {str(k).strip().lower(): v for k, v in obj.items()}
+        if not any(c in fields for c in JUDGE_CRITERIA):
+            continue  # Some other object (e.g. nested), keep looking
+        
+        missing = [c for c in JUDGE_CRITERIA if c not in fields]
+        if missing:
+            raise JudgeParseError(f"Judge response missing criteria: {missing}")
+        
+        parsed = {c: _coerce_score(c, fields[c]) for c in JUDGE_CRITERIA}
+        reasoning = fields.get('reasoning', '')
+        parsed['reasoning'] = reasoning if isinstance(reasoning, str) else str(reasoning)
+        return parsed
+    
+    raise JudgeParseError("No JSON object with judge criteria found in response")
+
+
+def compute_overall(scores: dict, weights: Optional[dict] = None) -> float:
+    """Weighted mean of the criterion scores."""
+    weights = weights or DEFAULT_JUDGE_WEIGHTS
+    total_weight = sum(weights.get(c, 0.0) for c in JUDGE_CRITERIA)
+    if total_weight <= 0:
+        raise ValueError("Judge weights must sum to a positive value")
+    return sum(scores[c] * weights.get(c, 0.0) for c in JUDGE_CRITERIA) / total_weight
+
+
+@traced("evaluate_generation")
 def evaluate_generation(
     query: str,
     context: str,
     response: str,
     reference: str,
     evaluator_model: str = "gpt-4o-mini",
-    weights: Optional[dict] = None
+    weights: Optional[dict] = None,
+    backend: Optional[JudgeBackend] = None,
+    max_parse_retries: int = 1,
+    parse_stats: Optional[JudgeParseStats] = None,
+    ensemble: Optional['JudgeEnsemble'] = None
 ) -> GenerationMetrics:
     """
     Evaluate generation quality using LLM-as-judge.
@@ -227,18 +1194,27 @@ def evaluate_generation(
         reference: The reference (ideal) answer
         evaluator_model: Model to use for evaluation
         weights: Weights for computing overall score
+        backend: Judge backend to call. If None, the mock evaluator is used.
+        max_parse_retries: Extra judge calls allowed when the output is unparseable
+        parse_stats: Optional counters updated with parse outcomes
+        ensemble: Score with a JudgeEnsemble instead of a single backend
     
     Returns:
         GenerationMetrics with scores and reasoning
+    
+    Raises:
+        JudgeParseError: If the judge output is still unparseable after retries
     """
     if weights is None:
-        weights = {
-            'relevance': 0.2,
-            'accuracy': 0.3,
-            'completeness': 0.2,
-            'groundedness': 0.2,
-            'helpfulness': 0.1
-        }
+        weights = DEFAULT_JUDGE_WEIGHTS
+    
+    if ensemble is not None:
+        return ensemble.evaluate(
+            query, context, response, reference,
+            weights=weights,
+            max_parse_retries=max_parse_retries,
+            parse_stats=parse_stats
+        )
     
     prompt = EVAL_PROMPT.format(
         query=query,
@@ -247,22 +1223,690 @@ def evaluate_generation(
         reference=reference
     )
     
-    # TODO: Replace with actual LLM call
-    # response = openai.chat.completions.create(
-    #     model=evaluator_model,
-    #     messages=[{"role": "user", "content": prompt}],
-    #     temperature=0.0
-    # )
-    # result = json.loads(response.choices[0].message.content)
+    if backend is None:
+        # Using mock until a backend is wired in, e.g. OpenAICompatibleJudge()
+        return evaluate_generation_mock(query, context, response, reference)
+    
+    request = JudgeRequest(
+        prompt=prompt,
+        model=evaluator_model,
+        query=query,
+        context=context,
+        response=response,
+        reference=reference
+    )
+    stats = parse_stats if parse_stats is not None else JudgeParseStats()
+    
+    for attempt in range(max_parse_retries + 1):
+        if attempt > 0:
+            stats.retries += 1
+        stats.judge_calls += 1
+        try:
+            scores = parse_judge_response(backend.complete(request))
+            break
+        except JudgeParseError as e:
+            stats.parse_failures += 1
+            error = e
+    else:
+        stats.unrecoverable += 1
+        raise error
+    
+    return GenerationMetrics(
+        relevance=scores['relevance'],
+        accuracy=scores['accuracy'],
+        completeness=scores['completeness'],
+        groundedness=scores['groundedness'],
+        helpfulness=scores['helpfulness'],
+        overall=compute_overall(scores, weights),
+        reasoning=scores['reasoning']
+    )
+
+
+# =============================================================================
+# JUDGE ENSEMBLE
+# =============================================================================
+
+@dataclass
+class JudgeSpec:
+    """One judge in an ensemble: a backend plus the model it should use."""
+    name: str
+    backend: JudgeBackend
+    model: str
+
+
+class EnsembleStats:
+    """Thread-safe agreement and escalation counters for a JudgeEnsemble."""
+    
+    def __init__(self):
+        self.examples = 0
+        self.escalated = 0
+        self.compared = 0
+        self.abs_diff_sum = {c: 0.0 for c in JUDGE_CRITERIA}
+        self.agreements = {c: 0 for c in JUDGE_CRITERIA}
+        self._lock = threading.Lock()
+    
+    def record(self, first: Optional[GenerationMetrics],
+               second: Optional[GenerationMetrics], threshold: float, escalated: bool):
+        with self._lock:
+            self.examples += 1
+            self.escalated += int(escalated)
+            if first is None or second is None:
+                return
+            self.compared += 1
+            for c in JUDGE_CRITERIA:
+                diff = abs(getattr(first, c) - getattr(second, c))
+                self.abs_diff_sum[c] += diff
+                self.agreements[c] += int(diff <= threshold)
+    
+    def to_dict(self) -> dict:
+        with self._lock:
+            n = self.compared
+            return {
+                'examples': self.examples,
+                'escalated': self.escalated,
+                'escalation_rate': self.escalated / self.examples if self.examples else 0.0,
+                'mean_abs_diff': {c: self.abs_diff_sum[c] / n if n else 0.0 for c in JUDGE_CRITERIA},
+                'agreement_rate': {c: self.agreements[c] / n if n else 0.0 for c in JUDGE_CRITERIA}
+            }
+
+
+class JudgeEnsemble:
+    """
+    Two cheap judges, plus a stronger tiebreaker only when they disagree.
+    
+    If the two primary judges are within `threshold` points on every
+    criterion their scores are averaged. Otherwise (or if one of them
+    fails) the tiebreaker is called and the per-criterion median of all
+    available verdicts is used.
+    """
+    
+    def __init__(
+        self,
+        primary: tuple[JudgeSpec, JudgeSpec],
+        tiebreaker: JudgeSpec,
+        threshold: float = 1.0
+    ):
+        if len(primary) != 2:
+            raise ValueError("JudgeEnsemble needs exactly two primary judges")
+        self.primary = primary
+        self.tiebreaker = tiebreaker
+        self.threshold = threshold
+        self.stats = EnsembleStats()
+    
+    def _judge(self, spec: JudgeSpec, query, context, response, reference,
+               weights, max_parse_retries, parse_stats):
+        try:
+            metrics = evaluate_generation(
+                query, context, response, reference,
+                evaluator_model=spec.model,
+                weights=weights,
+                backend=spec.backend,
+                max_parse_retries=max_parse_retries,
+                parse_stats=parse_stats
+            )
+            return metrics, None
+        except (JudgeParseError, JudgeBackendError) as e:
+            return None, e
+    
+    def _disagree(self, first: GenerationMetrics, second: GenerationMetrics) -> bool:
+        return any(
+            abs(getattr(first, c) - getattr(second, c)) > self.threshold
+            for c in JUDGE_CRITERIA
+        )
+    
+    def evaluate(
+        self,
+        query: str,
+        context: str,
+        response: str,
+        reference: str,
+        weights: Optional[dict] = None,
+        max_parse_retries: int = 1,
+        parse_stats: Optional[JudgeParseStats] = None
+    ) -> GenerationMetrics:
+        """Score one example, escalating to the tiebreaker only on disagreement."""
+        weights = weights or DEFAULT_JUDGE_WEIGHTS
+        args = (query, context, response, reference, weights, max_parse_retries, parse_stats)
+        
+        first, error = self._judge(self.primary[0], *args)
+        second, second_error = self._judge(self.primary[1], *args)
+        error = error or second_error
+        verdicts = [m for m in (first, second) if m is not None]
+        
+        escalate = len(verdicts) < 2 or self._disagree(first, second)
+        names = [spec.name for spec, m in zip(self.primary, (first, second)) if m is not None]
+        if escalate:
+            third, third_error = self._judge(self.tiebreaker, *args)
+            if third is not None:
+                verdicts.append(third)
+                names.append(self.tiebreaker.name)
+            error = error or third_error
+        
+        self.stats.record(first, second, self.threshold, escalate)
+        
+        if not verdicts:
+            raise error
+        
+        combine = np.median if len(verdicts) > 2 else np.mean
+        scores = {
+            c: float(combine([getattr(m, c) for m in verdicts]))
+            for c in JUDGE_CRITERIA
+        }
+        return GenerationMetrics(
+            overall=compute_overall(scores, weights),
+            reasoning=f"Ensemble of {', '.join(names)}"
+                      + (" (escalated)" if escalate else ""),
+            **scores
+        )
+
+
+# =============================================================================
+# JUDGE ROUTING (per-category models, concurrency and caches)
+# =============================================================================
+
+# USD per 1K tokens (input, output); see 05_cost_model.md
+MODEL_PRICES = {
+    'gpt-4o': (0.0025, 0.01),
+    'gpt-4o-mini': (0.00015, 0.0006),
+    'claude-3-5-sonnet': (0.003, 0.015),
+    'claude-3-5-haiku': (0.00025, 0.00125),
+}
+
+
+def estimate_cost(model: Optional[str], input_tokens: int, output_tokens: int,
+                  prices: Optional[dict] = None) -> float:
+    """USD for the given token counts; NaN for a model without a price."""
+    prices = prices or MODEL_PRICES
+    if input_tokens == 0 and output_tokens == 0:
+        return 0.0
+    if model not in prices:
+        return float('nan')
+    input_price, output_price = prices[model]
+    return (input_tokens * input_price + output_tokens * output_price) / 1000
+
+
+@dataclass
+class RouteStats:
+    """Judge usage for one category."""
+    model: str
+    calls: int = 0
+    cache_hits: int = 0
+    latency_ms: float = 0.0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    
+    def to_dict(self) -> dict:
+        return {
+            'model': self.model,
+            'calls': self.calls,
+            'cache_hits': self.cache_hits,
+            'mean_latency_ms': self.latency_ms / self.calls if self.calls else 0.0,
+            'input_tokens': self.input_tokens,
+            'output_tokens': self.output_tokens,
+            'cost': estimate_cost(self.model, self.input_tokens, self.output_tokens)
+        }
+
+
+class JudgeRoute:
+    """
+    One judge model with its own concurrency limit and verdict cache.
+    
+    Categories routed to the same model share the route, so the limit
+    applies to the model, not to each category.
+    """
+    
+    def __init__(self, model: str, backend: JudgeBackend, concurrency: int = 4, cache: bool = True):
+        self.model = model
+        self.backend = backend
+        self.concurrency = concurrency
+        self.cache_enabled = cache
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._cache: dict = {}
+        self._lock = threading.Lock()
+    
+    def complete(self, request: JudgeRequest) -> tuple[str, bool]:
+        """Returns (judge text, whether it came from the cache)."""
+        if self.cache_enabled:
+            with self._lock:
+                cached = self._cache.get(request.prompt)
+            if cached is not None:
+                return cached, True
+        
+        with self._slots:
+            text = self.backend.complete(request)
+        
+        if self.cache_enabled:
+            try:
+                parse_judge_response(text)
+            except JudgeParseError:
+                return text, False  # Let a retry ask the judge again
+            with self._lock:
+                self._cache[request.prompt] = text
+        return text, False
+
+
+class _RoutedJudge(JudgeBackend):
+    """Sends one category's judge calls to its route and meters them."""
+    
+    def __init__(self, route: JudgeRoute, stats: RouteStats, lock: threading.Lock):
+        self.route = route
+        self.stats = stats
+        self.lock = lock
+    
+    def identity(self) -> str:
+        return self.route.backend.identity()
+    
+    def complete(self, request: JudgeRequest) -> str:
+        start = time.perf_counter()
+        text, hit = self.route.complete(request)
+        elapsed = (time.perf_counter() - start) * 1000
+        with self.lock:
+            self.stats.calls += 1
+            self.stats.latency_ms += elapsed
+            if hit:
+                self.stats.cache_hits += 1
+            else:
+                self.stats.input_tokens += len(request.prompt) // 4  # ~4 characters per token
+                self.stats.output_tokens += len(text) // 4
+        return text
+
+
+class JudgeRouter:
+    """
+    Routes each category's judge calls to a model chosen for it.
+    
+    Configured with EvalConfig.judge_routes, e.g.:
+        {
+            'simple_factual': {'model': 'gpt-4o-mini', 'concurrency': 16},
+            'complex': {'model': 'gpt-4o', 'concurrency': 4},
+            'default': {'model': 'gpt-4o-mini'}
+        }
+    Categories without a route (and without 'default') use
+    config.evaluator_model with config.judge_concurrency.
+    """
+    
+    def __init__(self, routes: dict, default: JudgeRoute):
+        self.routes = routes
+        self.default = default
+        self._stats: dict = {}
+        self._lock = threading.Lock()
+    
+    @classmethod
+    def from_config(cls, config: 'EvalConfig', backend: JudgeBackend) -> "JudgeRouter":
+        by_model: dict = {}
+        
+        def route(spec: dict) -> JudgeRoute:
+            model = spec.get('model', config.evaluator_model)
+            if model not in by_model:
+                by_model[model] = JudgeRoute(
+                    model, backend,
+                    concurrency=spec.get('concurrency', max(1, config.judge_concurrency)),
+                    cache=spec.get('cache', True)
+                )
+            return by_model[model]
+        
+        specs = dict(config.judge_routes or {})
+        default = route(specs.pop('default', {}))
+        return cls({category: route(spec) for category, spec in specs.items()}, default)
+    
+    def route_for(self, category: str) -> JudgeRoute:
+        return self.routes.get(category, self.default)
+    
+    def model_for(self, category: str) -> str:
+        return self.route_for(category).model
+    
+    def backend_for(self, category: str) -> JudgeBackend:
+        route = self.route_for(category)
+        with self._lock:
+            stats = self._stats.setdefault(category, RouteStats(route.model))
+        return _RoutedJudge(route, stats, self._lock)
+    
+    @property
+    def max_concurrency(self) -> int:
+        routes = {id(r): r for r in [self.default, *self.routes.values()]}
+        return sum(r.concurrency for r in routes.values())
     
-    # Using mock for now
-    return evaluate_generation_mock(query, context, response, reference)
+    def stats(self) -> dict:
+        with self._lock:
+            return {category: s.to_dict() for category, s in self._stats.items()}
+
+
+# =============================================================================
+# PRE-JUDGE SCORING (cheap similarity before the LLM judge)
+# =============================================================================
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercase word tokens."""
+    return _TOKEN_RE.findall(text.lower())
+
+
+class HashingEmbedder:
+    """
+    Deterministic feature-hashing embedder.
+    
+    Each lowercase word (and word bigram) is hashed into one of `dim`
+    buckets with a hashed sign. Vectors are L2-normalised, so a dot
+    product is cosine similarity. No model download, no randomness.
+    """
+    
+    def __init__(self, dim: int = 512, bigrams: bool = True):
+        self.dim = dim
+        self.bigrams = bigrams
+    
+    def _features(self, text: str) -> list[str]:
+        words = tokenize(text)
+        if self.bigrams:
+            words += [f"{a} {b}" for a, b in zip(words, words[1:])]
+        return words
+    
+    def embed(self, texts: list[str]) -> np.ndarray:
+        """Embed a batch of texts into a (len(texts), dim) float32 matrix."""
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                h = zlib.crc32(feature.encode())
+                vectors[row, h % self.dim] += 1.0 if (h >> 31) & 1 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+
+def rouge_l_f1(candidate: list[str], reference: list[str]) -> float:
+    """ROUGE-L F1 between two token lists (longest common subsequence)."""
+    if not candidate or not reference:
+        return 0.0
+    # Rolling single-row LCS table over the shorter sequence
+    if len(candidate) < len(reference):
+        short, long = candidate, reference
+    else:
+        short, long = reference, candidate
+    previous = [0] * (len(short) + 1)
+    for token in long:
+        current = [0]
+        for j, other in enumerate(short):
+            current.append(previous[j] + 1 if token == other
+                           else max(previous[j + 1], current[j]))
+        previous = current
+    lcs = previous[-1]
+    if lcs == 0:
+        return 0.0
+    precision = lcs / len(candidate)
+    recall = lcs / len(reference)
+    return 2 * precision * recall / (precision + recall)
+
+
+class PreJudgeStats:
+    """Counts of examples settled by the pre-judge vs sent to the judge."""
+    
+    def __init__(self):
+        self.examples = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.judged = 0
+    
+    def to_dict(self) -> dict:
+        saved = self.accepted + self.rejected
+        return {
+            'examples': self.examples,
+            'accepted': self.accepted,
+            'rejected': self.rejected,
+            'sent_to_judge': self.judged,
+            'judge_calls_saved': saved,
+            'savings_rate': saved / self.examples if self.examples else 0.0
+        }
+
+
+class PreJudge:
+    """
+    Scores responses against reference answers without an LLM.
+    
+    Similarity is a weighted mix of embedding cosine (computed for the
+    whole batch in one matrix operation) and ROUGE-L F1. Responses above
+    `accept_above` or below `reject_below` are scored directly on the
+    1-5 scale; only the ambiguous middle band goes to the judge.
+    """
+    
+    def __init__(
+        self,
+        accept_above: float = 0.85,
+        reject_below: float = 0.15,
+        embedding_weight: float = 0.5,
+        embedder: Optional[HashingEmbedder] = None
+    ):
+        if not 0.0 <= reject_below <= accept_above <= 1.0:
+            raise ValueError("Need 0 <= reject_below <= accept_above <= 1")
+        self.accept_above = accept_above
+        self.reject_below = reject_below
+        self.embedding_weight = embedding_weight
+        self.embedder = embedder or HashingEmbedder()
+        self.stats = PreJudgeStats()
+    
+    def similarity(self, responses: list[str], references: list[str]) -> np.ndarray:
+        """Combined similarity in [0, 1] for each (response, reference) pair."""
+        if not responses:
+            return np.empty(0)
+        vectors = self.embedder.embed(list(responses) + list(references))
+        n = len(responses)
+        cosine = np.clip(np.einsum('ij,ij->i', vectors[:n], vectors[n:]), 0.0, 1.0)
+        lexical = np.array([
+            rouge_l_f1(tokenize(r), tokenize(ref)) for r, ref in zip(responses, references)
+        ])
+        return self.embedding_weight * cosine + (1 - self.embedding_weight) * lexical
+    
+    def score_batch(
+        self,
+        responses: list[str],
+        references: list[str],
+        weights: Optional[dict] = None
+    ) -> list[Optional[GenerationMetrics]]:
+        """
+        Score a batch. Returns GenerationMetrics for confident examples
+        and None for those that still need the judge.
+        """
+        similarity = self.similarity(responses, references)
+        scored = []
+        
+        for sim, reference in zip(similarity, references):
+            self.stats.examples += 1
+            if not reference.strip() or self.reject_below <= sim <= self.accept_above:
+                self.stats.judged += 1
+                scored.append(None)
+                continue
+            
+            band = 'above' if sim > self.accept_above else 'below'
+            if band == 'above':
+                self.stats.accepted += 1
+            else:
+                self.stats.rejected += 1
+            score = JUDGE_SCORE_MIN + (JUDGE_SCORE_MAX - JUDGE_SCORE_MIN) * float(sim)
+            scores = {c: score for c in JUDGE_CRITERIA}
+            scored.append(GenerationMetrics(
+                overall=compute_overall(scores, weights),
+                reasoning=f"Pre-judge: similarity {sim:.2f} {band} threshold",
+                **scores
+            ))
+        return scored
+
+
+# =============================================================================
+# GROUNDEDNESS (claim-to-chunk alignment)
+# =============================================================================
+
+_CLAIM_SPLIT_RE = re.compile(r"(?<=[.!?;])\s+|\n+")
+
+
+def split_claims(text: str, min_tokens: int = 4) -> list[str]:
+    """Split a response into sentence-level claims, dropping short fragments."""
+    claims = []
+    for part in _CLAIM_SPLIT_RE.split(text):
+        part = part.strip(" -*\t")
+        if len(tokenize(part)) >= min_tokens:
+            claims.append(part)
+    return claims
+
+
+def _ngrams(tokens: list[str], n: int) -> set:
+    return {tuple(tokens[i:i + n]) for i in range(len(tokens) - n + 1)}
+
+
+@dataclass
+class ClaimSupport:
+    """How well one claim is supported by the best-matching chunk."""
+    claim: str
+    support: float  # Fraction of the claim's n-grams found in the chunk
+    chunk_id: Optional[str]
+    supported: bool
+
+
+@dataclass
+class GroundednessResult:
+    """Claim-level groundedness for one response."""
+    score: float  # Fraction of claims supported (NaN if there are no claims)
+    mean_support: float
+    claims: list[ClaimSupport]
+
+
+class NGramIndex:
+    """
+    Inverted index from word n-grams to the chunks containing them.
+    
+    Holds at most max_chunks chunks (None for no bound), evicting the least
+    recently indexed first. Re-adding a chunk ID with different text
+    re-indexes it, so edited documents are never checked against stale text.
+    """
+    
+    def __init__(self, n: int = 3, max_chunks: Optional[int] = None):
+        self.n = n
+        self.max_chunks = max_chunks
+        self._chunks: OrderedDict = OrderedDict()  # chunk_id -> (seq, text hash, n-grams)
+        self._seq = 0
+        self.postings: dict = {}
+        self.evictions = 0
+    
+    def __len__(self) -> int:
+        return len(self._chunks)
+    
+    def __contains__(self, chunk_id: str) -> bool:
+        return chunk_id in self._chunks
+    
+    def add(self, chunk_id: str, text: str):
+        """Index a chunk; re-adding known text only refreshes its LRU position."""
+        entry = self._chunks.get(chunk_id)
+        if entry is not None:
+            if entry[1] == hash(text):
+                self._chunks.move_to_end(chunk_id)
+                return
+            self.remove(chunk_id)
+        grams = frozenset(_ngrams(tokenize(text), self.n))
+        self._chunks[chunk_id] = (self._seq, hash(text), grams)
+        self._seq += 1
+        for gram in grams:
+            self.postings.setdefault(gram, set()).add(chunk_id)
+        if self.max_chunks is not None:
+            while len(self._chunks) > self.max_chunks:
+                self.remove(next(iter(self._chunks)))
+                self.evictions += 1
+    
+    def remove(self, chunk_id: str) -> bool:
+        entry = self._chunks.pop(chunk_id, None)
+        if entry is None:
+            return False
+        for gram in entry[2]:
+            holders = self.postings[gram]
+            holders.discard(chunk_id)
+            if not holders:
+                del self.postings[gram]
+        return True
+    
+    def best_match(self, grams: set, allowed: Optional[list[str]] = None) -> tuple[Optional[str], float]:
+        """
+        Chunk sharing the most n-grams with grams, and the fraction shared.
+        
+        With allowed, only those chunks' own n-gram sets are intersected,
+        so the cost is independent of how large the index has grown.
+        Ties go to the chunk indexed first.
+        """
+        if not grams:
+            return None, 0.0
+        hits: dict = {}
+        if allowed is not None:
+            for chunk_id in allowed:
+                entry = self._chunks.get(chunk_id)
+                if entry is not None:
+                    shared = len(grams & entry[2])
+                    if shared:
+                        hits[chunk_id] = shared
+        else:
+            for gram in grams:
+                for chunk_id in self.postings.get(gram, ()):
+                    hits[chunk_id] = hits.get(chunk_id, 0) + 1
+        if not hits:
+            return None, 0.0
+        chunk_id = max(hits, key=lambda c: (hits[c], -self._chunks[c][0]))
+        return chunk_id, hits[chunk_id] / len(grams)
+
+
+class GroundednessChecker:
+    """
+    Local groundedness scorer: no LLM, one dictionary lookup per n-gram.
+    
+    Responses are split into claims; each claim is aligned to the
+    retrieved chunk sharing the most word n-grams with it. A claim is
+    supported when at least `support_threshold` of its n-grams appear in
+    that chunk. Index a response's chunks, then call check() for it; the
+    index keeps the most recent max_chunks chunks, so a long-lived checker
+    (e.g. online evaluation) stays bounded.
+    """
+    
+    def __init__(self, n: int = 3, support_threshold: float = 0.5, min_claim_tokens: int = 4,
+                 max_chunks: Optional[int] = 50_000):
+        self.index = NGramIndex(n, max_chunks)
+        self.support_threshold = support_threshold
+        self.min_claim_tokens = max(min_claim_tokens, n)
+    
+    def index_chunks(self, chunk_ids: list[str], chunks: list[str]):
+        for chunk_id, text in zip(chunk_ids, chunks):
+            self.index.add(chunk_id, text)
+    
+    def check(self, response: str, chunk_ids: Optional[list[str]] = None) -> GroundednessResult:
+        """
+        Score a response against indexed chunks.
+        
+        Args:
+            response: Generated answer
+            chunk_ids: Restrict alignment to these chunks (e.g. the ones
+                retrieved for this query). None searches the whole index.
+        """
+        allowed = list(dict.fromkeys(chunk_ids)) if chunk_ids is not None else None
+        claims = []
+        for claim in split_claims(response, self.min_claim_tokens):
+            chunk_id, support = self.index.best_match(
+                _ngrams(tokenize(claim), self.index.n), allowed
+            )
+            claims.append(ClaimSupport(
+                claim=claim,
+                support=support,
+                chunk_id=chunk_id,
+                supported=support >= self.support_threshold
+            ))
+        
+        if not claims:
+            return GroundednessResult(score=float('nan'), mean_support=float('nan'), claims=[])
+        return GroundednessResult(
+            score=sum(c.supported for c in claims) / len(claims),
+            mean_support=sum(c.support for c in claims) / len(claims),
+            claims=claims
+        )
 
 
 # =============================================================================
 # GOLDEN DATASET HANDLING
 # =============================================================================
 
+@traced("load_golden_dataset")
 def load_golden_dataset(path: str) -> list[dict]:
     """Load golden dataset from YAML file."""
     with open(path, 'r') as f:
@@ -325,6 +1969,16 @@ class EvalConfig:
     generation_overall_target: float = 4.0
     latency_p95_target: float = 5.0
     evaluator_model: str = "gpt-4o-mini"
+    judge_max_parse_retries: int = 1
+    judge_concurrency: int = 1
+    judge_requests_per_minute: Optional[float] = None
+    judge_tokens_per_minute: Optional[float] = None
+    mode: str = "full"  # full | retrieval_only | hybrid
+    generation_cache_path: Optional[str] = None
+    judge_routes: Optional[dict] = None  # {category: {'model', 'concurrency', 'cache'}}; see JudgeRouter
+
+
+EVAL_MODES = ('full', 'retrieval_only', 'hybrid')
 
 
 @dataclass
@@ -336,23 +1990,172 @@ class EvalResults:
     generation: dict
     system: dict
     by_category: dict
-    detailed: list[dict]
+    detailed: 'ResultStore'
+
+
+class GenerationCache:
+    """
+    Generation outputs and judge verdicts from earlier runs, keyed by example.
+    
+    In hybrid mode an entry is reused only if the example's query and its
+    retrieved chunk IDs (in order) are unchanged, so chunking or embedding
+    experiments only pay for generation and judging where retrieval moved.
+    Keys include the judge model, the judge backend or ensemble, and a
+    digest of the reference answer, so changing any of them re-judges.
+    Safe to share across concurrent runs; save() replaces the file
+    atomically.
+    """
+    
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.entries: dict = {}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, 'r') as f:
+                self.entries = json.load(f)
+    
+    @staticmethod
+    def key(example: dict, evaluator_model: str, judge: str = "") -> str:
+        reference = hashlib.sha1(example.get('reference_answer', '').encode()).hexdigest()[:16]
+        return f"{example['id']}::{evaluator_model}::{judge}::{reference}"
+    
+    def lookup(self, key: str, query: str, chunk_ids: list[str]):
+        """Return (GenerationResult, GenerationMetrics) or None."""
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None or entry['query'] != query or entry['chunk_ids'] != list(chunk_ids):
+                self.misses += 1
+                return None
+            self.hits += 1
+        return GenerationResult(**entry['generation']), GenerationMetrics(**entry['metrics'])
+    
+    def store(self, key: str, query: str, chunk_ids: list[str],
+              generation: GenerationResult, metrics: GenerationMetrics):
+        if math.isnan(metrics.overall):
+            return  # Never cache a failed judgement
+        entry = {
+            'query': query,
+            'chunk_ids': list(chunk_ids),
+            'generation': asdict(generation),
+            'metrics': asdict(metrics)
+        }
+        with self._lock:
+            self.entries[key] = entry
+    
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(self.entries, f)
+            os.replace(tmp_path, self.path)
+    
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+
+def _without_text(retrieval: RetrievalResult) -> RetrievalResult:
+    """The retrieval minus its chunk text, once nothing downstream needs the text."""
+    return RetrievalResult(retrieval.chunk_ids, [], retrieval.scores, retrieval.latency_ms)
+
+
+def judge_identity(backend: Optional[JudgeBackend], ensemble: Optional[JudgeEnsemble] = None) -> str:
+    """Stable name for whatever produces verdicts; wrappers defer to what they wrap."""
+    def name(judge) -> str:
+        return judge.identity() if isinstance(judge, JudgeBackend) else type(judge).__name__
+    if ensemble is not None:
+        specs = (*ensemble.primary, ensemble.tiebreaker)
+        return "ensemble(" + ",".join(f"{spec.name}={name(spec.backend)}/{spec.model}"
+                                      for spec in specs) + f";{ensemble.threshold})"
+    return name(backend) if backend is not None else ""
+
+
+def _generate_for(rag_system, query: str, retrieval: RetrievalResult, top_k: int):
+    """Generate an answer for an already-retrieved context.
+    
+    Falls back to a full .query() (and its retrieval) for systems
+    without a separate .generate() step.
+    """
+    if hasattr(rag_system, 'generate'):
+        return retrieval, rag_system.generate(query, retrieval)
+    rag_result = rag_system.query(query, top_k=top_k)
+    return rag_result.retrieval, rag_result.generation
 
 
 def run_evaluation(
     rag_system,  # Your RAG system with .retrieve() and .generate() methods
-    config: EvalConfig
+    config: EvalConfig,
+    backend: Optional[JudgeBackend] = None,
+    ensemble: Optional[JudgeEnsemble] = None,
+    generation_cache: Optional[GenerationCache] = None,
+    pre_judge: Optional[PreJudge] = None,
+    groundedness_checker: Optional[GroundednessChecker] = None,
+    tracer: Optional[Tracer] = None
 ) -> EvalResults:
     """
     Run full evaluation pipeline.
     
+    config.mode selects how much of the system is exercised:
+        full:           rag_system.query() for every example, judge everything
+        retrieval_only: rag_system.retrieve() only, RetrievalMetrics only
+        hybrid:         rag_system.retrieve(), then reuse cached generation and
+                        judge results where the retrieved chunk IDs are unchanged
+    
     Args:
         rag_system: RAG system to evaluate
         config: Evaluation configuration
+        backend: Judge backend passed through to evaluate_generation
+        ensemble: Optional JudgeEnsemble used instead of a single backend
+        generation_cache: Cache for hybrid runs. Defaults to one loaded from
+            config.generation_cache_path; full runs populate it too.
+        pre_judge: Optional PreJudge that settles clear-cut examples by
+            similarity to the reference answer before any judge call
+        groundedness_checker: Optional GroundednessChecker; adds local,
+            claim-level groundedness to every example with a generation
+        tracer: Optional Tracer installed for this run. Any tracer already
+            active (e.g. `with Tracer(...):`) is used otherwise. When tracing,
+            time by stage for this run alone is added to
+            results.system['stages'].
     
     Returns:
         EvalResults with all metrics
     """
+    if tracer is not None:
+        with tracer:
+            return run_evaluation(rag_system, config, backend, ensemble, generation_cache,
+                                  pre_judge, groundedness_checker)
+    
+    active = get_tracer()
+    with Tracer.run_stages() as stages:
+        with active.span("run_evaluation", mode=config.mode):
+            evaluation = _run_evaluation(rag_system, config, backend, ensemble, generation_cache,
+                                         pre_judge, groundedness_checker)
+    if active.enabled:
+        evaluation.system['stages'] = active.stage_summary(stages)
+        if active.profiler:
+            evaluation.system['profile'] = active.profiler.top()
+    return evaluation
+
+
+def _run_evaluation(
+    rag_system,
+    config: EvalConfig,
+    backend: Optional[JudgeBackend],
+    ensemble: Optional[JudgeEnsemble],
+    generation_cache: Optional[GenerationCache],
+    pre_judge: Optional[PreJudge],
+    groundedness_checker: Optional[GroundednessChecker]
+) -> EvalResults:
+    tracer = get_tracer()
+    
     # Load golden dataset
     examples = load_golden_dataset(config.golden_dataset_path)
     
@@ -361,17 +2164,67 @@ def run_evaluation(
     if not validation['valid']:
         print(f"Warning: Golden dataset has issues: {validation['issues']}")
     
-    # Run evaluation
-    results = []
+    # Pace judge calls when provider limits are configured
+    scheduler = None
+    if backend is not None and (config.judge_requests_per_minute or config.judge_tokens_per_minute):
+        scheduler = backend = JudgeScheduler(
+            backend,
+            requests_per_minute=config.judge_requests_per_minute,
+            tokens_per_minute=config.judge_tokens_per_minute
+        )
+    
+    if config.mode not in EVAL_MODES:
+        raise ValueError(f"Unknown evaluation mode: {config.mode}")
+    
+    # Per-category judge models (an ensemble brings its own models)
+    router = None
+    if config.judge_routes and backend is not None and ensemble is None:
+        router = JudgeRouter.from_config(config, backend)
+    
+    def judge_model(category: str) -> str:
+        return router.model_for(category) if router else config.evaluator_model
+    
+    cache = generation_cache
+    if cache is None and (config.generation_cache_path or config.mode == 'hybrid'):
+        cache = GenerationCache(config.generation_cache_path)
+    judge_name = judge_identity(backend, ensemble)
+    
+    # Run RAG pipeline and retrieval evaluation
+    rag_outputs = []
     latencies = []
     
     for example in examples:
         start_time = time.time()
+        settled_metrics = None
         
         # Run RAG pipeline
-        rag_result = rag_system.query(example['query'], top_k=config.retrieval_top_k)
+        with tracer.span("rag", example_id=example['id']) as span:
+            if config.mode == 'full':
+                rag_result = rag_system.query(example['query'], top_k=config.retrieval_top_k)
+                retrieval, generation = rag_result.retrieval, rag_result.generation
+            else:
+                retrieval = rag_system.retrieve(example['query'], top_k=config.retrieval_top_k)
+                generation = None
+                if config.mode == 'hybrid':
+                    key = GenerationCache.key(example, judge_model(example['category']), judge_name)
+                    hit = cache.lookup(key, example['query'], retrieval.chunk_ids)
+                    span.set_attribute('cache_hit', hit is not None)
+                    if hit is not None:
+                        generation, settled_metrics = hit
+                    else:
+                        retrieval, generation = _generate_for(
+                            rag_system, example['query'], retrieval, config.retrieval_top_k
+                        )
         
         total_latency = (time.time() - start_time) * 1000  # ms
+        if settled_metrics is not None:
+            total_latency += generation.latency_ms  # Generation was reused, not rerun
+        if getattr(rag_system, 'replays_latency', False):
+            # Outputs may come from a cache (e.g. a sweep's); use the latency they report
+            if config.mode == 'full':
+                total_latency = rag_result.total_latency_ms
+            else:
+                total_latency = retrieval.latency_ms + (generation.latency_ms if generation is not None else 0.0)
         latencies.append(total_latency)
         
         # Evaluate retrieval
@@ -380,86 +2233,409 @@ def run_evaluation(
             relevant_ids.extend(doc.get('chunk_ids', []))
         
         retrieval_metrics = evaluate_retrieval(
-            retrieved_ids=rag_result.retrieval.chunk_ids,
+            retrieved_ids=retrieval.chunk_ids,
             relevant_ids=relevant_ids
         )
-        
-        # Evaluate generation
-        generation_metrics = evaluate_generation(
-            query=example['query'],
-            context="\n".join(rag_result.retrieval.chunks),
-            response=rag_result.generation.answer,
-            reference=example.get('reference_answer', ''),
-            evaluator_model=config.evaluator_model
-        )
-        
-        results.append({
-            'id': example['id'],
-            'category': example['category'],
-            'retrieval': {
-                'precision': retrieval_metrics.precision,
-                'recall': retrieval_metrics.recall,
-                'mrr': retrieval_metrics.mrr
-            },
-            'generation': {
-                'relevance': generation_metrics.relevance,
-                'accuracy': generation_metrics.accuracy,
-                'completeness': generation_metrics.completeness,
-                'groundedness': generation_metrics.groundedness,
-                'helpfulness': generation_metrics.helpfulness,
-                'overall': generation_metrics.overall
-            },
-            'latency_ms': total_latency
-        })
+        if generation is None or (settled_metrics is not None and groundedness_checker is None):
+            retrieval = _without_text(retrieval)  # Never judged, so the chunk text isn't needed
+        rag_outputs.append((example, retrieval, generation, settled_metrics,
+                            retrieval_metrics, total_latency))
+    
+    # Local groundedness: align each answer's claims to its own retrieved chunks
+    grounding = {}
+    if groundedness_checker is not None:
+        with tracer.span("groundedness"):
+            for i, (_, retrieval, generation, *_) in enumerate(rag_outputs):
+                if generation is not None:
+                    groundedness_checker.index_chunks(retrieval.chunk_ids, retrieval.chunks)
+                    grounding[i] = groundedness_checker.check(generation.answer, retrieval.chunk_ids)
+                    if rag_outputs[i][3] is not None:
+                        rag_outputs[i] = (rag_outputs[i][0], _without_text(retrieval)) + rag_outputs[i][2:]
+    
+    # Settle clear-cut examples by similarity, in one batch, before judging
+    if pre_judge is not None:
+        pending = [i for i, item in enumerate(rag_outputs)
+                   if item[2] is not None and item[3] is None]
+        with tracer.span("pre_judge", examples=len(pending)):
+            pre_scores = pre_judge.score_batch(
+                [rag_outputs[i][2].answer for i in pending],
+                [rag_outputs[i][0].get('reference_answer', '') for i in pending]
+            )
+        for i, metrics in zip(pending, pre_scores):
+            if metrics is not None:
+                rag_outputs[i] = ((rag_outputs[i][0], _without_text(rag_outputs[i][1]))
+                                  + rag_outputs[i][2:3] + (metrics,) + rag_outputs[i][4:])
+    
+    # Evaluate generation (judge calls are I/O bound, so they may run concurrently)
+    def judge_example(item) -> tuple[GenerationMetrics, JudgeParseStats]:
+        example, retrieval, generation, settled_metrics = item[:4]
+        stats = JudgeParseStats()
+        if generation is None:
+            return unscored_generation("Retrieval-only run"), stats
+        if settled_metrics is not None:
+            return settled_metrics, stats
+        try:
+            metrics = evaluate_generation(
+                query=example['query'],
+                context="\n".join(retrieval.chunks),
+                response=generation.answer,
+                reference=example.get('reference_answer', ''),
+                evaluator_model=judge_model(example['category']),
+                backend=router.backend_for(example['category']) if router else backend,
+                max_parse_retries=config.judge_max_parse_retries,
+                parse_stats=stats,
+                ensemble=ensemble
+            )
+        except (JudgeParseError, JudgeBackendError) as e:
+            # Keep the run going; the example is excluded from generation stats
+            print(f"Warning: judge failed for {example['id']}: {e}")
+            metrics = unscored_generation(f"Judge failed: {e}")
+        return metrics, stats
+    
+    def judge_at(i: int) -> tuple[GenerationMetrics, JudgeParseStats]:
+        judged_item = judge_example(rag_outputs[i])
+        # Release this example's chunk text as soon as it has been judged
+        rag_outputs[i] = (rag_outputs[i][0], _without_text(rag_outputs[i][1])) + rag_outputs[i][2:]
+        return judged_item
+    
+    needs_judge = config.mode != 'retrieval_only' and (backend is not None or ensemble is not None)
+    # With routing, each route's semaphore enforces its own limit inside a shared pool
+    workers = max(config.judge_concurrency, router.max_concurrency) if router else config.judge_concurrency
+    with tracer.span("judge", concurrency=workers):
+        if workers > 1 and needs_judge:
+            # Workers run in a copy of this context so their spans nest under "judge"
+            context = contextvars.copy_context()
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                judged = list(pool.map(lambda i: context.copy().run(judge_at, i),
+                                       range(len(rag_outputs))))
+        else:
+            judged = [judge_at(i) for i in range(len(rag_outputs))]
+    
+    results = ResultStore(capacity=len(rag_outputs))
+    parse_stats = JudgeParseStats()
+    
+    for i, (output, (generation_metrics, stats)) in enumerate(zip(rag_outputs, judged)):
+        example, retrieval, generation, settled_metrics, retrieval_metrics, total_latency = output
+        parse_stats.merge(stats)
+        if cache is not None and generation is not None and settled_metrics is None:
+            cache.store(GenerationCache.key(example, judge_model(example['category']), judge_name),
+                        example['query'], retrieval.chunk_ids, generation, generation_metrics)
+        results.append(example['id'], example['category'],
+                       retrieval_metrics, generation_metrics, total_latency)
+        if i in grounding:
+            results.grounding[i] = {
+                'score': grounding[i].score,
+                'mean_support': grounding[i].mean_support,
+                'claims': [
+                    {'claim': c.claim, 'support': c.support, 'chunk_id': c.chunk_id}
+                    for c in grounding[i].claims
+                ]
+            }
+    
+    if cache is not None:
+        cache.save()
     
     # Aggregate results
-    return aggregate_results(results, latencies, config)
+    evaluation = aggregate_results(results, latencies, config, judge_stats=parse_stats)
+    if scheduler is not None:
+        evaluation.system['judge_scheduler'] = scheduler.stats.to_dict()
+    if ensemble is not None:
+        evaluation.system['judge_ensemble'] = ensemble.stats.to_dict()
+    if config.mode == 'hybrid':
+        evaluation.system['generation_cache'] = cache.stats()
+    if pre_judge is not None:
+        evaluation.system['pre_judge'] = pre_judge.stats.to_dict()
+    if router is not None:
+        evaluation.system['judge_routing'] = router.stats()
+    return evaluation
+
+
+def make_result_record(
+    example_id: str,
+    category: str,
+    retrieval_metrics: RetrievalMetrics,
+    generation_metrics: GenerationMetrics,
+    latency_ms: float
+) -> dict:
+    """Per-example result in the shape aggregate_results expects."""
+    return {
+        'id': example_id,
+        'category': category,
+        'retrieval': {
+            'precision': retrieval_metrics.precision,
+            'recall': retrieval_metrics.recall,
+            'mrr': retrieval_metrics.mrr
+        },
+        'generation': {
+            'relevance': generation_metrics.relevance,
+            'accuracy': generation_metrics.accuracy,
+            'completeness': generation_metrics.completeness,
+            'groundedness': generation_metrics.groundedness,
+            'helpfulness': generation_metrics.helpfulness,
+            'overall': generation_metrics.overall
+        },
+        'latency_ms': latency_ms
+    }
+
+
+# Column layout of ResultStore. float64 throughout: float32 scores would
+# surface as e.g. 0.800000011920929 in records, aggregates and reports.
+RESULT_COLUMNS = (
+    [(f'retrieval.{m}', np.float64) for m in ('precision', 'recall', 'mrr')]
+    + [(f'generation.{m}', np.float64) for m in JUDGE_CRITERIA + ('overall',)]
+    + [('latency_ms', np.float64)]
+)
+RESULT_DTYPE = np.dtype(RESULT_COLUMNS)
+
+
+class ResultRecord(dict):
+    """
+    Read-only dict view of one ResultStore row.
+    
+    Records are built on demand, so editing one would be silently lost;
+    mutation raises instead. Write changes back with store[i] = record
+    (dict(record) or copy.deepcopy(record) give mutable copies).
+    """
+    
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("ResultStore records are read-only; assign store[i] = record to update a row")
+    
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+    
+    def __reduce__(self):
+        return dict, (dict(self),)
+
+
+class ResultStore:
+    """
+    Per-example results in a preallocated NumPy structured array.
+    
+    A nested dict per example costs ~2 KB; here an example is 80 bytes
+    of metrics plus its ID string. Categories are stored as small integer
+    codes and optional grounding details sparsely by row. Indexing (by
+    position or slice) or iterating yields read-only ResultRecords in the
+    make_result_record() shape, built on demand, so reporting code can
+    keep treating results as a list of dicts.
+    """
+    
+    def __init__(self, capacity: int = 1024):
+        self._data = np.empty(max(1, capacity), dtype=RESULT_DTYPE)
+        self._size = 0
+        self.ids: list[str] = []
+        self.categories: list[str] = []  # Code -> name
+        self._category_codes: dict = {}
+        self._codes = np.empty(max(1, capacity), dtype=np.int32)
+        self.grounding: dict = {}  # Row -> grounding details
+    
+    @classmethod
+    def from_records(cls, records) -> "ResultStore":
+        """Build from make_result_record()-style dicts (or return a ResultStore as is)."""
+        if isinstance(records, ResultStore):
+            return records
+        store = cls(capacity=len(records))
+        for record in records:
+            store.append_record(record)
+        return store
+    
+    def _grow(self):
+        capacity = len(self._data) * 2
+        self._data = np.resize(self._data, capacity)
+        self._codes = np.resize(self._codes, capacity)
+    
+    def _append_row(self, example_id: str, category: str, values: tuple):
+        if self._size == len(self._data):
+            self._grow()
+        code = self._category_codes.get(category)
+        if code is None:
+            code = self._category_codes[category] = len(self.categories)
+            self.categories.append(category)
+        self._data[self._size] = values
+        self._codes[self._size] = code
+        self.ids.append(example_id)
+        self._size += 1
+    
+    def append(
+        self,
+        example_id: str,
+        category: str,
+        retrieval_metrics: RetrievalMetrics,
+        generation_metrics: GenerationMetrics,
+        latency_ms: float
+    ):
+        self._append_row(example_id, category, (
+            retrieval_metrics.precision, retrieval_metrics.recall, retrieval_metrics.mrr,
+            *(getattr(generation_metrics, c) for c in JUDGE_CRITERIA),
+            generation_metrics.overall, latency_ms
+        ))
+    
+    @staticmethod
+    def _record_values(record: dict) -> tuple:
+        retrieval, generation = record['retrieval'], record['generation']
+        return (
+            retrieval['precision'], retrieval['recall'], retrieval['mrr'],
+            *(generation[c] for c in JUDGE_CRITERIA),
+            generation['overall'], record['latency_ms']
+        )
+    
+    def append_record(self, record: dict):
+        """Append one make_result_record()-style dict."""
+        self._append_row(record['id'], record['category'], self._record_values(record))
+        if 'grounding' in record:
+            self.grounding[self._size - 1] = record['grounding']
+    
+    def column(self, name: str) -> np.ndarray:
+        """Metric column, e.g. 'retrieval.precision' or 'latency_ms' (a view, not a copy)."""
+        return self._data[name][:self._size]
+    
+    @property
+    def category_codes(self) -> np.ndarray:
+        return self._codes[:self._size]
+    
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held (columns, ID strings and category codes)."""
+        return (self._data.nbytes + self._codes.nbytes
+                + sum(sys.getsizeof(i) for i in self.ids) + sys.getsizeof(self.ids))
+    
+    def __len__(self) -> int:
+        return self._size
+    
+    def _index(self, index: int) -> int:
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("result index out of range")
+        return index
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._size))]
+        index = self._index(index)
+        row = self._data[index]
+        record = {
+            'id': self.ids[index],
+            'category': self.categories[self._codes[index]],
+            'retrieval': ResultRecord((m, float(row[f'retrieval.{m}'])) for m in ('precision', 'recall', 'mrr')),
+            'generation': ResultRecord((m, float(row[f'generation.{m}'])) for m in JUDGE_CRITERIA + ('overall',)),
+            'latency_ms': float(row['latency_ms'])
+        }
+        if index in self.grounding:
+            record['grounding'] = self.grounding[index]
+        return ResultRecord(record)
+    
+    def __setitem__(self, index: int, record: dict):
+        """Overwrite a row's metrics (and grounding) from a make_result_record()-style dict."""
+        index = self._index(index)
+        if record['id'] != self.ids[index] or record['category'] != self.categories[self._codes[index]]:
+            raise ValueError("A row's id and category can't be changed")
+        self._data[index] = self._record_values(record)
+        if 'grounding' in record:
+            self.grounding[index] = record['grounding']
+        else:
+            self.grounding.pop(index, None)
+    
+    def __iter__(self):
+        return (self[i] for i in range(self._size))
+    
+    def to_list(self) -> list[dict]:
+        return list(self)
+
 
+def unscored_generation(reasoning: str) -> GenerationMetrics:
+    """Placeholder metrics for an example without a generation score."""
+    nan = float('nan')
+    return GenerationMetrics(
+        relevance=nan,
+        accuracy=nan,
+        completeness=nan,
+        groundedness=nan,
+        helpfulness=nan,
+        overall=nan,
+        reasoning=reasoning
+    )
+
+
+def _nanmean(values) -> float:
+    """Mean ignoring NaN; NaN (without a warning) if nothing was scored."""
+    values = np.asarray(values, dtype=float)
+    return float(np.nanmean(values)) if np.any(~np.isnan(values)) else float('nan')
+
+
+def _nanstd(values) -> float:
+    values = np.asarray(values, dtype=float)
+    return float(np.nanstd(values)) if np.any(~np.isnan(values)) else float('nan')
+
+
+def _nanmin(values) -> float:
+    values = np.asarray(values, dtype=float)
+    return float(np.nanmin(values)) if np.any(~np.isnan(values)) else float('nan')
 
+
+@traced("aggregate_results")
 def aggregate_results(
     results: list[dict],
     latencies: list[float],
-    config: EvalConfig
+    config: EvalConfig,
+    judge_stats: Optional[JudgeParseStats] = None
 ) -> EvalResults:
-    """Aggregate individual results into summary statistics."""
+    """
+    Aggregate individual results into summary statistics.
+    
+    Scores use NaN-aware statistics so examples the judge could not
+    score (or production samples without relevance labels) do not
+    poison the means. results may be a list of make_result_record()
+    dicts or a ResultStore; the returned EvalResults.detailed is always
+    a ResultStore.
+    """
+    
+    store = ResultStore.from_records(results)
+    precision = store.column('retrieval.precision')
+    recall = store.column('retrieval.recall')
+    overall = store.column('generation.overall')
     
     # Retrieval aggregation
     retrieval_agg = {
         'precision': {
-            'mean': np.mean([r['retrieval']['precision'] for r in results]),
-            'std': np.std([r['retrieval']['precision'] for r in results]),
-            'min': np.min([r['retrieval']['precision'] for r in results]),
+            'mean': _nanmean(precision),
+            'std': _nanstd(precision),
+            'min': _nanmin(precision),
             'target': config.retrieval_precision_target,
-            'meets_target': np.mean([r['retrieval']['precision'] for r in results]) >= config.retrieval_precision_target
+            'meets_target': _nanmean(precision) >= config.retrieval_precision_target
         },
         'recall': {
-            'mean': np.mean([r['retrieval']['recall'] for r in results]),
-            'std': np.std([r['retrieval']['recall'] for r in results]),
+            'mean': _nanmean(recall),
+            'std': _nanstd(recall),
             'target': config.retrieval_recall_target,
-            'meets_target': np.mean([r['retrieval']['recall'] for r in results]) >= config.retrieval_recall_target
+            'meets_target': _nanmean(recall) >= config.retrieval_recall_target
         },
         'mrr': {
-            'mean': np.mean([r['retrieval']['mrr'] for r in results])
+            'mean': _nanmean(store.column('retrieval.mrr'))
         }
     }
     
     # Generation aggregation
     generation_agg = {
         'overall': {
-            'mean': np.mean([r['generation']['overall'] for r in results]),
-            'std': np.std([r['generation']['overall'] for r in results]),
+            'mean': _nanmean(overall),
+            'std': _nanstd(overall),
             'target': config.generation_overall_target,
-            'meets_target': np.mean([r['generation']['overall'] for r in results]) >= config.generation_overall_target
+            'meets_target': _nanmean(overall) >= config.generation_overall_target
         },
         'by_criterion': {
-            'relevance': np.mean([r['generation']['relevance'] for r in results]),
-            'accuracy': np.mean([r['generation']['accuracy'] for r in results]),
-            'completeness': np.mean([r['generation']['completeness'] for r in results]),
-            'groundedness': np.mean([r['generation']['groundedness'] for r in results]),
-            'helpfulness': np.mean([r['generation']['helpfulness'] for r in results])
+            criterion: _nanmean(store.column(f'generation.{criterion}'))
+            for criterion in JUDGE_CRITERIA
         }
     }
     
+    grounded = list(store.grounding.values())
+    if grounded:
+        generation_agg['local_groundedness'] = {
+            'mean': _nanmean([g['score'] for g in grounded]),
+            'mean_support': _nanmean([g['mean_support'] for g in grounded]),
+            'claims': sum(len(g['claims']) for g in grounded)
+        }
+    
     # System metrics
     system_agg = {
         'latency': {
@@ -470,21 +2646,18 @@ def aggregate_results(
             'meets_target': np.percentile(latencies, 95) <= config.latency_p95_target * 1000
         }
     }
+    if judge_stats is not None:
+        system_agg['judge'] = judge_stats.to_dict()
     
     # By category
-    categories = {}
-    for r in results:
-        cat = r['category']
-        if cat not in categories:
-            categories[cat] = []
-        categories[cat].append(r)
-    
+    codes = store.category_codes
     by_category = {}
-    for cat, cat_results in categories.items():
+    for code, cat in enumerate(store.categories):
+        mask = codes == code
         by_category[cat] = {
-            'count': len(cat_results),
-            'retrieval_precision': np.mean([r['retrieval']['precision'] for r in cat_results]),
-            'generation_overall': np.mean([r['generation']['overall'] for r in cat_results])
+            'count': int(mask.sum()),
+            'retrieval_precision': _nanmean(precision[mask]),
+            'generation_overall': _nanmean(overall[mask])
         }
     
     return EvalResults(
@@ -492,13 +2665,14 @@ def aggregate_results(
         config={
             'golden_dataset': config.golden_dataset_path,
             'retrieval_top_k': config.retrieval_top_k,
-            'evaluator_model': config.evaluator_model
+            'evaluator_model': config.evaluator_model,
+            'mode': config.mode
         },
         retrieval=retrieval_agg,
         generation=generation_agg,
         system=system_agg,
         by_category=by_category,
-        detailed=results
+        detailed=store
     )
 
 
@@ -570,21 +2744,153 @@ def detect_drift(
     }
 
 
+# =============================================================================
+# EXAMPLE-LEVEL DIFF
+# =============================================================================
+
+# (section, metric, direction): direction is +1 where higher is better
+DIFF_METRICS = (
+    [('retrieval', m, 1) for m in ('precision', 'recall', 'mrr')]
+    + [('generation', m, 1) for m in JUDGE_CRITERIA + ('overall',)]
+    + [('latency_ms', None, -1)]
+)
+
+
+def _metric_name(section: str, metric: Optional[str]) -> str:
+    return f"{section}.{metric}" if metric else section
+
+
+def diff_results(
+    current: EvalResults,
+    baseline: EvalResults,
+    rank_by: str = 'generation.overall',
+    top_k: int = 10,
+    tolerance: float = 1e-9
+) -> dict:
+    """
+    Example-level diff between two runs, joined by example ID.
+    
+    Where detect_drift() says *that* a metric moved, this says *which*
+    examples moved it. Deltas are current - baseline; a regression is a
+    change in the bad direction (lower score, higher latency).
+    
+    Args:
+        current: Current evaluation results
+        baseline: Baseline evaluation results
+        rank_by: Metric used to rank regressions/improvements
+            (e.g. 'retrieval.precision', 'latency_ms')
+        top_k: Number of regressions and improvements to return
+        tolerance: Absolute change below which an example is unchanged
+    
+    Returns:
+        Dict with join counts, per-metric summaries and the top-k
+        regressions and improvements on `rank_by`
+    """
+    metrics = {_metric_name(s, m): (s, m, d) for s, m, d in DIFF_METRICS}
+    if rank_by not in metrics:
+        raise ValueError(f"Unknown metric: {rank_by} (expected one of {sorted(metrics)})")
+    
+    current_store = ResultStore.from_records(current.detailed)
+    baseline_store = ResultStore.from_records(baseline.detailed)
+    baseline_rows = {example_id: i for i, example_id in enumerate(baseline_store.ids)}
+    current_rows, matched_rows = [], []
+    for i, example_id in enumerate(current_store.ids):
+        j = baseline_rows.get(example_id)
+        if j is not None:
+            current_rows.append(i)
+            matched_rows.append(j)
+    current_rows = np.asarray(current_rows, dtype=np.int64)
+    matched_rows = np.asarray(matched_rows, dtype=np.int64)
+    
+    summary, deltas = {}, {}
+    for name, (_, _, direction) in metrics.items():
+        delta = (current_store.column(name)[current_rows].astype(float)
+                 - baseline_store.column(name)[matched_rows])
+        deltas[name] = delta
+        signed = delta * direction
+        scored = ~np.isnan(signed)
+        summary[name] = {
+            'mean_delta': float(np.mean(delta[scored])) if scored.any() else float('nan'),
+            'regressed': int(np.sum(signed[scored] < -tolerance)),
+            'improved': int(np.sum(signed[scored] > tolerance)),
+            'unchanged': int(np.sum(np.abs(signed[scored]) <= tolerance)),
+            'unscored': int(np.sum(~scored))
+        }
+    
+    # Heap-based top-k over the changed examples only (no full sort)
+    signed = deltas[rank_by] * metrics[rank_by][2]
+    worse = np.flatnonzero(signed < -tolerance).tolist()
+    better = np.flatnonzero(signed > tolerance).tolist()
+    key = signed.tolist().__getitem__
+    
+    def row(i: int) -> dict:
+        current_row = current_rows[i]
+        return {
+            'id': current_store.ids[current_row],
+            'category': current_store.categories[current_store.category_codes[current_row]],
+            'delta': float(deltas[rank_by][i]),
+            'deltas': {name: float(d[i]) for name, d in deltas.items()}
+        }
+    
+    return {
+        'rank_by': rank_by,
+        'joined': len(current_rows),
+        'only_in_current': len(current_store) - len(current_rows),
+        'only_in_baseline': len(baseline_store) - len(current_rows),
+        'summary': summary,
+        'regressions': [row(i) for i in heapq.nsmallest(top_k, worse, key=key)],
+        'improvements': [row(i) for i in heapq.nlargest(top_k, better, key=key)]
+    }
+
+
+def format_diff_table(diff: dict, columns: tuple = ('retrieval.precision', 'retrieval.recall',
+                                                  'generation.overall', 'latency_ms')) -> str:
+    """Compact markdown tables for a diff_results() output."""
+    header = "| ID | Category | " + " | ".join(f"Δ {c}" for c in columns) + " |\n"
+    header += "|:---|:---------|" + "|".join("------:" for _ in columns) + "|\n"
+    
+    def rows(entries: list[dict]) -> str:
+        return "".join(
+            f"| {e['id']} | {e['category']} | "
+            + " | ".join(f"{e['deltas'][c]:+.3f}" if c != 'latency_ms' else f"{e['deltas'][c]:+.0f}ms"
+                         for c in columns)
+            + " |\n"
+            for e in entries
+        )
+    
+    out = (f"**Joined:** {diff['joined']} examples "
+           f"(+{diff['only_in_current']} new, -{diff['only_in_baseline']} removed)\n\n")
+    out += "| Metric | Mean Δ | Regressed | Improved | Unchanged |\n"
+    out += "|:-------|-------:|----------:|---------:|----------:|\n"
+    for name, s in diff['summary'].items():
+        out += f"| {name} | {s['mean_delta']:+.3f} | {s['regressed']} | {s['improved']} | {s['unchanged']} |\n"
+    out += f"\n### Top Regressions ({diff['rank_by']})\n\n" + header + rows(diff['regressions'])
+    out += f"\n### Top Improvements ({diff['rank_by']})\n\n" + header + rows(diff['improvements'])
+    return out
+
+
 # =============================================================================
 # REPORTING
 # =============================================================================
 
+@traced("generate_report")
 def generate_report(results: EvalResults, format: str = 'markdown') -> str:
     """Generate evaluation report."""
     
     if format == 'markdown':
         return _generate_markdown_report(results)
     elif format == 'json':
-        return json.dumps(results.__dict__, indent=2, default=str)
+        return json.dumps(results.__dict__, indent=2, default=_json_default)
     else:
         raise ValueError(f"Unknown format: {format}")
 
 
+def _json_default(value):
+    if isinstance(value, ResultStore):
+        return value.to_list()  # Dict views are only built for reporting
+    return str(value)
+
+
 def _generate_markdown_report(results: EvalResults) -> str:
     """Generate markdown evaluation report."""
     
@@ -612,6 +2918,13 @@ def _generate_markdown_report(results: EvalResults) -> str:
 | Completeness | {results.generation['by_criterion']['completeness']:.2f} | - | - |
 | Groundedness | {results.generation['by_criterion']['groundedness']:.2f} | - | - |
 | Helpfulness | {results.generation['by_criterion']['helpfulness']:.2f} | - | - |
+"""
+    
+    local = results.generation.get('local_groundedness')
+    if local:
+        report += f"| Local Groundedness (claims supported) | {local['mean']:.1%} of {local['claims']} claims | - | - |\n"
+    
+    report += f"""
 
 ### System Metrics
 
@@ -620,7 +2933,35 @@ def _generate_markdown_report(results: EvalResults) -> str:
 | Latency P50 | {results.system['latency']['p50']:.0f}ms | - | - |
 | Latency P95 | {results.system['latency']['p95']:.0f}ms | {results.system['latency']['target_p95']:.0f}ms | {'✅' if results.system['latency']['meets_target'] else '❌'} |
 | Latency P99 | {results.system['latency']['p99']:.0f}ms | - | - |
-
+"""
+    
+    judge = results.system.get('judge')
+    if judge and judge['judge_calls']:
+        report += f"| Judge Parse Failure Rate | {judge['parse_failure_rate']:.1%} | - | - |\n"
+        report += f"| Judge Retries / Unscored | {judge['retries']} / {judge['unrecoverable']} | - | - |\n"
+    
+    scheduler = results.system.get('judge_scheduler')
+    if scheduler:
+        report += f"| Judge Throughput | {scheduler['requests_per_minute']:.1f} req/min, {scheduler['tokens_per_minute']:.0f} tok/min | - | - |\n"
+        report += f"| Judge Throttle / Backoff | {scheduler['throttle_seconds']:.1f}s / {scheduler['backoff_seconds']:.1f}s | - | - |\n"
+        report += f"| Judge 429s / Retries | {scheduler['rate_limited']} / {scheduler['retries']} | - | - |\n"
+    
+    pre_judge = results.system.get('pre_judge')
+    if pre_judge:
+        report += f"| Judge Calls Saved by Pre-Judge | {pre_judge['judge_calls_saved']} of {pre_judge['examples']} ({pre_judge['savings_rate']:.1%}) | - | - |\n"
+    
+    cache = results.system.get('generation_cache')
+    if cache:
+        report += f"| Generation Cache Hit Rate | {cache['hit_rate']:.1%} ({cache['hits']} reused) | - | - |\n"
+    
+    ensemble = results.system.get('judge_ensemble')
+    if ensemble:
+        mad = np.mean(list(ensemble['mean_abs_diff'].values()))
+        agreement = np.mean(list(ensemble['agreement_rate'].values()))
+        report += f"| Ensemble Escalation Rate | {ensemble['escalation_rate']:.1%} | - | - |\n"
+        report += f"| Inter-Judge Agreement | {agreement:.1%} (mean abs diff {mad:.2f}) | - | - |\n"
+    
+    report += """
 ## Results by Category
 
 | Category | Count | Retrieval Precision | Generation Overall |
@@ -630,6 +2971,46 @@ def _generate_markdown_report(results: EvalResults) -> str:
     for cat, stats in results.by_category.items():
         report += f"| {cat} | {stats['count']} | {stats['retrieval_precision']:.3f} | {stats['generation_overall']:.2f} |\n"
     
+    routing = results.system.get('judge_routing')
+    if routing:
+        report += """
+### Judge Cost by Category
+
+| Category | Judge Model | Calls | Cache Hits | Mean Latency | Cost |
+|:---------|:------------|------:|-----------:|-------------:|-----:|
+"""
+        for cat, route in routing.items():
+            cost = f"${route['cost']:.4f}" if route['cost'] == route['cost'] else "-"
+            report += (f"| {cat} | {route['model']} | {route['calls']} | {route['cache_hits']} "
+                       f"| {route['mean_latency_ms']:.0f}ms | {cost} |\n")
+        total = sum(r['cost'] for r in routing.values() if r['cost'] == r['cost'])
+        report += f"| **Total** | | {sum(r['calls'] for r in routing.values())} | | | **${total:.4f}** |\n"
+    
+    stages = results.system.get('stages')
+    if stages:
+        wall = stages.get('run_evaluation', {}).get('total_ms') or max(s['total_ms'] for s in stages.values())
+        report += """
+## Time by Stage
+
+| Stage | Calls | Total | Mean | Max | Share of Run |
+|:------|------:|------:|-----:|----:|-------------:|
+"""
+        for name, stage in sorted(stages.items(), key=lambda item: -item[1]['total_ms']):
+            report += (f"| {name} | {stage['count']} | {stage['total_ms']:.1f}ms | {stage['mean_ms']:.2f}ms "
+                       f"| {stage['max_ms']:.1f}ms | {stage['total_ms'] / wall:.1%} |\n")
+        report += "\nStages nest (evaluate_generation runs inside judge) and judge calls may overlap, so shares do not sum to 100%.\n"
+    
+    profile = results.system.get('profile')
+    if profile:
+        report += """
+### Profiler Hot Spots
+
+| Frame | Samples | Share |
+|:------|--------:|------:|
+"""
+        for entry in profile:
+            report += f"| `{entry['frame']}` | {entry['samples']} | {entry['share']:.1%} |\n"
+    
     report += f"""
 
 ## Configuration
@@ -669,6 +3050,7 @@ if __name__ == "__main__":
     print("        retrieval_precision_target=0.8")
     print("    )")
     print()
-    print("    results = run_evaluation(my_rag_system, config)")
+    print("    # HeuristicJudge() runs offline; OpenAICompatibleJudge() calls a real model")
+    print("    results = run_evaluation(my_rag_system, config, backend=HeuristicJudge())")
     print("    report = generate_report(results, format='markdown')")
     print("    print(report)")
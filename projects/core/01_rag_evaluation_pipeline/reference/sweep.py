@@ -0,0 +1,445 @@
+"""
+Parameter Sweeps - Tuning EvalConfig Against Quality, Latency and Cost
+
+Runs run_evaluation() over a grid or random sample of EvalConfig values
+(retrieval_top_k, evaluator_model, ...) in parallel. RAG outputs and
+judge verdicts are shared across configurations whose inputs coincide,
+so a sweep over four judge models calls the RAG system once per query,
+not four times. Judge rate limits and the generation cache file are
+shared by every configuration too. Results are ranked on a Pareto
+frontier of quality vs p95 latency vs cost per query.
+
+Usage:
+    sweep = run_sweep(
+        my_rag_system,
+        EvalConfig(golden_dataset_path='golden_dataset.yaml'),
+        space={'retrieval_top_k': [3, 5, 8], 'evaluator_model': ['gpt-4o-mini', 'gpt-4o']},
+        backend=OpenAICompatibleJudge(),
+        generator_model='gpt-4o-mini'
+    )
+    print(format_sweep_table(sweep))
+
+Requirements:
+    pip install numpy pyyaml
+"""
+
+import random
+import itertools
+import threading
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field, fields, replace
+from typing import Callable, Optional
+
+from rag_eval_pipeline import (
+    EvalConfig, EvalResults, RAGResult, RetrievalResult, GenerationResult,
+    JudgeBackend, JudgeRequest, JudgeParseError, JudgeScheduler, GenerationCache,
+    MODEL_PRICES, estimate_cost, parse_judge_response, run_evaluation
+)
+
+
+# =============================================================================
+# SEARCH SPACES
+# =============================================================================
+
+# Resources every configuration shares, so they can't vary within a sweep
+_SHARED_FIELDS = ('judge_requests_per_minute', 'judge_tokens_per_minute', 'generation_cache_path')
+
+
+def _check_space(space: dict):
+    known = {f.name for f in fields(EvalConfig)}
+    unknown = set(space) - known
+    if unknown:
+        raise ValueError(f"Not EvalConfig fields: {sorted(unknown)}")
+    shared = set(space) & set(_SHARED_FIELDS)
+    if shared:
+        raise ValueError(f"Shared across the sweep, set on base_config instead: {sorted(shared)}")
+
+
+def grid_space(space: dict) -> list[dict]:
+    """Every combination of the values in space ({field: [values]})."""
+    _check_space(space)
+    names = list(space)
+    return [dict(zip(names, values)) for values in itertools.product(*space.values())]
+
+
+def random_space(space: dict, n: int, seed: int = 0) -> list[dict]:
+    """n distinct random combinations (all of them if the grid is smaller)."""
+    grid = grid_space(space)
+    return random.Random(seed).sample(grid, min(n, len(grid)))
+
+
+# =============================================================================
+# SHARED CACHES
+# =============================================================================
+
+class _SingleFlight:
+    """
+    Thread-safe memo where concurrent callers of the same key share one call.
+    
+    Failed calls (and results rejected by `cacheable`) are not kept, so
+    the next caller retries.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: dict = {}
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key, compute: Callable, cacheable: Callable = lambda result: True):
+        return self.lookup(key, compute, cacheable)[0]
+    
+    def lookup(self, key, compute: Callable, cacheable: Callable = lambda result: True) -> tuple:
+        """(result, computed): computed is False when the result was shared or memoized."""
+        with self._lock:
+            entry = self._entries.get(key)
+            owner = entry is None
+            if owner:
+                entry = self._entries[key] = Future()
+                self.misses += 1
+            else:
+                self.hits += 1
+        
+        if not owner:
+            return entry.result(), False
+        try:
+            result = compute()
+        except BaseException as e:
+            with self._lock:
+                del self._entries[key]
+            entry.set_exception(e)
+            raise
+        if not cacheable(result):
+            with self._lock:
+                del self._entries[key]
+        entry.set_result(result)
+        return result, True
+    
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+
+class SharedRAGCache:
+    """
+    RAG outputs memoized across sweep configurations.
+    
+    query() and retrieve() are keyed on (query, top_k); generate() on the
+    query and the retrieved chunk IDs. Replayed results keep the latency
+    the RAG system originally reported.
+    """
+    
+    def __init__(self, rag_system):
+        self.rag_system = rag_system
+        self.memo = _SingleFlight()
+    
+    def query(self, query: str, top_k: int = 5) -> RAGResult:
+        return self.memo.get(('query', query, top_k),
+                             lambda: self.rag_system.query(query, top_k=top_k))
+    
+    def retrieve(self, query: str, top_k: int = 5) -> RetrievalResult:
+        return self.memo.get(('retrieve', query, top_k),
+                             lambda: self.rag_system.retrieve(query, top_k=top_k))
+    
+    def generate(self, query: str, retrieval: RetrievalResult) -> GenerationResult:
+        return self.memo.get(('generate', query, tuple(retrieval.chunk_ids)),
+                             lambda: self.rag_system.generate(query, retrieval))
+
+
+def _parses(text: str) -> bool:
+    try:
+        parse_judge_response(text)
+        return True
+    except JudgeParseError:
+        return False
+
+
+class SharedJudgeCache(JudgeBackend):
+    """Judge verdicts memoized on (model, prompt); unparseable output is not kept."""
+    
+    def __init__(self, backend: JudgeBackend):
+        self.backend = backend
+        self.memo = _SingleFlight()
+    
+    def complete(self, request: JudgeRequest) -> str:
+        return self.lookup(request)[0]
+    
+    def identity(self) -> str:
+        return self.backend.identity()
+    
+    def lookup(self, request: JudgeRequest) -> tuple[str, bool]:
+        """(verdict, called): called is True only if the backend was actually called."""
+        return self.memo.lookup((request.model, request.prompt),
+                                lambda: self.backend.complete(request), cacheable=_parses)
+
+
+# =============================================================================
+# PER-CONFIGURATION METERING
+# =============================================================================
+
+class _MeteredRAG:
+    """One configuration's view of the shared RAG cache, counting tokens."""
+    
+    replays_latency = True  # Cached results keep the latency the RAG system reported
+    
+    def __init__(self, shared: SharedRAGCache, has_generate: bool):
+        self.shared = shared
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self._lock = threading.Lock()
+        if has_generate:
+            self.generate = self._generate
+    
+    def _count(self, generation: GenerationResult):
+        with self._lock:
+            self.input_tokens += generation.input_tokens
+            self.output_tokens += generation.output_tokens
+    
+    def query(self, query: str, top_k: int = 5) -> RAGResult:
+        result = self.shared.query(query, top_k)
+        self._count(result.generation)
+        return result
+    
+    def retrieve(self, query: str, top_k: int = 5) -> RetrievalResult:
+        return self.shared.retrieve(query, top_k)
+    
+    def _generate(self, query: str, retrieval: RetrievalResult) -> GenerationResult:
+        generation = self.shared.generate(query, retrieval)
+        self._count(generation)
+        return generation
+
+
+class _MeteredJudge(JudgeBackend):
+    """
+    One configuration's view of the shared judge cache, counting tokens.
+    
+    input/output_tokens are what this configuration would spend on its
+    own (used to price and rank it); billed_* count only the calls that
+    actually reached the backend, so cache hits cost nothing. Tokens are
+    also kept per request model, so judge_routes that send categories to
+    different models are priced at each model's rate.
+    """
+    
+    def __init__(self, shared: SharedJudgeCache):
+        self.shared = shared
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.billed_input_tokens = 0
+        self.billed_output_tokens = 0
+        self.tokens_by_model: dict = {}  # model -> [input, output, billed input, billed output]
+        self._lock = threading.Lock()
+    
+    def identity(self) -> str:
+        return self.shared.identity()
+    
+    def complete(self, request: JudgeRequest) -> str:
+        text, called = self.shared.lookup(request)
+        input_tokens, output_tokens = len(request.prompt) // 4, len(text) // 4  # ~4 characters per token
+        with self._lock:
+            self.input_tokens += input_tokens
+            self.output_tokens += output_tokens
+            counts = self.tokens_by_model.setdefault(request.model, [0, 0, 0, 0])
+            counts[0] += input_tokens
+            counts[1] += output_tokens
+            if called:
+                self.billed_input_tokens += input_tokens
+                self.billed_output_tokens += output_tokens
+                counts[2] += input_tokens
+                counts[3] += output_tokens
+        return text
+    
+    def cost(self, prices: dict, billed: bool = False) -> float:
+        """USD for the tokens counted so far, each model at its own price."""
+        with self._lock:
+            counts = [(model, tuple(tokens)) for model, tokens in self.tokens_by_model.items()]
+        offset = 2 if billed else 0
+        return sum(estimate_cost(model, tokens[offset], tokens[offset + 1], prices)
+                   for model, tokens in counts)
+
+
+# =============================================================================
+# SWEEP
+# =============================================================================
+
+@dataclass
+class SweepPoint:
+    """One evaluated configuration."""
+    params: dict
+    results: EvalResults
+    quality: float
+    latency_p95_ms: float
+    cost_per_query: float  # Cost of running this configuration on its own
+    judge_cost_per_query: float
+    judge_spend: float = 0.0  # Judge cost actually incurred in the sweep (cache hits are free)
+    on_frontier: bool = False
+
+
+@dataclass
+class SweepResult:
+    """All sweep points plus cache statistics."""
+    points: list[SweepPoint]
+    quality_metric: str
+    cache: dict = field(default_factory=dict)
+    
+    @property
+    def frontier(self) -> list[SweepPoint]:
+        return [p for p in self.points if p.on_frontier]
+    
+    @property
+    def judge_spend(self) -> float:
+        return sum(p.judge_spend for p in self.points)
+
+
+def _dominates(a: SweepPoint, b: SweepPoint) -> bool:
+    no_worse = (a.quality >= b.quality and a.latency_p95_ms <= b.latency_p95_ms
+                and a.cost_per_query <= b.cost_per_query)
+    better = (a.quality > b.quality or a.latency_p95_ms < b.latency_p95_ms
+              or a.cost_per_query < b.cost_per_query)
+    return no_worse and better
+
+
+def pareto_frontier(points: list[SweepPoint]) -> list[SweepPoint]:
+    """
+    Mark and return the non-dominated points.
+    
+    Maximizes quality, minimizes p95 latency and cost. Points with a NaN
+    objective (e.g. unpriced models) are never on the frontier.
+    """
+    valid = [p for p in points
+             if p.quality == p.quality and p.cost_per_query == p.cost_per_query]
+    for p in points:
+        p.on_frontier = p in valid and not any(_dominates(q, p) for q in valid if q is not p)
+    return [p for p in points if p.on_frontier]
+
+
+def run_sweep(
+    rag_system,
+    base_config: EvalConfig,
+    space: dict,
+    backend: Optional[JudgeBackend] = None,
+    search: str = "grid",
+    n_samples: int = 20,
+    seed: int = 0,
+    max_workers: int = 4,
+    quality_metric: str = "generation.overall",
+    generator_model: Optional[str] = None,
+    prices: Optional[dict] = None
+) -> SweepResult:
+    """
+    Evaluate every configuration in a search space and rank them.
+    
+    Args:
+        rag_system: RAG system to evaluate
+        base_config: Values for every field not in space
+        space: {EvalConfig field: [candidate values]}
+        backend: Judge backend, shared (and memoized) across configurations.
+            base_config's judge rate limits pace it once for the whole
+            sweep, and its generation_cache_path is one shared cache.
+        search: "grid" (every combination) or "random" (n_samples of them)
+        n_samples: Number of configurations for random search
+        seed: Seed for random search
+        max_workers: Configurations evaluated in parallel
+        quality_metric: '<section>.<metric>' whose mean is the quality axis,
+            e.g. 'retrieval.precision' for retrieval-only sweeps
+        generator_model: Model name used to price the RAG system's own
+            generation tokens (omit to count judge cost only)
+        prices: {model: (input, output) USD per 1K tokens}; defaults to MODEL_PRICES
+    
+    Returns:
+        SweepResult with every point, the Pareto frontier marked
+    """
+    if search == "grid":
+        candidates = grid_space(space)
+    elif search == "random":
+        candidates = random_space(space, n_samples, seed)
+    else:
+        raise ValueError(f"Unknown search: {search}")
+    
+    section, metric = quality_metric.split('.', 1)
+    prices = prices or MODEL_PRICES
+    
+    # One scheduler for the whole sweep: per-configuration schedulers would
+    # each get the full limit, multiplying real RPM/TPM by max_workers
+    scheduler = None
+    if backend is not None and (base_config.judge_requests_per_minute or base_config.judge_tokens_per_minute):
+        scheduler = backend = JudgeScheduler(
+            backend,
+            requests_per_minute=base_config.judge_requests_per_minute,
+            tokens_per_minute=base_config.judge_tokens_per_minute
+        )
+    generation_cache = (GenerationCache(base_config.generation_cache_path)
+                        if base_config.generation_cache_path else None)
+    base_config = replace(base_config, judge_requests_per_minute=None, judge_tokens_per_minute=None)
+    
+    shared_rag = SharedRAGCache(rag_system)
+    shared_judge = SharedJudgeCache(backend) if backend is not None else None
+    
+    def evaluate(params: dict) -> SweepPoint:
+        config = replace(base_config, **params)
+        rag = _MeteredRAG(shared_rag, has_generate=hasattr(rag_system, 'generate'))
+        judge = _MeteredJudge(shared_judge) if shared_judge is not None else None
+        results = run_evaluation(rag, config, backend=judge, generation_cache=generation_cache)
+        
+        n = max(1, len(results.detailed))
+        # Priced per request model: judge_routes may send categories elsewhere
+        judge_cost = judge.cost(prices) if judge is not None else 0.0
+        judge_spend = judge.cost(prices, billed=True) if judge is not None else 0.0
+        generation_cost = (estimate_cost(generator_model, rag.input_tokens, rag.output_tokens, prices)
+                           if generator_model else 0.0)
+        results.system['cost'] = {
+            'per_query': (judge_cost + generation_cost) / n,
+            'judge_per_query': judge_cost / n,
+            'generation_tokens': rag.input_tokens + rag.output_tokens,
+            'judge_tokens': judge.input_tokens + judge.output_tokens if judge is not None else 0,
+            'judge_billed_tokens': (judge.billed_input_tokens + judge.billed_output_tokens
+                                    if judge is not None else 0)
+        }
+        return SweepPoint(
+            params=params,
+            results=results,
+            quality=getattr(results, section)[metric]['mean'],
+            latency_p95_ms=results.system['latency']['p95'],
+            cost_per_query=(judge_cost + generation_cost) / n,
+            judge_cost_per_query=judge_cost / n,
+            judge_spend=judge_spend
+        )
+    
+    # Workers run in a copy of this context so an active tracer follows them
+    context = contextvars.copy_context()
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        points = list(pool.map(lambda params: context.copy().run(evaluate, params), candidates))
+    
+    pareto_frontier(points)
+    return SweepResult(
+        points=points,
+        quality_metric=quality_metric,
+        cache={
+            'rag': shared_rag.memo.stats(),
+            'judge': shared_judge.memo.stats() if shared_judge is not None else None,
+            'judge_scheduler': scheduler.stats.to_dict() if scheduler is not None else None
+        }
+    )
+
+
+def format_sweep_table(sweep: SweepResult) -> str:
+    """Markdown table of sweep points, frontier first, best quality first."""
+    names = list(sweep.points[0].params) if sweep.points else []
+    ordered = sorted(sweep.points, key=lambda p: (not p.on_frontier, -p.quality))
+    
+    out = "| Pareto | " + " | ".join(names) + f" | {sweep.quality_metric} | P95 Latency | Cost/Query |\n"
+    out += "|:------:|" + "|".join(":---" for _ in names) + "|------:|------:|------:|\n"
+    for p in ordered:
+        out += (f"| {'★' if p.on_frontier else ''} | "
+                + " | ".join(str(p.params[n]) for n in names)
+                + f" | {p.quality:.3f} | {p.latency_p95_ms:.0f}ms | ${p.cost_per_query:.5f} |\n")
+    
+    rag, judge = sweep.cache['rag'], sweep.cache['judge']
+    out += f"\nShared cache reuse: RAG {rag['hit_rate']:.1%}"
+    if judge:
+        out += f", judge {judge['hit_rate']:.1%}"
+    return out + "\n"
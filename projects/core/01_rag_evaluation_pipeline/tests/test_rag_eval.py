@@ -115,3 +115,904 @@ def test_detect_drift_latency():
     drift = eval_pipe.detect_drift(current, baseline, threshold=0.1)
     assert drift['drift_detected'] is True
     assert any('system.latency' in alert['metric'] for alert in drift['alerts'])
+
+def test_result_store_round_trips_records():
+    """Test compact result storage returns the same dict views and columns."""
+    store = eval_pipe.ResultStore(capacity=2)
+    for i in range(5):  # Forces the preallocated arrays to grow
+        store.append(
+            f"ex{i}", 'how_to' if i % 2 else 'complex',
+            eval_pipe.RetrievalMetrics(0.5, 1.0, 1.0, 2, 1),
+            eval_pipe.GenerationMetrics(4, 4, 4, 4, 4, 4.0, "ok"),
+            100.0 + i
+        )
+    store.grounding[4] = {'score': 1.0, 'mean_support': 1.0, 'claims': []}
+    
+    assert len(store) == 5
+    assert store[1] == eval_pipe.make_result_record(
+        "ex1", 'how_to', eval_pipe.RetrievalMetrics(0.5, 1.0, 1.0, 2, 1),
+        eval_pipe.GenerationMetrics(4, 4, 4, 4, 4, 4.0, "ok"), 101.0
+    )
+    assert store[-1]['grounding']['score'] == 1.0
+    assert list(store.column('latency_ms')) == [100.0, 101.0, 102.0, 103.0, 104.0]
+    assert store.categories == ['complex', 'how_to']
+    
+    copy = eval_pipe.ResultStore.from_records(list(store))
+    assert copy.to_list() == store.to_list()
+    assert store.nbytes / len(store) < 500
+
+def test_result_store_records_are_exact_sliceable_and_read_only():
+    """Test scores keep their decimal values, slices work and edits go through the store."""
+    import copy
+    import json
+    store = eval_pipe.ResultStore()
+    for i in range(3):
+        store.append(f"ex{i}", 'how_to', eval_pipe.RetrievalMetrics(0.8, 0.7, 1.0, 2, 1),
+                     eval_pipe.GenerationMetrics(4.1, 4, 4, 4, 4, 4.1, "ok"), 10.0)
+    
+    assert store[0]['retrieval']['precision'] == 0.8
+    assert '0.800000011920929' not in json.dumps(store.to_list())
+    assert [r['id'] for r in store[1:]] == ["ex1", "ex2"]
+    
+    with pytest.raises(TypeError):
+        store[0]['generation']['overall'] = 1.0
+    edited = copy.deepcopy(store[0])
+    edited['generation']['overall'] = 1.0
+    store[0] = edited
+    assert store[0]['generation']['overall'] == 1.0
+    assert store.column('generation.overall')[0] == 1.0
+
+def test_diff_results_ranks_example_regressions():
+    """Test the example-level diff joins by ID and ranks the worst changes."""
+    def run(overall_by_id, latency=100.0):
+        results = [
+            {
+                'id': example_id, 'category': 'how_to',
+                'retrieval': {'precision': 0.8, 'recall': 0.8, 'mrr': 1.0},
+                'generation': {c: score for c in eval_pipe.JUDGE_CRITERIA + ('overall',)},
+                'latency_ms': latency
+            }
+            for example_id, score in overall_by_id.items()
+        ]
+        return MagicMock(detailed=results)
+    
+    baseline = run({'a': 4.0, 'b': 4.0, 'c': 4.0, 'd': 4.0, 'gone': 4.0})
+    current = run({'a': 2.0, 'b': 3.5, 'c': 4.0, 'd': 5.0, 'new': 1.0}, latency=150.0)
+    
+    diff = eval_pipe.diff_results(current, baseline, top_k=1)
+    assert diff['joined'] == 4
+    assert (diff['only_in_current'], diff['only_in_baseline']) == (1, 1)
+    assert [r['id'] for r in diff['regressions']] == ['a']
+    assert diff['regressions'][0]['delta'] == pytest.approx(-2.0)
+    assert [r['id'] for r in diff['improvements']] == ['d']
+    assert diff['summary']['generation.overall']['regressed'] == 2
+    # Higher latency is a regression even though the delta is positive
+    assert diff['summary']['latency_ms']['regressed'] == 4
+    
+    table = eval_pipe.format_diff_table(diff)
+    assert "| a | how_to |" in table
+
+def test_parse_judge_response_fenced_with_prose():
+    """Test JSON extraction from prose and code fences, with clamping."""
+    text = (
+        "Sure, here is my evaluation:\n```json\n"
+        '{"Relevance": 6, "accuracy": "4", "completeness": 0, '
+        '"groundedness": 4.5, "helpfulness": 3, "reasoning": "ok"}\n```\nThanks!'
+    )
+    parsed = eval_pipe.parse_judge_response(text)
+    
+    assert parsed['relevance'] == 5.0
+    assert parsed['accuracy'] == 4.0
+    assert parsed['completeness'] == 1.0
+    assert parsed['groundedness'] == 4.5
+    assert parsed['reasoning'] == "ok"
+
+def test_parse_judge_response_invalid():
+    """Test that missing criteria and non-JSON output are rejected."""
+    with pytest.raises(eval_pipe.JudgeParseError):
+        eval_pipe.parse_judge_response("I think it is pretty good.")
+    with pytest.raises(eval_pipe.JudgeParseError):
+        eval_pipe.parse_judge_response('{"relevance": 4, "accuracy": 4}')
+    with pytest.raises(eval_pipe.JudgeParseError):
+        eval_pipe.parse_judge_response(
+            '{"relevance": "high", "accuracy": 4, "completeness": 4, '
+            '"groundedness": 4, "helpfulness": 4}'
+        )
+
+def test_evaluate_generation_retries_unparseable():
+    """Test that only unparseable judge output is retried and counted."""
+    outputs = iter([
+        "not json at all",
+        '{"relevance": 5, "accuracy": 5, "completeness": 5, '
+        '"groundedness": 5, "helpfulness": 5, "reasoning": "good"}',
+    ])
+    stats = eval_pipe.JudgeParseStats()
+    backend = MagicMock()
+    backend.complete.side_effect = lambda request: next(outputs)
+    metrics = eval_pipe.evaluate_generation(
+        "q", "ctx", "resp", "ref",
+        backend=backend,
+        parse_stats=stats
+    )
+    
+    assert metrics.overall == pytest.approx(5.0)
+    assert stats.judge_calls == 2
+    assert stats.retries == 1
+    assert stats.failure_rate == 0.5
+    
+    stats = eval_pipe.JudgeParseStats()
+    backend.complete.side_effect = None
+    backend.complete.return_value = "garbage"
+    with pytest.raises(eval_pipe.JudgeParseError):
+        eval_pipe.evaluate_generation(
+            "q", "ctx", "resp", "ref",
+            backend=backend,
+            max_parse_retries=2,
+            parse_stats=stats
+        )
+    assert stats.judge_calls == 3
+    assert stats.unrecoverable == 1
+
+def test_heuristic_judge_deterministic():
+    """Test the offline judge is deterministic and rewards overlap."""
+    judge = eval_pipe.HeuristicJudge()
+    good = eval_pipe.evaluate_generation(
+        "how do I reset my password", "Reset your password from the settings page.",
+        "Reset your password from the settings page.", "Go to settings and reset your password.",
+        backend=judge
+    )
+    bad = eval_pipe.evaluate_generation(
+        "how do I reset my password", "Reset your password from the settings page.",
+        "Bananas are yellow.", "Go to settings and reset your password.",
+        backend=judge
+    )
+    again = eval_pipe.evaluate_generation(
+        "how do I reset my password", "Reset your password from the settings page.",
+        "Bananas are yellow.", "Go to settings and reset your password.",
+        backend=judge
+    )
+    
+    assert good.overall > bad.overall
+    assert bad == again
+    assert 1.0 <= bad.overall <= 5.0
+
+def test_latency_injecting_judge_errors():
+    """Test the load-test judge injects the configured failures."""
+    judge = eval_pipe.LatencyInjectingJudge(latency_ms=0, jitter_ms=0, error_rate=1.0)
+    request = eval_pipe.JudgeRequest(prompt="p", model="m")
+    
+    with pytest.raises(eval_pipe.JudgeBackendError) as exc:
+        judge.complete(request)
+    assert exc.value.status == 429
+
+def _completion_server(delay: float = 0.0, close_after_reply: bool = False):
+    """Local OpenAI-style endpoint; returns (server, list of request paths)."""
+    import json
+    import threading
+    import time
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    
+    seen = []
+    
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive
+        
+        def do_POST(self):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            seen.append(self.path)
+            time.sleep(delay)
+            body = json.dumps({"choices": [{"message": {"content": "ok"}}]}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            # Drop the connection without announcing it, like an idle timeout
+            self.close_connection = close_after_reply
+        
+        def log_message(self, *args):
+            pass
+    
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, seen
+
+def test_openai_compatible_judge_reuses_connections():
+    """Test sequential judge calls share one keep-alive connection."""
+    server, seen = _completion_server()
+    try:
+        pool = eval_pipe.HTTPConnectionPool(f"http://127.0.0.1:{server.server_port}/v1")
+        judge = eval_pipe.OpenAICompatibleJudge(api_key="k", pool=pool)
+        request = eval_pipe.JudgeRequest(prompt="p", model="m")
+        
+        assert [judge.complete(request) for _ in range(5)] == ["ok"] * 5
+        assert seen == ["/v1/chat/completions"] * 5
+        assert pool.connections_opened == 1
+        pool.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def test_http_pool_replaces_dropped_connections_without_replaying():
+    """Test a server-closed idle connection is replaced and a timed-out POST is not resent."""
+    import time
+    
+    server, seen = _completion_server(close_after_reply=True)
+    try:
+        pool = eval_pipe.HTTPConnectionPool(f"http://127.0.0.1:{server.server_port}")
+        assert pool.request("POST", "/x", b"{}")[0] == 200
+        deadline = time.monotonic() + 5
+        while not eval_pipe._is_dropped(pool._idle.queue[-1]):  # Wait for the server's close
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+        assert pool.request("POST", "/x", b"{}")[0] == 200
+        assert len(seen) == 2
+        assert pool.connections_opened == 2
+    finally:
+        server.shutdown()
+        server.server_close()
+    
+    server, seen = _completion_server(delay=0.5)
+    try:
+        pool = eval_pipe.HTTPConnectionPool(f"http://127.0.0.1:{server.server_port}", timeout=0.1)
+        with pytest.raises(OSError):
+            pool.request("POST", "/x", b"{}")
+        assert len(seen) == 1
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def test_token_bucket_paces_requests():
+    """Test the bucket makes callers wait once the burst is spent."""
+    now = [0.0]
+    sleeps = []
+    def fake_sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+    bucket = eval_pipe.TokenBucket(60, capacity=2, clock=lambda: now[0], sleep=fake_sleep)
+    
+    assert bucket.acquire() == 0.0
+    assert bucket.acquire() == 0.0
+    # 60/min = 1 token per second once the burst of 2 is used
+    assert bucket.acquire() == pytest.approx(1.0)
+    assert sum(sleeps) == pytest.approx(1.0)
+
+def test_token_bucket_charges_oversized_requests_in_full():
+    """Test a request above capacity puts the bucket into debt instead of being clamped."""
+    now = [0.0]
+    def fake_sleep(seconds):
+        now[0] += seconds
+    bucket = eval_pipe.TokenBucket(600, capacity=10, clock=lambda: now[0], sleep=fake_sleep)
+    
+    # 10 tokens/s: 40 tokens beyond the burst of 10 cost 3s, then the next caller waits 0.1s
+    assert bucket.acquire(40) == pytest.approx(3.0)
+    assert bucket.acquire(1) == pytest.approx(0.1)
+    assert now[0] * 10 + 10 == pytest.approx(41)
+
+def test_judge_scheduler_honours_retry_after():
+    """Test Retry-After replaces jittered backoff and failed attempts don't count as throughput."""
+    inner = MagicMock()
+    inner.complete.side_effect = [
+        eval_pipe.JudgeBackendError("slow down", status=429, retry_after=7.0),
+        "ok",
+    ]
+    sleeps = []
+    scheduler = eval_pipe.JudgeScheduler(inner, sleep=sleeps.append, expected_output_tokens=0)
+    
+    assert scheduler.complete(eval_pipe.JudgeRequest(prompt="x" * 400, model="m")) == "ok"
+    assert sleeps == [7.0]
+    assert scheduler.stats.estimated_tokens == 100
+    assert eval_pipe.parse_retry_after("3") == 3.0
+    assert eval_pipe.parse_retry_after("Thu, 01 Jan 1970 00:00:10 GMT", now=4.0) == pytest.approx(6.0)
+    assert eval_pipe.parse_retry_after("soon") is None
+
+def test_judge_scheduler_retries_rate_limits():
+    """Test 429s are retried with backoff and recorded in stats."""
+    inner = MagicMock()
+    inner.complete.side_effect = [
+        eval_pipe.JudgeBackendError("slow down", status=429),
+        eval_pipe.JudgeBackendError("slow down", status=429),
+        "ok",
+    ]
+    scheduler = eval_pipe.JudgeScheduler(inner, requests_per_minute=6000, sleep=lambda s: None, seed=1)
+    
+    assert scheduler.complete(eval_pipe.JudgeRequest(prompt="p", model="m")) == "ok"
+    stats = scheduler.stats.to_dict()
+    assert stats['rate_limited'] == 2
+    assert stats['retries'] == 2
+    assert stats['successes'] == 1
+
+def test_judge_scheduler_respects_retry_budget():
+    """Test non-retryable errors and an empty budget fail fast."""
+    inner = MagicMock()
+    inner.complete.side_effect = eval_pipe.JudgeBackendError("bad request", status=400)
+    scheduler = eval_pipe.JudgeScheduler(inner, sleep=lambda s: None)
+    with pytest.raises(eval_pipe.JudgeBackendError):
+        scheduler.complete(eval_pipe.JudgeRequest(prompt="p", model="m"))
+    assert inner.complete.call_count == 1
+    
+    inner = MagicMock()
+    inner.complete.side_effect = eval_pipe.JudgeBackendError("overloaded", status=503)
+    budget = eval_pipe.RetryBudget(ratio=0.0, min_retries=1)
+    scheduler = eval_pipe.JudgeScheduler(inner, retry_budget=budget, sleep=lambda s: None)
+    with pytest.raises(eval_pipe.JudgeBackendError):
+        scheduler.complete(eval_pipe.JudgeRequest(prompt="p", model="m"))
+    assert inner.complete.call_count == 2
+    assert scheduler.stats.budget_exhausted == 1
+
+def _fixed_judge(score):
+    """Backend returning the same score on every criterion."""
+    backend = MagicMock()
+    backend.complete.return_value = (
+        f'{{"relevance": {score}, "accuracy": {score}, "completeness": {score}, '
+        f'"groundedness": {score}, "helpfulness": {score}}}'
+    )
+    return backend
+
+def test_judge_ensemble_agreement_skips_tiebreaker():
+    """Test agreeing cheap judges are averaged without escalation."""
+    tiebreaker = _fixed_judge(1)
+    ensemble = eval_pipe.JudgeEnsemble(
+        primary=(eval_pipe.JudgeSpec("a", _fixed_judge(4), "cheap-a"),
+                 eval_pipe.JudgeSpec("b", _fixed_judge(5), "cheap-b")),
+        tiebreaker=eval_pipe.JudgeSpec("c", tiebreaker, "strong"),
+        threshold=1.0
+    )
+    metrics = eval_pipe.evaluate_generation("q", "ctx", "resp", "ref", ensemble=ensemble)
+    
+    assert metrics.overall == pytest.approx(4.5)
+    assert tiebreaker.complete.call_count == 0
+    assert ensemble.stats.to_dict()['escalation_rate'] == 0.0
+
+def test_judge_ensemble_disagreement_escalates():
+    """Test disagreeing cheap judges call the tiebreaker and take the median."""
+    tiebreaker = _fixed_judge(4)
+    ensemble = eval_pipe.JudgeEnsemble(
+        primary=(eval_pipe.JudgeSpec("a", _fixed_judge(1), "cheap-a"),
+                 eval_pipe.JudgeSpec("b", _fixed_judge(5), "cheap-b")),
+        tiebreaker=eval_pipe.JudgeSpec("c", tiebreaker, "strong"),
+        threshold=1.0
+    )
+    metrics = eval_pipe.evaluate_generation("q", "ctx", "resp", "ref", ensemble=ensemble)
+    stats = ensemble.stats.to_dict()
+    
+    assert metrics.overall == pytest.approx(4.0)
+    assert tiebreaker.complete.call_count == 1
+    assert stats['escalation_rate'] == 1.0
+    assert stats['mean_abs_diff']['accuracy'] == pytest.approx(4.0)
+    assert stats['agreement_rate']['accuracy'] == 0.0
+
+def test_benchmark_suite_smoke(tmp_path):
+    """Test the overhead benchmarks run and regression comparison works."""
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../benchmarks')))
+    import bench_pipeline
+    
+    timings = bench_pipeline.run_benchmarks([20], repeat=1, workdir=str(tmp_path))
+    
+    assert 'run_evaluation_noop[20]' in timings
+    assert bench_pipeline.compare(timings, timings, tolerance=0.25) == []
+    slower = {name: {'median_s': t['median_s'] / 10} for name, t in timings.items()}
+    assert bench_pipeline.compare(timings, slower, tolerance=0.25)
+
+CATEGORIES = ['simple_factual', 'how_to', 'troubleshooting', 'comparison',
+              'complex', 'out_of_scope', 'ambiguous']
+
+def _write_golden(tmp_path, n=14):
+    """Write a small valid golden dataset and return an EvalConfig for it."""
+    import yaml
+    examples = [{
+        'id': f"ex{i}",
+        'query': f"question {i}",
+        'category': CATEGORIES[i % len(CATEGORIES)],
+        'reference_answer': f"answer {i}",
+        'relevant_documents': [{'chunk_ids': [f"c{i}"]}]
+    } for i in range(n)]
+    path = tmp_path / "golden.yaml"
+    path.write_text(yaml.safe_dump({'examples': examples}))
+    return eval_pipe.EvalConfig(golden_dataset_path=str(path))
+
+class FakeRAG:
+    """RAG stand-in with separate retrieve/generate steps and call counters."""
+    
+    def __init__(self, shifted=()):
+        self.shifted = set(shifted)
+        self.calls = {'query': 0, 'retrieve': 0, 'generate': 0}
+    
+    def retrieve(self, query, top_k=5):
+        self.calls['retrieve'] += 1
+        i = int(query.split()[1])
+        ids = [f"c{i}", "other"] if i not in self.shifted else ["other", f"c{i}"]
+        return eval_pipe.RetrievalResult(ids, ["chunk", "chunk"], [0.9, 0.1], 1.0)
+    
+    def generate(self, query, retrieval):
+        self.calls['generate'] += 1
+        return eval_pipe.GenerationResult(f"answer {query.split()[1]}", 10, 5, 50.0)
+    
+    def query(self, query, top_k=5):
+        self.calls['query'] += 1
+        retrieval = self.retrieve(query, top_k)
+        return eval_pipe.RAGResult(query, retrieval, self.generate(query, retrieval), 51.0)
+
+def test_sweep_shares_cache_and_marks_pareto(tmp_path):
+    """Test a sweep reuses RAG outputs and judge verdicts across configurations."""
+    import sweep
+    config = _write_golden(tmp_path)
+    rag = FakeRAG()
+    backend = _fixed_judge(4)
+    
+    result = sweep.run_sweep(
+        rag, config,
+        space={'retrieval_top_k': [2, 5], 'evaluator_model': ['gpt-4o-mini', 'gpt-4o']},
+        backend=backend, max_workers=4
+    )
+    
+    assert len(result.points) == 4
+    assert rag.calls['query'] == 14 * 2          # once per (query, top_k)
+    assert backend.complete.call_count == 14 * 2  # once per (model, prompt)
+    assert all(p.latency_p95_ms >= 51.0 for p in result.points)  # replayed latency kept
+    # Same quality and latency everywhere, so only the cheaper judge is on the frontier
+    assert {p.params['evaluator_model'] for p in result.frontier} == {'gpt-4o-mini'}
+    assert "★" in sweep.format_sweep_table(result)
+    
+    with pytest.raises(ValueError):
+        sweep.grid_space({'not_a_field': [1]})
+
+def test_sweep_shares_scheduler_and_generation_cache(tmp_path):
+    """Test rate limits and the cache file are shared, and cache hits aren't billed."""
+    import json
+    import sweep
+    config = _write_golden(tmp_path)
+    config.judge_requests_per_minute = 60_000
+    config.generation_cache_path = str(tmp_path / "cache.json")
+    
+    result = sweep.run_sweep(
+        FakeRAG(), config, space={'retrieval_top_k': [2, 5]},
+        backend=_fixed_judge(4), max_workers=2
+    )
+    
+    assert result.cache['judge_scheduler']['successes'] == 14  # One scheduler, one call per prompt
+    assert all('judge_scheduler' not in p.results.system for p in result.points)
+    billed = sorted(p.results.system['cost']['judge_billed_tokens'] for p in result.points)
+    total = result.points[0].results.system['cost']['judge_tokens']
+    assert sum(billed) == total  # Each prompt billed once, to whichever config called first
+    assert result.points[0].cost_per_query == result.points[1].cost_per_query
+    assert len(json.load(open(config.generation_cache_path))) == 14
+    
+    with pytest.raises(ValueError):
+        sweep.grid_space({'judge_tokens_per_minute': [1000, 2000]})
+
+class _ConstantJudge(eval_pipe.JudgeBackend):
+    """Real backend subclass returning the same score on every criterion."""
+    score = 5
+    
+    def complete(self, request):
+        s = self.score
+        return (f'{{"relevance": {s}, "accuracy": {s}, "completeness": {s}, '
+                f'"groundedness": {s}, "helpfulness": {s}}}')
+
+class _HarshJudge(_ConstantJudge):
+    score = 1
+
+def test_sweep_cache_keys_on_the_wrapped_judge(tmp_path):
+    """Test sweeps with different judges on one cache file don't share verdicts."""
+    import sweep
+    config = _write_golden(tmp_path)
+    config.mode = 'hybrid'
+    config.generation_cache_path = str(tmp_path / "cache.json")
+    
+    first = sweep.run_sweep(FakeRAG(), config, space={'retrieval_top_k': [5]}, backend=_ConstantJudge())
+    second = sweep.run_sweep(FakeRAG(), config, space={'retrieval_top_k': [5]}, backend=_HarshJudge())
+    again = sweep.run_sweep(FakeRAG(), config, space={'retrieval_top_k': [5]}, backend=_HarshJudge())
+    
+    assert first.points[0].quality == pytest.approx(5.0)
+    assert second.points[0].results.system['generation_cache']['hits'] == 0
+    assert second.points[0].quality == pytest.approx(1.0)
+    assert again.points[0].results.system['generation_cache']['hit_rate'] == 1.0
+    assert eval_pipe.judge_identity(sweep._MeteredJudge(sweep.SharedJudgeCache(
+        eval_pipe.JudgeScheduler(_HarshJudge(), requests_per_minute=60)))) == "_HarshJudge"
+
+def test_run_evaluation_retrieval_only(tmp_path):
+    """Test retrieval-only mode skips generation and judging."""
+    config = _write_golden(tmp_path)
+    config.mode = 'retrieval_only'
+    rag = FakeRAG()
+    backend = _fixed_judge(4)
+    
+    results = eval_pipe.run_evaluation(rag, config, backend=backend)
+    
+    assert rag.calls['query'] == 0 and rag.calls['generate'] == 0
+    assert backend.complete.call_count == 0
+    assert results.retrieval['precision']['mean'] == pytest.approx(0.5)
+    assert results.generation['overall']['mean'] != results.generation['overall']['mean']  # NaN
+
+def test_run_evaluation_hybrid_reuses_cache(tmp_path):
+    """Test hybrid mode only regenerates and rejudges changed retrievals."""
+    config = _write_golden(tmp_path)
+    config.generation_cache_path = str(tmp_path / "cache.json")
+    eval_pipe.run_evaluation(FakeRAG(), config, backend=_fixed_judge(4))
+    
+    config.mode = 'hybrid'
+    rag = FakeRAG(shifted=[3])
+    backend = _fixed_judge(2)
+    results = eval_pipe.run_evaluation(rag, config, backend=backend)
+    
+    assert rag.calls['generate'] == 1
+    assert backend.complete.call_count == 1
+    assert results.system['generation_cache']['hits'] == 13
+    changed = next(r for r in results.detailed if r['id'] == 'ex3')
+    assert changed['generation']['overall'] == pytest.approx(2.0)
+    assert results.detailed[0]['generation']['overall'] == pytest.approx(4.0)
+
+def test_hybrid_cache_keys_on_reference_and_judge(tmp_path):
+    """Test an edited reference answer or a different judge backend is not served a stale verdict."""
+    import yaml
+    config = _write_golden(tmp_path)
+    config.generation_cache_path = str(tmp_path / "cache.json")
+    eval_pipe.run_evaluation(FakeRAG(), config, backend=_fixed_judge(4))
+    
+    data = yaml.safe_load(open(config.golden_dataset_path))
+    data['examples'][5]['reference_answer'] = "a corrected answer"
+    with open(config.golden_dataset_path, 'w') as f:
+        yaml.safe_dump(data, f)
+    config.mode = 'hybrid'
+    backend = _fixed_judge(2)
+    results = eval_pipe.run_evaluation(FakeRAG(), config, backend=backend)
+    assert backend.complete.call_count == 1
+    assert results.system['generation_cache']['hits'] == 13
+    
+    results = eval_pipe.run_evaluation(FakeRAG(), config, backend=eval_pipe.HeuristicJudge())
+    assert results.system['generation_cache']['hits'] == 0
+
+def _local_corpus(n=200):
+    """Synthetic corpus where chunk i mentions a unique topic word."""
+    return {
+        f"doc_{i:03d}": f"Topic{i} setup guide. To configure topic{i}, open settings and enable it."
+        for i in range(n)
+    }
+
+def test_local_rag_exact_retrieval():
+    """Test the offline RAG system retrieves the matching chunk with latencies."""
+    import local_rag
+    rag = local_rag.LocalRAGSystem(_local_corpus(), index="exact")
+    
+    result = rag.query("How do I configure topic42?", top_k=3)
+    
+    assert result.retrieval.chunk_ids[0] == "doc_042"
+    assert result.retrieval.scores == sorted(result.retrieval.scores, reverse=True)
+    assert "topic42" in result.generation.answer
+    assert result.retrieval.latency_ms > 0 and result.generation.latency_ms > 0
+    assert result.generation.output_tokens > 0
+
+def test_local_rag_ivf_matches_exact():
+    """Test the IVF index agrees with brute force when probing every list."""
+    import local_rag
+    corpus = _local_corpus()
+    exact = local_rag.LocalRAGSystem(corpus, index="exact")
+    ivf = local_rag.LocalRAGSystem(corpus, index="ivf", n_lists=8, n_probe=8)
+    
+    for i in (0, 17, 99, 150):
+        query = f"configure topic{i}"
+        assert ivf.retrieve(query, 5).chunk_ids == exact.retrieve(query, 5).chunk_ids
+    
+    approx = local_rag.LocalRAGSystem(corpus, index="ivf", n_lists=8, n_probe=2)
+    hits = sum(approx.retrieve(f"configure topic{i}", 1).chunk_ids == [f"doc_{i:03d}"]
+               for i in range(0, 200, 10))
+    assert hits >= 15
+
+def test_run_evaluation_offline_end_to_end(tmp_path):
+    """Test the full pipeline runs offline against the local RAG system."""
+    import local_rag
+    config = _write_golden(tmp_path)
+    corpus = {f"c{i}": f"Answer {i}: question {i} is solved by step {i}." for i in range(14)}
+    rag = local_rag.LocalRAGSystem(corpus)
+    
+    results = eval_pipe.run_evaluation(rag, config, backend=eval_pipe.HeuristicJudge())
+    
+    assert results.retrieval['recall']['mean'] == pytest.approx(1.0)
+    assert 1.0 <= results.generation['overall']['mean'] <= 5.0
+
+def test_tracer_records_nested_stage_spans(tmp_path):
+    """Test tracing covers each pipeline stage and nests judge spans across threads."""
+    config = _write_golden(tmp_path)
+    config.judge_concurrency = 4
+    exporter = eval_pipe.InMemorySpanExporter()
+    
+    results = eval_pipe.run_evaluation(FakeRAG(), config, backend=_fixed_judge(4),
+                                       tracer=eval_pipe.Tracer(exporter))
+    
+    by_name = {}
+    for span in exporter.spans:
+        by_name.setdefault(span.name, []).append(span)
+    assert {'run_evaluation', 'load_golden_dataset', 'rag', 'judge',
+            'evaluate_generation', 'aggregate_results'} <= set(by_name)
+    judge_span = by_name['judge'][0]
+    assert all(s.parent_id == judge_span.span_id for s in by_name['evaluate_generation'])
+    assert len({s.trace_id for s in exporter.spans}) == 1
+    assert results.system['stages']['rag']['count'] == 14
+    assert "## Time by Stage" in eval_pipe.generate_report(results)
+    # Tracing is off again once the run is over
+    assert eval_pipe.get_tracer().enabled is False
+
+def test_tracers_are_per_context_and_stages_per_run(tmp_path):
+    """Test concurrent runs keep their own tracer and a reused tracer reports each run alone."""
+    import threading
+    config = _write_golden(tmp_path)
+    tracer = eval_pipe.Tracer()
+    with tracer:
+        first = eval_pipe.run_evaluation(FakeRAG(), config, backend=_fixed_judge(4))
+        second = eval_pipe.run_evaluation(FakeRAG(), config, backend=_fixed_judge(4))
+    assert first.system['stages']['rag']['count'] == 14
+    assert second.system['stages']['rag']['count'] == 14
+    assert tracer.stage_summary()['rag']['count'] == 28
+    
+    exporters = [eval_pipe.InMemorySpanExporter() for _ in range(4)]
+    barrier = threading.Barrier(4)
+    def run(exporter):
+        with eval_pipe.Tracer(exporter):
+            barrier.wait()
+            eval_pipe.run_evaluation(FakeRAG(), config, backend=_fixed_judge(4))
+    threads = [threading.Thread(target=run, args=(e,)) for e in exporters]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert [sum(s.name == 'rag' for s in e.spans) for e in exporters] == [14] * 4
+    assert eval_pipe.get_tracer().enabled is False
+
+def test_judge_routing_per_category_models_and_limits(tmp_path):
+    """Test categories are judged by their routed model within its concurrency limit."""
+    import threading
+    import time
+    config = _write_golden(tmp_path)
+    config.judge_routes = {
+        'complex': {'model': 'gpt-4o', 'concurrency': 1},
+        'default': {'model': 'gpt-4o-mini', 'concurrency': 4}
+    }
+    verdict = _fixed_judge(4).complete.return_value
+    in_flight, peak, models, lock = {}, {}, {}, threading.Lock()
+    
+    class SlowJudge(eval_pipe.JudgeBackend):
+        def complete(self, request):
+            with lock:
+                models.setdefault(request.model, set()).add(request.query)
+                in_flight[request.model] = in_flight.get(request.model, 0) + 1
+                peak[request.model] = max(peak.get(request.model, 0), in_flight[request.model])
+            time.sleep(0.01)
+            with lock:
+                in_flight[request.model] -= 1
+            return verdict
+    
+    results = eval_pipe.run_evaluation(FakeRAG(), config, backend=SlowJudge())
+    routing = results.system['judge_routing']
+    
+    assert models['gpt-4o'] == {'question 4', 'question 11'}  # the two 'complex' examples
+    assert len(models['gpt-4o-mini']) == 12
+    assert peak['gpt-4o'] == 1
+    assert routing['complex']['model'] == 'gpt-4o'
+    assert routing['complex']['cost'] > routing['how_to']['cost'] > 0
+    assert "Judge Cost by Category" in eval_pipe.generate_report(results)
+
+def test_sweep_prices_routed_judge_calls_per_model(tmp_path):
+    """Test a routed sweep's judge cost uses each category's model, not evaluator_model."""
+    import sweep
+    config = _write_golden(tmp_path)
+    config.evaluator_model = 'gpt-4o-mini'
+    config.judge_routes = {'complex': {'model': 'gpt-4o'}}
+    
+    point = sweep.run_sweep(FakeRAG(), config, space={'retrieval_top_k': [5]},
+                            backend=_ConstantJudge()).points[0]
+    routing = point.results.system['judge_routing']
+    n = len(point.results.detailed)
+    
+    assert point.judge_cost_per_query * n == pytest.approx(sum(r['cost'] for r in routing.values()))
+    assert point.judge_spend == pytest.approx(point.judge_cost_per_query * n)
+    all_mini = sum(eval_pipe.estimate_cost('gpt-4o-mini', r['input_tokens'], r['output_tokens'])
+                   for r in routing.values())
+    assert point.judge_cost_per_query * n > all_mini
+
+def test_rouge_l_f1():
+    """Test ROUGE-L on identical, disjoint and partially ordered text."""
+    assert eval_pipe.rouge_l_f1(["a", "b", "c"], ["a", "b", "c"]) == 1.0
+    assert eval_pipe.rouge_l_f1(["x", "y"], ["a", "b"]) == 0.0
+    # LCS of "a c d" and "a b c d" is "a c d": P=3/3, R=3/4
+    assert eval_pipe.rouge_l_f1(["a", "c", "d"], ["a", "b", "c", "d"]) == pytest.approx(6 / 7)
+
+def test_pre_judge_bands():
+    """Test confident examples are scored locally and ambiguous ones deferred."""
+    pre_judge = eval_pipe.PreJudge(accept_above=0.8, reject_below=0.2)
+    reference = "Open the settings page and click reset password."
+    scored = pre_judge.score_batch(
+        [reference, "Bananas are a yellow fruit.", "Open settings to change your account details.", "anything"],
+        [reference, reference, reference, ""]
+    )
+    
+    assert scored[0].overall == pytest.approx(5.0)
+    assert scored[1].overall < 2.0
+    assert scored[2] is None
+    assert scored[3] is None  # No reference answer: always judged
+    stats = pre_judge.stats.to_dict()
+    assert stats['judge_calls_saved'] == 2
+    assert stats['sent_to_judge'] == 2
+
+def test_run_evaluation_pre_judge_saves_calls(tmp_path):
+    """Test pre-judged examples skip the judge and savings are reported."""
+    config = _write_golden(tmp_path)
+    backend = _fixed_judge(3)
+    
+    results = eval_pipe.run_evaluation(FakeRAG(), config, backend=backend, pre_judge=eval_pipe.PreJudge())
+    
+    # FakeRAG answers exactly match the references
+    assert backend.complete.call_count == 0
+    assert results.system['pre_judge']['savings_rate'] == 1.0
+    assert "Judge Calls Saved" in eval_pipe.generate_report(results)
+
+def test_groundedness_checker_claim_support():
+    """Test claims are aligned to the supporting chunk, and others flagged."""
+    checker = eval_pipe.GroundednessChecker()
+    checker.index_chunks(
+        ["auth_001", "billing_002"],
+        ["To reset your password, open the account settings page and click reset.",
+         "Invoices are emailed to the billing contact on the first of each month."]
+    )
+    result = checker.check(
+        "Open the account settings page and click reset. "
+        "Invoices are emailed on the first of each month. "
+        "Refunds are always processed within one hour.",
+        ["auth_001", "billing_002"]
+    )
+    
+    assert [c.chunk_id for c in result.claims] == ["auth_001", "billing_002", None]
+    assert [c.supported for c in result.claims] == [True, True, False]
+    assert result.score == pytest.approx(2 / 3)
+    
+    # Restricting to retrieved chunks ignores support from other chunks
+    restricted = checker.check("Invoices are emailed on the first of each month.", ["auth_001"])
+    assert restricted.score == 0.0
+
+def test_groundedness_index_is_bounded_and_reindexes_edits():
+    """Test the n-gram index evicts least recently indexed chunks and picks up edited text."""
+    checker = eval_pipe.GroundednessChecker(max_chunks=2)
+    claim = "Invoices are emailed on the first of each month."
+    checker.index_chunks(["a"], ["Invoices are emailed on the first of each month."])
+    checker.index_chunks(["b", "c"], ["Unrelated text about passwords and logins here.",
+                                      "More unrelated text about shipping times here."])
+    
+    assert "a" not in checker.index and len(checker.index) == 2
+    assert checker.index.evictions == 1
+    assert checker.check(claim, ["a"]).score == 0.0
+    
+    checker.index_chunks(["b"], ["Invoices are emailed on the first of each month."])
+    assert checker.check(claim, ["b"]).score == 1.0
+    checker.index_chunks(["b"], ["Invoices are now emailed weekly, on Mondays."])
+    assert checker.check(claim, ["b"]).score == 0.0
+    assert checker.check(claim).score == 0.0  # No stale postings left behind
+
+def test_run_evaluation_local_groundedness(tmp_path):
+    """Test per-example claim support is recorded and aggregated."""
+    config = _write_golden(tmp_path)
+    
+    results = eval_pipe.run_evaluation(
+        FakeRAG(), config, groundedness_checker=eval_pipe.GroundednessChecker(n=1, min_claim_tokens=1)
+    )
+    
+    assert 'claims' in results.detailed[0]['grounding']
+    assert 0.0 <= results.generation['local_groundedness']['mean'] <= 1.0
+    assert "Local Groundedness" in eval_pipe.generate_report(results)
+
+def _log_record(i, category="how_to", ts=0.0):
+    return {
+        'timestamp': ts,
+        'request_id': f"req-{i}",
+        'category': category,
+        'query': f"question {i}",
+        'response': f"answer {i}",
+        'chunk_ids': [f"c{i}"],
+        'chunks': [f"answer {i}"],
+        'latency_ms': 100.0 + i
+    }
+
+def test_category_reservoir_bounds_samples():
+    """Test sampling rate and per-category cap are both applied."""
+    import random
+    import online_eval
+    reservoir = online_eval.CategoryReservoir(
+        {'how_to': 1.0, 'complex': 0.0}, default_rate=1.0,
+        max_per_category=10, rng=random.Random(0)
+    )
+    for i in range(1000):
+        reservoir.offer(_log_record(i, 'how_to'))
+        reservoir.offer(_log_record(i, 'complex'))
+    
+    assert len(reservoir.records()) == 10
+    assert reservoir.seen == {'how_to': 1000, 'complex': 1000}
+    # Reservoir sampling draws from the whole stream, not just the head
+    assert max(int(r['request_id'][4:]) for r in reservoir.records()) > 100
+
+def test_online_evaluator_windows_and_drift():
+    """Test records are windowed, scored and comparable with detect_drift."""
+    import online_eval
+    config = eval_pipe.EvalConfig(golden_dataset_path="production")
+    emitted = []
+    evaluator = online_eval.OnlineEvaluator(
+        config, backend=_fixed_judge(4), default_rate=1.0,
+        window_seconds=60, max_workers=2, on_window=emitted.append, seed=0
+    )
+    for i in range(20):
+        evaluator.process_record(_log_record(i, ts=i * 5.0))  # 100s of traffic
+    evaluator.close()
+    
+    assert len(emitted) == 2
+    assert emitted[0].system['sampling']['sampled'] == 12
+    assert emitted[0].generation['overall']['mean'] == pytest.approx(4.0)
+    
+    drift = evaluator.compare_to_baseline(emitted[0])
+    assert drift['drift_detected'] is False
+
+def test_online_evaluator_skips_malformed_records():
+    """Test one bad field drops that record, not its window, and a failed window is recorded."""
+    import online_eval
+    config = eval_pipe.EvalConfig(golden_dataset_path="production")
+    evaluator = online_eval.OnlineEvaluator(
+        config, backend=_fixed_judge(4), default_rate=1.0, window_seconds=60, max_workers=2, seed=0
+    )
+    for i in range(5):
+        record = _log_record(i, ts=i * 5.0)
+        if i == 2:
+            record['latency_ms'] = None
+        evaluator.process_record(record)
+    evaluator.flush()
+    
+    assert len(evaluator.windows) == 1
+    assert evaluator.windows[0].system['sampling']['failed'] == 1
+    assert len(evaluator.windows[0].detailed) == 4
+    assert evaluator.record_failures == 1
+    
+    bad = _log_record(99, ts=1000.0)
+    bad['latency_ms'] = "n/a"
+    evaluator.process_record(bad)
+    evaluator.close()
+    assert len(evaluator.windows) == 1
+    assert evaluator.failed_windows[0]['window_start'] == 1000.0
+    assert "could be scored" in evaluator.failed_windows[0]['error']
+
+def test_tail_jsonl_follows_appends(tmp_path):
+    """Test the tailer yields complete lines appended after start."""
+    import threading
+    import time
+    import online_eval
+    path = tmp_path / "requests.jsonl"
+    path.write_text('{"old": true}\n')
+    stop = threading.Event()
+    records = []
+    
+    def consume():
+        for record in online_eval.tail_jsonl(str(path), stop, poll_interval=0.01):
+            records.append(record)
+            if record == {"n": 2}:
+                stop.set()
+    
+    def wait_for(condition):
+        deadline = time.monotonic() + 5
+        while not condition():
+            assert time.monotonic() < deadline, records
+            time.sleep(0.005)
+    
+    thread = threading.Thread(target=consume)
+    thread.start()
+    with open(path, 'a') as f:
+        # Ping until the tailer is following the end of the file
+        def seen_ping():
+            f.write('{"ping": true}\n')
+            f.flush()
+            time.sleep(0.005)
+            return bool(records)
+        wait_for(seen_ping)
+        f.write('{"n": 1}\n{"n": ')
+        f.flush()
+        wait_for(lambda: {"n": 1} in records)  # The partial line has been read too
+        f.write('2}\nnot json\n')
+    thread.join(timeout=5)
+    stop.set()
+    
+    assert [r for r in records if "ping" not in r] == [{"n": 1}, {"n": 2}]
@@ -8,12 +8,23 @@ Requirements:
     pip install openai pydantic structlog
 """
 
+import sys
 import time
 import re
+import uuid
+import bisect
+import itertools
+import asyncio
+import inspect
+import functools
 import threading
+import contextlib
+import contextvars
 from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass, field
-from typing import Optional, Any, Callable
+from typing import Optional, Any, Callable, Iterator, Union
 from enum import Enum
 import structlog
 
@@ -45,12 +56,67 @@ class GuardrailResult:
     metadata: dict = field(default_factory=dict)
 
 
+@dataclass
+class PreprocessedInput:
+    """
+    A user message normalized once per turn.
+    
+    Built by preprocess_input() (via GuardrailPipeline.preprocess) and
+    shared by every input guardrail and the action router, so adding a
+    check does not add another lowercase/tokenize/extract pass.
+    """
+    raw: str
+    normalized: str  # Lowercased
+    order_ids: list = field(default_factory=list)  # Uppercased, in order of appearance
+    amounts: list = field(default_factory=list)  # Numbers outside order IDs, as floats
+    product_ids: list = field(default_factory=list)  # e.g. "Widget A"
+    
+    @functools.cached_property
+    def tokens(self) -> list:
+        """Word tokens of normalized, computed only if a check asks for them."""
+        return _TOKEN_RE.findall(self.normalized)
+
+
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+# Order IDs come first in the alternation so their digits are never read as
+# amounts; the lookahead lets the engine skip to candidate characters.
+# Amounts may use thousands separators ("$1,000" is 1000, not 1 and 0).
+_ENTITY_RE = re.compile(
+    r"(?=[ow$\d])(?:(ord-\d{8})|(\bwidget [a-z]\b)|\$?((?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d{2})?))"
+)
+
+
+def preprocess_input(text: str) -> PreprocessedInput:
+    """Normalize a message and extract its entities in one place."""
+    normalized = text.lower()
+    order_ids, amounts, product_ids = [], [], []
+    for order_id, product_id, amount in _ENTITY_RE.findall(normalized):
+        if order_id:
+            order_ids.append(order_id.upper())
+        elif product_id:
+            product_ids.append(product_id.title())
+        else:
+            amounts.append(float(amount.replace(",", "")))
+    return PreprocessedInput(
+        raw=text,
+        normalized=normalized,
+        order_ids=order_ids,
+        amounts=amounts,
+        product_ids=product_ids
+    )
+
+
+def _as_input(user_input: Union[str, PreprocessedInput]) -> PreprocessedInput:
+    return user_input if isinstance(user_input, PreprocessedInput) else preprocess_input(user_input)
+
+
 @dataclass
 class AgentAction:
     """An action the agent wants to take."""
     tool_name: str
     parameters: dict
     reasoning: str = ""
+    depends_on: list = field(default_factory=list)  # Indices of earlier actions in the same plan
 
 
 @dataclass
@@ -68,10 +134,24 @@ class AgentConfig:
     # Time limits
     max_conversation_duration_seconds: float = 300.0
     tool_timeout_seconds: float = 10.0
+    max_tool_workers: int = 32  # Threads per synchronous tool (each tool has its own pool)
+    
+    # Tool result cache (read-only tools only; shared across conversations)
+    tool_cache_ttls: dict = field(
+        default_factory=lambda: {"lookup_order": 30.0, "check_inventory": 10.0}
+    )
+    tool_cache_max_entries: int = 10_000
+    # tool -> {parameter: canonical form}; other parameters are keyed exactly
+    tool_cache_normalizers: dict = field(default_factory=dict)
     
     # Cost limits
     max_cost_per_conversation: float = 1.00
     
+    # Sessions (one agent serves many conversations)
+    session_ttl_seconds: float = 1800.0  # Idle time before a conversation is dropped
+    max_sessions: int = 10_000
+    max_session_memory_mb: float = 256.0
+    
     # Safety
     require_confirmation_for: list = field(
         default_factory=lambda: ["process_refund", "send_email"]
@@ -125,6 +205,14 @@ class EscalationRequired(Exception):
         super().__init__(f"Escalation required: {reason}")
 
 
+class ToolTimeout(Exception):
+    """Raised when a tool call misses its deadline."""
+    def __init__(self, tool_name: str, timeout: float):
+        self.tool_name = tool_name
+        self.timeout = timeout
+        super().__init__(f"Tool '{tool_name}' timed out after {timeout}s")
+
+
 # =============================================================================
 # GUARDRAILS
 # =============================================================================
@@ -135,6 +223,114 @@ class Guardrail(ABC):
     @abstractmethod
     def check(self, *args, **kwargs) -> GuardrailResult:
         pass
+    
+    async def acheck(self, *args, **kwargs) -> GuardrailResult:
+        """Async check; guardrails that call remote services override this."""
+        return self.check(*args, **kwargs)
+
+
+
+class AhoCorasick:
+    """
+    Multi-phrase matcher (Aho-Corasick automaton).
+    
+    Built once from a phrase list; a search walks the text once, so the
+    cost per message grows with its length and the number of matches,
+    not with the number of phrases.
+    """
+    
+    def __init__(self, phrases: list, word_boundary: bool = False, case_sensitive: bool = False):
+        """
+        Args:
+            phrases: Phrases to find
+            word_boundary: Only report matches not inside a longer word
+                ("admin" matches "admin panel" but not "badminton")
+            case_sensitive: Match case exactly (default: ignore case)
+        """
+        self.phrases = [p for p in phrases if p]
+        self._max_len = max(map(len, self.phrases), default=0)
+        self.word_boundary = word_boundary
+        self.case_sensitive = case_sensitive
+        
+        # Trie: goto[node] maps a character to the child node
+        self._goto: list[dict] = [{}]
+        self._out: list[list] = [[]]  # Phrase indices ending at each node
+        for index, phrase in enumerate(self.phrases):
+            node = 0
+            for ch in (phrase if case_sensitive else phrase.lower()):
+                child = self._goto[node].get(ch)
+                if child is None:
+                    child = len(self._goto)
+                    self._goto[node][ch] = child
+                    self._goto.append({})
+                    self._out.append([])
+                node = child
+            self._out[node].append(index)
+        
+        # Failure links (longest proper suffix that is also a trie path), breadth first
+        self._fail = [0] * len(self._goto)
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+    
+    @staticmethod
+    def _is_word_char(ch: str) -> bool:
+        return ch.isalnum() or ch == "_"
+    
+    def iter_matches(self, text: str) -> Iterator[tuple]:
+        """Yield (start, end, phrase) for every match, in order of end offset."""
+        if not self.case_sensitive:
+            text = text.lower()
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for index in out[node]:
+                phrase = self.phrases[index]
+                start, end = i + 1 - len(phrase), i + 1
+                if self.word_boundary and (
+                    (start > 0 and self._is_word_char(text[start - 1]))
+                    or (end < len(text) and self._is_word_char(text[end]))
+                ):
+                    continue
+                yield start, end, phrase
+    
+    def find_all(self, text: str) -> list[tuple]:
+        return list(self.iter_matches(text))
+    
+    def search(self, text: str) -> Optional[tuple]:
+        """Leftmost match, with the longest phrase starting there, or None."""
+        best = None
+        for start, end, phrase in self.iter_matches(text):
+            if best is not None and end - self._max_len > best[0]:
+                break  # Every later match starts after the best one
+            if best is None or (start, start - end) < (best[0], best[0] - best[1]):
+                best = start, end, phrase
+        return best
+
+
+def _raw_span(message: "PreprocessedInput", start: int, end: int) -> tuple[int, int]:
+    """Map a [start, end) span of message.normalized back to message.raw."""
+    if len(message.raw) == len(message.normalized):
+        return start, end
+    # Lowercasing changed the length (e.g. "İ" -> "i̇"): locate via each char's lowered length
+    ends = list(itertools.accumulate(len(ch.lower()) for ch in message.raw))
+    return bisect.bisect_right(ends, start), bisect.bisect_left(ends, end) + 1 if end else 0
+
+
+def _lowercase_literals(pattern: str) -> str:
+    """Lowercase a regex's letters, leaving escapes such as \\D or \\S alone."""
+    return re.sub(r"\\.|[A-Z]", lambda m: m.group() if len(m.group()) > 1 else m.group().lower(), pattern)
 
 
 class InputGuardrail(Guardrail):
@@ -158,50 +354,144 @@ class InputGuardrail(Guardrail):
         "employee", "password", "api key", "secret",
     ]
     
-    def check(self, user_input: str, context: dict = None) -> GuardrailResult:
+    # Below this many scope indicators, C-level substring (or regex) scans
+    # beat walking the pure-Python automaton character by character
+    SCOPE_AUTOMATON_MIN_PHRASES = 64
+    
+    def __init__(self, out_of_scope: Optional[list] = None, scope_word_boundary: bool = False):
+        """
+        Args:
+            out_of_scope: Scope indicators (defaults to OUT_OF_SCOPE); may
+                hold thousands of phrases
+            scope_word_boundary: Match indicators as whole words only
+        """
+        self.out_of_scope = list(out_of_scope) if out_of_scope is not None else self.OUT_OF_SCOPE
+        # Matched against the already-lowercased PreprocessedInput.normalized
+        phrases = [p.lower() for p in self.out_of_scope if p]
+        self._scope_matcher = self._scope_regex = None
+        self._scope_phrases = phrases
+        if len(phrases) >= self.SCOPE_AUTOMATON_MIN_PHRASES:
+            self._scope_matcher = AhoCorasick(phrases, word_boundary=scope_word_boundary, case_sensitive=True)
+        elif scope_word_boundary and phrases:
+            alternation = "|".join(re.escape(p) for p in sorted(phrases, key=len, reverse=True))
+            self._scope_regex = re.compile(rf"(?<!\w)(?:{alternation})(?!\w)")
+        
+        # All patterns as one alternation, matched against the lowercased
+        # input. Every branch starts with a literal, so the regex engine can
+        # skip ahead to candidate characters and benign messages cost a
+        # single fast scan. (Named groups or IGNORECASE would disable that.)
+        patterns = [_lowercase_literals(p) for p in self.INJECTION_PATTERNS]
+        self._injection_regex = re.compile("|".join(patterns))
+        self._injection_patterns = [re.compile(p) for p in patterns]
+    
+    def check(self, user_input: Union[str, PreprocessedInput], context: dict = None) -> GuardrailResult:
         """Run all input checks."""
+        message = _as_input(user_input)
+        
         # Check prompt injection
-        result = self._check_prompt_injection(user_input)
+        result = self._check_prompt_injection(message)
         if not result.passed:
             return result
         
         # Check scope
-        result = self._check_scope(user_input)
+        result = self._check_scope(message)
         if not result.passed:
             return result
         
         return GuardrailResult(passed=True)
     
-    def _check_prompt_injection(self, text: str) -> GuardrailResult:
-        """Detect prompt injection attempts."""
-        text_lower = text.lower()
-        
-        for pattern in self.INJECTION_PATTERNS:
-            if re.search(pattern, text_lower, re.IGNORECASE):
-                return GuardrailResult(
-                    passed=False,
-                    action=GuardrailAction.BLOCK,
-                    reason="potential_prompt_injection",
-                    message="I can't process that request.",
-                    metadata={"pattern": pattern}
-                )
+    def _checks(self) -> list:
+        """Independent input checks, in reporting priority order (may be async)."""
+        return [self._check_prompt_injection, self._check_scope]
+    
+    async def acheck(self, user_input: Union[str, PreprocessedInput], context: dict = None) -> GuardrailResult:
+        """
+        Run all input checks; the first failure in priority order wins.
         
+        The built-in checks are microsecond regex scans, so they run inline
+        (a thread hop would cost more than the scan) and, as in check(),
+        checks after a failure are skipped. Awaitable checks (e.g. a remote
+        classifier added to _checks()) are started as tasks and awaited
+        together, so their network time overlaps.
+        """
+        message = _as_input(user_input)
+        results = []
+        for check in self._checks():
+            result = check(message)
+            if inspect.isawaitable(result):
+                result = asyncio.ensure_future(result)
+            results.append(result)
+            if isinstance(result, GuardrailResult) and not result.passed:
+                break  # No later check can take priority over this failure
+        pending = [result for result in results if isinstance(result, asyncio.Future)]
+        if pending:
+            await asyncio.gather(*pending)
+        for result in results:
+            if isinstance(result, asyncio.Future):
+                result = result.result()
+            if not result.passed:
+                return result
         return GuardrailResult(passed=True)
     
-    def _check_scope(self, text: str) -> GuardrailResult:
-        """Check if request is in scope."""
-        text_lower = text.lower()
-        
-        for indicator in self.OUT_OF_SCOPE:
-            if indicator in text_lower:
-                return GuardrailResult(
-                    passed=False,
-                    action=GuardrailAction.BLOCK,
-                    reason="out_of_scope",
-                    message="I can help with order inquiries and refunds. "
-                            "For other requests, please contact support.",
-                    metadata={"indicator": indicator}
-                )
+    def _check_prompt_injection(self, message: PreprocessedInput) -> GuardrailResult:
+        """
+        Detect prompt injection attempts.
+        
+        Reports the pattern of the earliest match in the text (not the
+        first pattern in list order).
+        """
+        text_lower = message.normalized
+        
+        match = self._injection_regex.search(text_lower)
+        if match:
+            # Rare path: find which pattern matched where the scan stopped
+            index = next(i for i, regex in enumerate(self._injection_patterns)
+                         if regex.match(text_lower, match.start()))
+            return GuardrailResult(
+                passed=False,
+                action=GuardrailAction.BLOCK,
+                reason="potential_prompt_injection",
+                message="I can't process that request.",
+                metadata={"pattern": self.INJECTION_PATTERNS[index]}
+            )
+        
+        return GuardrailResult(passed=True)
+    
+    def _check_scope(self, message: PreprocessedInput) -> GuardrailResult:
+        """
+        Check if request is in scope.
+        
+        Reports the leftmost indicator in the text (the longest one if
+        several start there), with start/end as offsets into the raw
+        message. Long indicator lists are scanned in one pass by an
+        automaton; short ones by C substring search. All paths report the
+        same indicator.
+        """
+        text = message.normalized
+        match = None
+        if self._scope_matcher is not None:
+            match = self._scope_matcher.search(text)
+        elif self._scope_regex is not None:
+            found = self._scope_regex.search(text)
+            if found:
+                match = found.start(), found.end(), found.group()
+        else:
+            for phrase in self._scope_phrases:
+                if phrase in text:  # Rare path: locate the leftmost, longest hit
+                    start = text.find(phrase)
+                    if match is None or (start, -len(phrase)) < (match[0], match[0] - match[1]):
+                        match = start, start + len(phrase), phrase
+        if match:
+            start, end, indicator = match
+            start, end = _raw_span(message, start, end)
+            return GuardrailResult(
+                passed=False,
+                action=GuardrailAction.BLOCK,
+                reason="out_of_scope",
+                message="I can help with order inquiries and refunds. "
+                        "For other requests, please contact support.",
+                metadata={"indicator": indicator, "start": start, "end": end}
+            )
         
         return GuardrailResult(passed=True)
 
@@ -212,15 +502,24 @@ class ActionGuardrail(Guardrail):
     def __init__(self, config: AgentConfig):
         self.config = config
     
-    def check(self, action: AgentAction, state: AgentState) -> GuardrailResult:
-        """Run all action checks."""
+    def check(self, action: AgentAction, state: AgentState,
+              approved: Optional[list] = None) -> GuardrailResult:
+        """
+        Run all action checks.
+        
+        Args:
+            action: The action to check
+            state: The conversation's state
+            approved: Actions of the same plan already approved but not yet
+                run, which count towards cumulative limits
+        """
         # Check tool allowed
         result = self._check_tool_allowed(action)
         if not result.passed:
             return result
         
         # Check parameters
-        result = self._check_parameters(action, state)
+        result = self._check_parameters(action, state, approved or [])
         if not result.passed:
             return result
         
@@ -246,14 +545,14 @@ class ActionGuardrail(Guardrail):
         
         return GuardrailResult(passed=True)
     
-    def _check_parameters(self, action: AgentAction, state: AgentState) -> GuardrailResult:
+    def _check_parameters(self, action: AgentAction, state: AgentState, approved: list) -> GuardrailResult:
         """Validate action parameters."""
         if action.tool_name == "process_refund":
-            return self._check_refund_parameters(action, state)
+            return self._check_refund_parameters(action, state, approved)
         
         return GuardrailResult(passed=True)
     
-    def _check_refund_parameters(self, action: AgentAction, state: AgentState) -> GuardrailResult:
+    def _check_refund_parameters(self, action: AgentAction, state: AgentState, approved: list) -> GuardrailResult:
         """Check refund-specific constraints."""
         amount = action.parameters.get("amount", 0)
         
@@ -269,7 +568,8 @@ class ActionGuardrail(Guardrail):
             )
         
         # Cumulative limit
-        total_with_this = state.refunds_processed + amount
+        pending = sum(a.parameters.get("amount", 0) for a in approved if a.tool_name == "process_refund")
+        total_with_this = state.refunds_processed + pending + amount
         if total_with_this > self.config.max_total_refunds_per_conversation:
             return GuardrailResult(
                 passed=False,
@@ -307,39 +607,197 @@ class OutputGuardrail(Guardrail):
         'phone': r'\b\d{3}[-.\s]?\d{3}[-.\s]?\d{4}\b',
     }
     
+    def __init__(self):
+        # All PII types as one alternation of named groups, so detection and
+        # redaction are a single pass that writes a single output string.
+        # Overlaps resolve the way the regex engine scans: the leftmost match
+        # wins, and at the same position the type listed first in
+        # PII_PATTERNS wins (a 16-digit card is never split into an SSN or
+        # phone number). A leading \b shared by every pattern is tested once
+        # per position instead of once per branch.
+        patterns = dict(self.PII_PATTERNS)
+        prefix = ""
+        if all(pattern.startswith(r"\b") for pattern in patterns.values()):
+            prefix = r"\b"
+            patterns = {pii_type: pattern[2:] for pii_type, pattern in patterns.items()}
+        self._pii_regex = re.compile(prefix + "(?:" + "|".join(
+            f"(?P<{pii_type}>{pattern})" for pii_type, pattern in patterns.items()
+        ) + ")")
+    
     def check(self, output: str, context: dict = None) -> GuardrailResult:
         """Run all output checks."""
         # Check for PII
         result = self._check_pii(output)
         return result
     
+    def redact(self, text: str) -> tuple[str, dict]:
+        """
+        Redact every PII match in one pass.
+        
+        Returns:
+            (redacted text, {pii_type: number of matches})
+        """
+        counts: dict = {}
+        
+        def replace(match: re.Match) -> str:
+            pii_type = match.lastgroup
+            counts[pii_type] = counts.get(pii_type, 0) + 1
+            return f'[REDACTED {pii_type.upper()}]'
+        
+        return self._pii_regex.sub(replace, text), counts
+    
     def _check_pii(self, text: str) -> GuardrailResult:
         """Detect and redact PII."""
-        redacted = text
-        found_pii = []
-        
-        for pii_type, pattern in self.PII_PATTERNS.items():
-            matches = re.findall(pattern, text)
-            if matches:
-                found_pii.append(pii_type)
-                redacted = re.sub(
-                    pattern, 
-                    f'[REDACTED {pii_type.upper()}]', 
-                    redacted
-                )
+        redacted, counts = self.redact(text)
         
-        if found_pii:
+        if counts:
             return GuardrailResult(
                 passed=True,  # Pass but modified
                 action=GuardrailAction.MODIFY,
                 output=redacted,
                 reason="pii_redacted",
-                metadata={"pii_types": found_pii}
+                metadata={
+                    "pii_types": [t for t in self.PII_PATTERNS if t in counts],
+                    "pii_counts": counts
+                }
             )
         
         return GuardrailResult(passed=True, output=text)
 
 
+class StreamingRedactor:
+    """
+    Incremental PII redaction for token-by-token LLM output.
+    
+    feed() returns the text that is safe to show now; only the trailing
+    run of characters that could still be part of a PII match is held
+    back (e.g. "4111 1111" while the rest of a card number is in
+    flight). Every PII match is made of CONTINUATION characters, plus
+    whitespace right after a digit (card/SSN/phone separators), so a run
+    ending at anything else cannot be extended by later chunks.
+    
+    Usage:
+        redactor = StreamingRedactor()
+        for token in llm_stream:
+            send(redactor.feed(token))
+        send(redactor.close())
+    """
+    
+    # Characters that can occur inside a match of OutputGuardrail.PII_PATTERNS
+    CONTINUATION = re.compile(r"[\w.%+@|-]")
+    
+    def __init__(self, guardrail: Optional["OutputGuardrail"] = None, max_holdback: int = 256):
+        """
+        Args:
+            guardrail: Supplies the PII patterns (defaults to OutputGuardrail())
+            max_holdback: Most characters held back at once. Longer runs are
+                released from the front; only a single PII match longer
+                than this (longer than any valid email) could slip through.
+        """
+        self.guardrail = guardrail or OutputGuardrail()
+        self.max_holdback = max_holdback
+        self.pii_counts: dict = {}
+        self._regex = self.guardrail._pii_regex
+        self._held = ""
+        self._context = ""  # Last emitted character, for \b at the start of _held
+        self._arrivals: deque = deque()  # (stream offset after chunk, arrival time)
+        self._received = 0
+        self._emitted = 0
+        self._holdback_s: list = []
+        self._max_held = 0
+        self._closed = False
+    
+    def feed(self, chunk: str) -> str:
+        """Add a chunk of model output; returns the redacted text safe to emit now."""
+        if self._closed:
+            raise ValueError("feed() after close()")
+        if not chunk:
+            return ""
+        self._held += chunk
+        self._received += len(chunk)
+        self._arrivals.append((self._received, time.monotonic()))
+        self._max_held = max(self._max_held, len(self._held))
+        
+        split = self._holdback_start(self._held)
+        split = max(split, len(self._held) - self.max_holdback)
+        return self._release(split, final=False)
+    
+    def close(self) -> str:
+        """End of stream: redact and return everything still held back."""
+        if self._closed:
+            return ""
+        self._closed = True
+        return self._release(len(self._held), final=True)
+    
+    def redact_stream(self, chunks) -> Iterator[str]:
+        """Redact an iterable of chunks, yielding non-empty safe text."""
+        for chunk in chunks:
+            text = self.feed(chunk)
+            if text:
+                yield text
+        text = self.close()
+        if text:
+            yield text
+    
+    def _holdback_start(self, text: str) -> int:
+        """Start of the trailing run that a later chunk could extend into a match."""
+        i = len(text)
+        while i > 0:
+            ch = text[i - 1]
+            if self.CONTINUATION.match(ch) or (ch.isspace() and i > 1 and text[i - 2].isdigit()):
+                i -= 1
+            else:
+                break
+        return i
+    
+    def _release(self, split: int, final: bool) -> str:
+        """Redact and emit _held[:split], keeping the rest held back."""
+        if split <= 0:
+            return ""
+        text = self._context + self._held
+        start, end = len(self._context), len(self._context) + split
+        out = []
+        position = start
+        for match in self._regex.finditer(text, start):
+            if match.start() >= end:
+                break
+            if match.end() > end:
+                # A match crossing a forced split is emitted whole and redacted
+                end = match.end()
+            pii_type = match.lastgroup
+            self.pii_counts[pii_type] = self.pii_counts.get(pii_type, 0) + 1
+            out.append(text[position:match.start()])
+            out.append(f'[REDACTED {pii_type.upper()}]')
+            position = match.end()
+        out.append(text[position:end])
+        
+        split = end - start
+        self._context = self._held[split - 1]
+        self._held = self._held[split:]
+        self._emitted += split
+        now = time.monotonic()
+        while self._arrivals and self._arrivals[0][0] <= self._emitted:
+            self._holdback_s.append(now - self._arrivals.popleft()[1])
+        return "".join(out)
+    
+    def stats(self) -> dict:
+        """Hold-back statistics: per-chunk delay until fully emitted, and buffer size."""
+        delays = sorted(self._holdback_s)
+        
+        def percentile(q: float) -> float:
+            return delays[min(len(delays) - 1, int(q * len(delays)))] * 1000 if delays else 0.0
+        
+        return {
+            "chunks": len(delays),
+            "holdback_ms_p50": percentile(0.50),
+            "holdback_ms_p95": percentile(0.95),
+            "holdback_ms_max": delays[-1] * 1000 if delays else 0.0,
+            "held_chars": len(self._held),
+            "max_held_chars": self._max_held,
+            "pii_counts": dict(self.pii_counts)
+        }
+
+
 # =============================================================================
 # CIRCUIT BREAKERS
 # =============================================================================
@@ -488,29 +946,279 @@ class CircuitBreakerManager:
         self.breakers['iteration'].reset()
 
 
+# =============================================================================
+# SESSIONS
+# =============================================================================
+
+def _deep_sizeof(obj, seen: Optional[set] = None) -> int:
+    """Approximate memory held by obj and everything it references."""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_sizeof(k, seen) + _deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+        size += sum(_deep_sizeof(item, seen) for item in obj)
+    elif hasattr(obj, '__dict__'):
+        size += _deep_sizeof(vars(obj), seen)
+    return size
+
+
+@dataclass
+class Session:
+    """Everything one conversation carries between turns."""
+    state: AgentState
+    circuit_breakers: CircuitBreakerManager
+    last_access: float = field(default_factory=time.monotonic)
+    size_bytes: int = 0
+    measured: dict = field(default_factory=dict)  # State list -> (entries, bytes) in size_bytes
+    active: int = 0  # Turns in progress; active sessions are never evicted
+    # Serializes turns from threads and from any event loop alike (an
+    # asyncio.Lock is bound to the loop that first waits on it)
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+
+async def _acquire_async(lock: threading.Lock):
+    """Acquire a thread lock from a coroutine, waiting in a worker thread."""
+    if lock.acquire(blocking=False):
+        return
+    acquired = asyncio.get_running_loop().run_in_executor(None, lock.acquire)
+    try:
+        await asyncio.shield(acquired)
+    except asyncio.CancelledError:
+        # The worker still takes the lock; hand it straight back
+        acquired.add_done_callback(lambda f: f.cancelled() or f.exception() or lock.release())
+        raise
+
+
+class SessionStore:
+    """
+    Thread-safe conversation_id -> Session map.
+    
+    Sessions idle for longer than the TTL are dropped, and when there
+    are more than max_sessions or their estimated memory exceeds the cap,
+    the least recently used idle sessions are evicted first. Turns of the
+    same conversation are serialized on the session's lock (threads use
+    session(), coroutines on any event loop asession()); different
+    conversations run in parallel.
+    
+    Usage:
+        with store.session("conv-42") as session:
+            session.state.turn_count += 1
+    """
+    
+    def __init__(self, config: AgentConfig, ttl_seconds: Optional[float] = None,
+                 max_sessions: Optional[int] = None, max_memory_mb: Optional[float] = None):
+        self.config = config
+        self.ttl_seconds = config.session_ttl_seconds if ttl_seconds is None else ttl_seconds
+        self.max_sessions = config.max_sessions if max_sessions is None else max_sessions
+        self.max_memory_bytes = int(
+            (config.max_session_memory_mb if max_memory_mb is None else max_memory_mb) * 1024 * 1024
+        )
+        self._sessions: dict = {}
+        # Sessions with no turn in progress, least recently used first. Only
+        # these can be evicted, so eviction never scans busy conversations.
+        self._idle: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._total_bytes = 0
+        self.evictions = {"ttl": 0, "lru": 0, "memory": 0}
+        self._base_bytes = _deep_sizeof(AgentState(conversation_id=""))
+    
+    # AgentState fields that grow during a conversation; everything else is fixed-size
+    _GROWING = ("actions_taken", "guardrail_triggers")
+    
+    def _new_session(self, conversation_id: str) -> Session:
+        session = Session(
+            state=AgentState(conversation_id=conversation_id),
+            circuit_breakers=CircuitBreakerManager(self.config)
+        )
+        session.size_bytes = self._base_bytes + len(conversation_id)
+        return session
+    
+    def _measure(self, session: Session) -> int:
+        """Estimated session size, sizing only list entries added since the last turn."""
+        size = session.size_bytes
+        for name in self._GROWING:
+            items = getattr(session.state, name)
+            count, nbytes = session.measured.get(name, (0, 0))
+            if len(items) < count:  # The list was cleared or trimmed: size it again
+                size -= nbytes
+                count, nbytes = 0, 0
+            added = sum(_deep_sizeof(item) for item in items[count:])
+            session.measured[name] = (len(items), nbytes + added)
+            size += added
+        return size
+    
+    @contextlib.contextmanager
+    def session(self, conversation_id: Optional[str] = None) -> Iterator[Session]:
+        """Hold a conversation's session (created if new or expired) for one turn."""
+        conversation_id, session = self._checkout(conversation_id)
+        size = session.size_bytes
+        try:
+            with session.lock:
+                try:
+                    yield session
+                finally:
+                    size = self._measure(session)
+        finally:
+            self._checkin(conversation_id, session, size)
+    
+    @contextlib.asynccontextmanager
+    async def asession(self, conversation_id: Optional[str] = None):
+        """session() for coroutines: waiting for the conversation doesn't block the loop."""
+        conversation_id, session = self._checkout(conversation_id)
+        size = session.size_bytes
+        try:
+            await _acquire_async(session.lock)
+            try:
+                yield session
+            finally:
+                try:
+                    size = self._measure(session)
+                finally:
+                    session.lock.release()
+        finally:
+            self._checkin(conversation_id, session, size)
+    
+    def _checkout(self, conversation_id: Optional[str]) -> tuple:
+        conversation_id = conversation_id or f"conv-{uuid.uuid4().hex[:12]}"
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(conversation_id)
+            if session is not None and now - session.last_access > self.ttl_seconds and not session.active:
+                self._drop(conversation_id, "ttl")
+                session = None
+            if session is None:
+                session = self._sessions[conversation_id] = self._new_session(conversation_id)
+                self._total_bytes += session.size_bytes
+            else:
+                self._idle.pop(conversation_id, None)
+            session.active += 1
+            session.last_access = now
+            self._evict(now)
+        return conversation_id, session
+    
+    def _checkin(self, conversation_id: str, session: Session, size: int):
+        with self._lock:
+            session.active -= 1
+            session.last_access = time.monotonic()
+            if self._sessions.get(conversation_id) is session:
+                self._total_bytes += size - session.size_bytes
+                if not session.active:
+                    self._idle[conversation_id] = session
+            session.size_bytes = size
+            self._evict(session.last_access)
+    
+    def get(self, conversation_id: str) -> Optional[Session]:
+        """The live session for a conversation, without touching its LRU position."""
+        with self._lock:
+            session = self._sessions.get(conversation_id)
+        if session is not None and time.monotonic() - session.last_access > self.ttl_seconds:
+            return None
+        return session
+    
+    def remove(self, conversation_id: str) -> bool:
+        with self._lock:
+            if conversation_id not in self._sessions:
+                return False
+            self._drop(conversation_id, None)
+            return True
+    
+    def _drop(self, conversation_id: str, reason: Optional[str]):
+        session = self._sessions.pop(conversation_id)
+        self._idle.pop(conversation_id, None)
+        self._total_bytes -= session.size_bytes
+        if reason:
+            self.evictions[reason] += 1
+    
+    def _evict(self, now: float):
+        """Drop expired sessions, then LRU sessions over the count/memory caps (lock held)."""
+        # Idle sessions are in last-access order, so expired ones are at the
+        # front and both passes stop at the first session they keep
+        expired = []
+        for conversation_id, session in self._idle.items():
+            if now - session.last_access <= self.ttl_seconds:
+                break
+            expired.append(conversation_id)
+        for conversation_id in expired:
+            self._drop(conversation_id, "ttl")
+        
+        count, total = len(self._sessions), self._total_bytes
+        victims = []
+        for conversation_id, session in self._idle.items():
+            if count <= self.max_sessions and total <= self.max_memory_bytes:
+                break
+            victims.append((conversation_id, "lru" if count > self.max_sessions else "memory"))
+            count -= 1
+            total -= session.size_bytes
+        for conversation_id, reason in victims:
+            self._drop(conversation_id, reason)
+    
+    def __len__(self) -> int:
+        return len(self._sessions)
+    
+    def __contains__(self, conversation_id: str) -> bool:
+        return self.get(conversation_id) is not None
+    
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "active": len(self._sessions) - len(self._idle),
+                "memory_bytes": self._total_bytes,
+                "evictions": dict(self.evictions)
+            }
+
+
+# The session whose turn is running in this thread / task
+_CURRENT_SESSION: contextvars.ContextVar = contextvars.ContextVar("guarded_agent_session", default=None)
+
+
 # =============================================================================
 # GUARDRAIL PIPELINE
 # =============================================================================
 
 class GuardrailPipeline:
-    """Chains guardrails together."""
+    """
+    Chains guardrails together.
+    
+    Triggers are recorded on the state of the conversation whose turn is
+    running (AgentState.guardrail_triggers), so they count towards that
+    session's memory and leave with it; the pipeline itself only keeps
+    bounded counts by stage and reason.
+    """
     
     def __init__(self, config: AgentConfig):
         self.input_guardrail = InputGuardrail()
         self.action_guardrail = ActionGuardrail(config)
         self.output_guardrail = OutputGuardrail()
-        self.triggers: list = []
+        self.trigger_counts: dict = {}  # (stage, reason) -> count, across all conversations
+        self._counts_lock = threading.Lock()
+    
+    def preprocess(self, user_input: str) -> PreprocessedInput:
+        """Normalize a turn's input once, for every guardrail and the action router."""
+        return preprocess_input(user_input)
     
-    def check_input(self, user_input: str, context: dict = None) -> GuardrailResult:
+    def check_input(self, user_input: Union[str, PreprocessedInput], context: dict = None) -> GuardrailResult:
         """Check input guardrails."""
         result = self.input_guardrail.check(user_input, context)
         if not result.passed:
             self._log_trigger("input", result)
         return result
     
-    def check_action(self, action: AgentAction, state: AgentState) -> GuardrailResult:
+    async def acheck_input(self, user_input: Union[str, PreprocessedInput], context: dict = None) -> GuardrailResult:
+        """Check input guardrails; awaitable checks overlap (see InputGuardrail.acheck)."""
+        result = await self.input_guardrail.acheck(user_input, context)
+        if not result.passed:
+            self._log_trigger("input", result)
+        return result
+    
+    def check_action(self, action: AgentAction, state: AgentState,
+                     approved: Optional[list] = None) -> GuardrailResult:
         """Check action guardrails."""
-        result = self.action_guardrail.check(action, state)
+        result = self.action_guardrail.check(action, state, approved)
         if not result.passed or result.action != GuardrailAction.ALLOW:
             self._log_trigger("action", result)
         return result
@@ -522,6 +1230,30 @@ class GuardrailPipeline:
             self._log_trigger("output", result)
         return result
     
+    async def acheck_output(self, output: str, context: dict = None) -> GuardrailResult:
+        """Check output guardrails from a coroutine."""
+        result = await self.output_guardrail.acheck(output, context)
+        if result.action == GuardrailAction.MODIFY:
+            self._log_trigger("output", result)
+        return result
+    
+    def stream_output(self, chunks, redactor: Optional[StreamingRedactor] = None) -> Iterator[str]:
+        """Check output guardrails on a token stream, yielding safe text as it clears."""
+        redactor = redactor or StreamingRedactor(self.output_guardrail)
+        yield from redactor.redact_stream(chunks)
+        
+        stats = redactor.stats()
+        if redactor.pii_counts:
+            self._log_trigger("output", GuardrailResult(
+                passed=True,
+                action=GuardrailAction.MODIFY,
+                reason="pii_redacted",
+                metadata={"pii_counts": stats["pii_counts"]}
+            ))
+        logger.info("output_stream_completed",
+                    holdback_ms_p95=stats["holdback_ms_p95"],
+                    max_held_chars=stats["max_held_chars"])
+    
     def _log_trigger(self, stage: str, result: GuardrailResult):
         """Log guardrail trigger."""
         trigger = {
@@ -530,7 +1262,12 @@ class GuardrailPipeline:
             "reason": result.reason,
             "action": result.action.value,
         }
-        self.triggers.append(trigger)
+        with self._counts_lock:
+            key = (stage, result.reason)
+            self.trigger_counts[key] = self.trigger_counts.get(key, 0) + 1
+        session = _CURRENT_SESSION.get()
+        if session is not None:
+            session.state.guardrail_triggers.append(trigger)
         logger.warning("guardrail_triggered", **trigger)
 
 
@@ -585,6 +1322,269 @@ class MockTools:
         }
 
 
+class AsyncMockTools:
+    """MockTools behind async interfaces, with simulated backend latency."""
+    
+    def __init__(self, latency_seconds: float = 0.0):
+        self.latency_seconds = latency_seconds
+    
+    async def lookup_order(self, order_id: str) -> dict:
+        await asyncio.sleep(self.latency_seconds)
+        return MockTools.lookup_order(order_id)
+    
+    async def check_inventory(self, product_id: str) -> dict:
+        await asyncio.sleep(self.latency_seconds)
+        return MockTools.check_inventory(product_id)
+    
+    async def process_refund(self, order_id: str, amount: float, reason: str) -> dict:
+        await asyncio.sleep(self.latency_seconds)
+        return MockTools.process_refund(order_id, amount, reason)
+    
+    async def escalate(self, reason: str, context: str) -> dict:
+        await asyncio.sleep(self.latency_seconds)
+        return MockTools.escalate(reason, context)
+
+
+# =============================================================================
+# TOOL METRICS
+# =============================================================================
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram (Prometheus-style upper bounds, in ms)."""
+    
+    BOUNDS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+    
+    def __init__(self, bounds_ms: tuple = BOUNDS_MS):
+        self.bounds_ms = tuple(bounds_ms)
+        self.counts = [0] * (len(self.bounds_ms) + 1)  # Last bucket is +Inf
+        self.count = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+    
+    def observe(self, seconds: float):
+        ms = seconds * 1000
+        self.counts[bisect.bisect_left(self.bounds_ms, ms)] += 1
+        self.count += 1
+        self.sum_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+    
+    def percentile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th quantile (max for +Inf)."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        cumulative = 0
+        for bound, n in zip(self.bounds_ms, self.counts):
+            cumulative += n
+            if cumulative >= target:
+                return min(bound, self.max_ms)
+        return self.max_ms
+    
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_ms": self.sum_ms / self.count if self.count else 0.0,
+            "p50_ms": self.percentile(0.50),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": self.max_ms,
+            "buckets": {
+                **{f"le_{bound}": n for bound, n in zip(self.bounds_ms, self.counts)},
+                "le_inf": self.counts[-1]
+            }
+        }
+
+
+class ToolMetrics:
+    """Per-tool latency histograms and outcome counts, safe across threads."""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency: dict = {}
+        self.outcomes: dict = {}
+    
+    def record(self, tool_name: str, seconds: float, outcome: str):
+        """outcome is 'ok', 'error' or 'timeout'."""
+        with self._lock:
+            histogram = self.latency.get(tool_name)
+            if histogram is None:
+                histogram = self.latency[tool_name] = LatencyHistogram()
+            histogram.observe(seconds)
+            outcomes = self.outcomes.setdefault(tool_name, {"ok": 0, "error": 0, "timeout": 0})
+            outcomes[outcome] += 1
+    
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                tool_name: {**histogram.snapshot(), **self.outcomes[tool_name]}
+                for tool_name, histogram in self.latency.items()
+            }
+
+
+# =============================================================================
+# TOOL RESULT CACHE
+# =============================================================================
+
+class ToolResultCache:
+    """
+    TTL + LRU cache of read-only tool results, shared by every conversation.
+    
+    Keys are the tool name plus its parameters, exactly as given unless
+    a normalizer maps a parameter to the form its backend treats it as
+    (only safe when the backend really is insensitive to the difference,
+    and its result doesn't echo the input back). Concurrent
+    identical calls share one backend call (single flight), also across
+    threads running process(); it finishes even if the turn that started
+    it is cancelled. When a mutating tool in INVALIDATES runs,
+    cached results and in-flight calls with the same parameter value
+    (e.g. the order_id a refund touched) are dropped. Cached results are
+    shared objects; treat them as read-only.
+    """
+    
+    # Mutating tool -> parameters whose values invalidate cached reads
+    INVALIDATES = {"process_refund": ("order_id",)}
+    
+    def __init__(self, ttls: dict, max_entries: int = 10_000, normalizers: Optional[dict] = None):
+        """
+        Args:
+            ttls: tool_name -> seconds to cache its results (others aren't cached)
+            max_entries: Most results kept; least recently used go first
+            normalizers: tool_name -> {parameter: function returning the
+                canonical value}, e.g. {"check_inventory": {"product_id": str.upper}}
+        """
+        self.ttls = dict(ttls)
+        self.max_entries = max_entries
+        self.normalizers = {tool_name: dict(fns) for tool_name, fns in (normalizers or {}).items()}
+        self._lock = threading.Lock()
+        self._entries: OrderedDict = OrderedDict()  # key -> (expires_at, result), LRU first
+        self._index: dict = {}  # (parameter, value) -> keys of entries using it
+        self._inflight: dict = {}  # key -> Future shared by concurrent callers
+        self._stale: set = set()  # In-flight keys invalidated before they finished
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+        self.invalidations = 0
+    
+    def _normalize(self, tool_name: str, name: str, value: Any) -> Any:
+        normalizer = self.normalizers.get(tool_name, {}).get(name)
+        return normalizer(value) if normalizer is not None else value
+    
+    def key(self, tool_name: str, parameters: dict) -> tuple:
+        return (tool_name, tuple(sorted(
+            (name, self._normalize(tool_name, name, value)) for name, value in parameters.items()
+        )))
+    
+    async def get_or_call(self, tool_name: str, parameters: dict, call: Callable) -> dict:
+        """Return a cached result, join an identical in-flight call, or await call()."""
+        if tool_name in self.INVALIDATES:
+            try:
+                return await call()
+            finally:
+                # Also on failure: the backend may have applied part of it
+                for name in self.INVALIDATES[tool_name]:
+                    if name in parameters:
+                        self.invalidate(name, parameters[name])
+        
+        ttl = self.ttls.get(tool_name)
+        if not ttl:
+            return await call()
+        
+        key = self.key(tool_name, parameters)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+                self.misses += 1
+            else:
+                self.shared += 1
+        
+        if not owner:
+            return await asyncio.wrap_future(future)
+        # Shielded: if the owner's turn is cancelled (e.g. the client went
+        # away), the call still finishes for the conversations sharing it
+        task = asyncio.ensure_future(self._call_shared(key, tool_name, ttl, call, future))
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())  # Retrieved by waiters
+        return await asyncio.shield(task)
+    
+    async def _call_shared(self, key: tuple, tool_name: str, ttl: float, call: Callable,
+                           future: Future) -> dict:
+        """Make the backend call for a key and settle the future its waiters share."""
+        try:
+            result = await call()
+        except BaseException as e:
+            with self._lock:
+                del self._inflight[key]
+                self._stale.discard(key)
+            future.set_exception(e if isinstance(e, Exception)
+                                 else RuntimeError(f"Shared {tool_name} call was cancelled"))
+            raise
+        with self._lock:
+            del self._inflight[key]
+            if key in self._stale:
+                self._stale.discard(key)
+            else:
+                self._store(key, result, time.monotonic() + ttl)
+        future.set_result(result)
+        return result
+    
+    def _store(self, key: tuple, result: dict, expires_at: float):
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (expires_at, result)
+        for param in key[1]:
+            self._index.setdefault(param, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+    
+    def _remove(self, key: tuple):
+        del self._entries[key]
+        for param in key[1]:
+            keys = self._index.get(param)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._index[param]
+    
+    def invalidate(self, name: str, value: Any) -> int:
+        """Drop every cached or in-flight result whose parameter name equals value."""
+        # Every form the value may be keyed under
+        params = {(name, value)} | {
+            (name, fns[name](value)) for fns in self.normalizers.values() if name in fns
+        }
+        with self._lock:
+            keys = {key for param in params for key in self._index.get(param, ())}
+            for key in keys:
+                self._remove(key)
+            stale = [key for key in self._inflight if not params.isdisjoint(key[1])]
+            self._stale.update(stale)
+            self.invalidations += len(keys) + len(stale)
+            return len(keys) + len(stale)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._index.clear()
+            self._stale.update(self._inflight)
+    
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses + self.shared
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "shared": self.shared,
+                "hit_rate": (self.hits + self.shared) / lookups if lookups else 0.0,
+                "invalidations": self.invalidations
+            }
+
+
 # =============================================================================
 # GUARDED AGENT
 # =============================================================================
@@ -601,41 +1601,104 @@ class GuardedAgent:
     """
     An agent with comprehensive guardrails and circuit breakers.
     
+    aprocess() is the native entry point; process() is a thin synchronous
+    wrapper. Tools may be plain functions or coroutines (see
+    AsyncMockTools); plain ones run in a bounded worker pool per tool so
+    they never block the event loop, and a hung backend only ties up its
+    own tool's workers. Every tool call has a deadline of
+    config.tool_timeout_seconds.
+    
     This is a simplified demonstration. A production implementation would:
     - Use a real LLM for reasoning
     - Have more sophisticated tool execution
-    - Include proper async handling
     - Have more comprehensive monitoring
     """
     
-    def __init__(self, config: AgentConfig = None):
+    def __init__(self, config: AgentConfig = None, sessions: Optional[SessionStore] = None,
+                 tools: Any = None):
         self.config = config or AgentConfig()
-        self.state = None
+        self.sessions = sessions or SessionStore(self.config)
         self.guardrails = GuardrailPipeline(self.config)
-        self.circuit_breakers = None
-        self.tools = MockTools()
+        self.tools = tools or MockTools()
+        self.tool_metrics = ToolMetrics()
+        self.tool_cache = ToolResultCache(self.config.tool_cache_ttls, self.config.tool_cache_max_entries,
+                                          self.config.tool_cache_normalizers)
+        self._tool_executors: dict = {}  # tool_name -> ThreadPoolExecutor
+        self._executors_lock = threading.Lock()
         self.logger = logger.bind(agent="guarded_agent")
+        self._loops = threading.local()  # Per-thread event loops for process()
+        self._created_loops: list = []  # All of them, for close()
     
-    def process(self, user_input: str, conversation_id: str = None) -> AgentResponse:
+    @property
+    def state(self) -> Optional[AgentState]:
+        """State of the conversation whose turn is running in this thread/task."""
+        session = _CURRENT_SESSION.get()
+        return session.state if session is not None else None
+    
+    @property
+    def circuit_breakers(self) -> Optional[CircuitBreakerManager]:
+        session = _CURRENT_SESSION.get()
+        return session.circuit_breakers if session is not None else None
+    
+    async def aprocess(self, user_input: str, conversation_id: str = None) -> AgentResponse:
         """
         Process a user message with full guardrails.
         
         Args:
             user_input: The user's message
-            conversation_id: Optional conversation identifier
+            conversation_id: Optional conversation identifier (a new
+                conversation is started if omitted)
         
         Returns:
             AgentResponse with the agent's response
         """
-        # Initialize state for new conversation
-        if self.state is None or conversation_id != self.state.conversation_id:
-            self.state = AgentState(
-                conversation_id=conversation_id or f"conv-{int(time.time())}"
-            )
-            self.circuit_breakers = CircuitBreakerManager(self.config)
+        async with self.sessions.asession(conversation_id) as session:
+            return await self._process_session(session, user_input)
+    
+    def process(self, user_input: str, conversation_id: str = None) -> AgentResponse:
+        """Synchronous aprocess(), for callers without an event loop."""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            pass
+        else:
+            raise RuntimeError("process() called from a running event loop; use await aprocess()")
         
+        loop = getattr(self._loops, "loop", None)
+        if loop is None or loop.is_closed():
+            loop = self._loops.loop = asyncio.new_event_loop()
+            with self._executors_lock:
+                self._created_loops.append(loop)
+        with self.sessions.session(conversation_id) as session:
+            return loop.run_until_complete(self._process_session(session, user_input))
+    
+    def close(self):
+        """
+        Release the tool worker pools (hung sync tools are not waited for)
+        and the event loops process() created. Call it once no process()
+        turn is running.
+        """
+        with self._executors_lock:
+            executors = list(self._tool_executors.values())
+            self._tool_executors.clear()
+            loops, self._created_loops = self._created_loops, []
+        for executor in executors:
+            executor.shutdown(wait=False, cancel_futures=True)
+        for loop in loops:
+            if not loop.is_running():
+                loop.close()
+    
+    async def _process_session(self, session: Session, user_input: str) -> AgentResponse:
+        token = _CURRENT_SESSION.set(session)
+        try:
+            return await self._process_turn(user_input)
+        finally:
+            _CURRENT_SESSION.reset(token)
+    
+    async def _process_turn(self, user_input: str) -> AgentResponse:
+        """Run one turn against the current session, mapping failures to responses."""
         try:
-            return self._process_with_safety(user_input)
+            return await self._process_with_safety(user_input)
         except CircuitBreakerTripped as e:
             return self._handle_circuit_breaker(e)
         except EscalationRequired as e:
@@ -649,120 +1712,212 @@ class GuardedAgent:
                 metadata={"error": str(e)}
             )
     
-    def _process_with_safety(self, user_input: str) -> AgentResponse:
+    async def _process_with_safety(self, user_input: str) -> AgentResponse:
         """Process with all safety checks."""
         # Check circuit breakers
         self.circuit_breakers.on_iteration()
         self.state.turn_count += 1
         
+        message = self.guardrails.preprocess(user_input)
+        
         # 1. Input guardrails
-        input_result = self.guardrails.check_input(user_input)
+        input_result = await self.guardrails.acheck_input(message)
         if not input_result.passed:
             return AgentResponse(
                 content=input_result.message,
                 metadata={"blocked_by": "input_guardrail", "reason": input_result.reason}
             )
         
-        # 2. Determine action (simplified - would use LLM in production)
-        action = self._determine_action(user_input)
+        # 2. Plan actions (simplified - would use LLM in production)
+        notes = []
+        plan = self._plan_actions(message, notes)
         
-        if action is None:
+        if not plan:
             # No tool needed, just respond
-            response = self._generate_response(user_input)
-            return self._finalize_response(response)
+            response = " ".join(notes) if notes else self._generate_response(user_input)
+            return await self._finalize_response(response)
         
-        # 3. Action guardrails
-        action_result = self.guardrails.check_action(action, self.state)
-        
-        if action_result.action == GuardrailAction.ESCALATE:
-            raise EscalationRequired(
-                reason=action_result.reason,
-                details=action_result.metadata
-            )
-        
-        if not action_result.passed:
-            return AgentResponse(
-                content=action_result.message,
-                metadata={"blocked_by": "action_guardrail", "reason": action_result.reason}
-            )
+        limit = self.config.max_tool_calls_per_turn
+        if len(plan) > limit:
+            self.logger.info("plan_truncated", planned=len(plan), limit=limit)
+            notes.append(f"I can handle {limit} requests per message; "
+                         f"please ask again about the rest.")
+            plan = plan[:limit]  # Dependencies point backwards, so they stay valid
         
-        # 4. Execute action
-        try:
-            result = self._execute_action(action)
-            self.state.actions_taken.append({
-                "action": action.tool_name,
-                "parameters": action.parameters,
-                "result": result,
-                "timestamp": time.time()
-            })
+        # 3. Action guardrails, for every planned action before any runs
+        blocked = set()
+        approved = []
+        for i, action in enumerate(plan):
+            action_result = self.guardrails.check_action(action, self.state, approved)
             
-            # Track refunds
-            if action.tool_name == "process_refund":
-                self.state.refunds_processed += action.parameters.get("amount", 0)
+            if action_result.action == GuardrailAction.ESCALATE:
+                raise EscalationRequired(
+                    reason=action_result.reason,
+                    details=action_result.metadata
+                )
             
-        except Exception as e:
-            self.circuit_breakers.on_error(e)
+            if not action_result.passed:
+                if len(plan) == 1:
+                    return AgentResponse(
+                        content=action_result.message,
+                        metadata={"blocked_by": "action_guardrail", "reason": action_result.reason}
+                    )
+                blocked.add(i)
+                notes.append(action_result.message)
+            else:
+                approved.append(action)
+        
+        # 4. Execute actions, independent ones concurrently
+        outcomes = await self._run_plan(plan, blocked)
+        
+        failures = [o for o in outcomes if isinstance(o, Exception)]
+        for error in failures:
+            self.circuit_breakers.on_error(error)
+        completed = [(a, o) for a, o in zip(plan, outcomes) if isinstance(o, dict)]
+        if not completed:
+            if failures:
+                return AgentResponse(
+                    content="I encountered an issue processing that request. "
+                            "Let me try a different approach.",
+                    metadata={"error": str(failures[0])}
+                )
             return AgentResponse(
-                content="I encountered an issue processing that request. "
-                        "Let me try a different approach.",
-                metadata={"error": str(e)}
+                content=" ".join(notes),
+                metadata={"blocked_by": "action_guardrail"}
             )
+        if failures:
+            notes.append(f"I couldn't complete {len(plan) - len(completed)} of your requests; "
+                         f"let me try a different approach for those.")
         
-        # 5. Generate response based on result
-        response = self._generate_response_from_result(user_input, action, result)
+        # 5. Generate response based on results
+        response = " ".join(
+            [self._generate_response_from_result(user_input, action, result) for action, result in completed]
+            + notes
+        )
         
         # 6. Output guardrails
-        return self._finalize_response(response)
+        return await self._finalize_response(response)
     
-    def _determine_action(self, user_input: str) -> Optional[AgentAction]:
+    def _plan_actions(self, message: Union[str, PreprocessedInput], notes: Optional[list] = None) -> list:
         """
-        Determine what action to take based on user input.
+        Plan the actions a message asks for, with their dependencies.
         
         In production, this would use an LLM to reason about the input.
         This is a simplified rule-based version for demonstration.
+        
+        Args:
+            message: The user's message
+            notes: If given, receives a note for each part of the request
+                that could not be planned (e.g. refund amounts that can't be
+                matched to orders)
+        
+        Returns:
+            List of AgentAction; depends_on holds indices of earlier
+            actions that must succeed first (a refund waits for the lookup
+            of the same order)
         """
-        input_lower = user_input.lower()
-        
-        # Check for order lookup
-        order_match = re.search(r'ord-\d{8}', input_lower)
-        if order_match and ("status" in input_lower or "where" in input_lower or "order" in input_lower):
-            return AgentAction(
-                tool_name="lookup_order",
-                parameters={"order_id": order_match.group().upper()},
-                reasoning="User asking about order status"
-            )
+        message = _as_input(message)
+        input_lower = message.normalized
+        order_ids = list(dict.fromkeys(message.order_ids))
+        plan = []
+        lookups = {}
         
-        # Check for refund request
-        if "refund" in input_lower:
-            amount_match = re.search(r'\$?(\d+(?:\.\d{2})?)', user_input)
-            order_match = re.search(r'ord-\d{8}', input_lower)
-            
-            if amount_match and order_match:
-                return AgentAction(
+        # Order lookups
+        if order_ids and ("status" in input_lower or "where" in input_lower or "order" in input_lower):
+            for order_id in order_ids:
+                lookups[order_id] = len(plan)
+                plan.append(AgentAction(
+                    tool_name="lookup_order",
+                    parameters={"order_id": order_id},
+                    reasoning="User asking about order status"
+                ))
+        
+        # Refund requests: one per (order, amount) pair. "$20 for ORD-1 and $30
+        # for ORD-2" pairs them in order; any other mix is ambiguous, and a
+        # refund must never run for an amount or order the customer didn't
+        # give it, so ask instead of guessing.
+        if "refund" in input_lower and message.amounts and order_ids:
+            refunds = []
+            if len(message.order_ids) == len(message.amounts):
+                refunds = list(dict.fromkeys(zip(message.order_ids, message.amounts)))
+            elif notes is not None:
+                notes.append("Which amount should I refund for which order? "
+                             "Please write each refund as \"$20 for ORD-12345678\".")
+            for order_id, amount in refunds:
+                plan.append(AgentAction(
                     tool_name="process_refund",
                     parameters={
-                        "order_id": order_match.group().upper(),
-                        "amount": float(amount_match.group(1)),
+                        "order_id": order_id,
+                        "amount": amount,
                         "reason": "Customer requested refund"
                     },
-                    reasoning="User requesting refund"
-                )
+                    reasoning="User requesting refund",
+                    depends_on=[lookups[order_id]] if order_id in lookups else []
+                ))
         
-        # Check for escalation request
-        if any(phrase in input_lower for phrase in ["speak to", "talk to", "human", "person", "supervisor"]):
-            return AgentAction(
+        # Inventory checks
+        if message.product_ids and ("stock" in input_lower or "inventory" in input_lower):
+            for product_id in dict.fromkeys(message.product_ids):
+                plan.append(AgentAction(
+                    tool_name="check_inventory",
+                    parameters={"product_id": product_id},
+                    reasoning="User asking about availability"
+                ))
+        
+        # Escalation request (only when there is nothing else to do)
+        if not plan and any(phrase in input_lower for phrase in ["speak to", "talk to", "human", "person", "supervisor"]):
+            plan.append(AgentAction(
                 tool_name="escalate",
                 parameters={
                     "reason": "user_requested",
-                    "context": user_input
+                    "context": message.raw
                 },
                 reasoning="User requested human"
-            )
+            ))
+        
+        return plan
+    
+    async def _run_plan(self, plan: list, skip: set = frozenset()) -> list:
+        """
+        Execute a plan in dependency order, concurrently within each wave.
         
-        return None
+        Returns:
+            One outcome per action: its result dict, the exception it
+            raised, or None if it was skipped or a dependency did not succeed
+        """
+        outcomes: list = [None] * len(plan)
+        succeeded = set()
+        remaining = [i for i in range(len(plan)) if i not in skip]
+        while remaining:
+            ready = [i for i in remaining if all(d in succeeded for d in plan[i].depends_on)]
+            if not ready:
+                break  # The rest depend on actions that failed or were skipped
+            results = await asyncio.gather(*(self._execute_action(plan[i]) for i in ready),
+                                           return_exceptions=True)
+            for i, result in zip(ready, results):
+                if isinstance(result, BaseException) and not isinstance(result, Exception):
+                    raise result  # Cancellation, not a tool failure
+                outcomes[i] = result
+                if not isinstance(result, Exception):
+                    succeeded.add(i)
+                    self._record_action(plan[i], result)
+            remaining = [i for i in remaining if i not in ready]
+        return outcomes
+    
+    def _record_action(self, action: AgentAction, result: dict):
+        self.state.actions_taken.append({
+            "action": action.tool_name,
+            "parameters": action.parameters,
+            "result": result,
+            "timestamp": time.time()
+        })
+        
+        # Track refunds
+        if action.tool_name == "process_refund":
+            self.state.refunds_processed += action.parameters.get("amount", 0)
     
-    def _execute_action(self, action: AgentAction) -> dict:
-        """Execute a tool action."""
+    async def _execute_action(self, action: AgentAction) -> dict:
+        """Execute a tool action under the configured deadline."""
         self.state.tool_calls += 1
         
         tool_map = {
@@ -776,7 +1931,55 @@ class GuardedAgent:
         if not tool_fn:
             raise ValueError(f"Unknown tool: {action.tool_name}")
         
-        return tool_fn(**action.parameters)
+        return await self.tool_cache.get_or_call(
+            action.tool_name, action.parameters,
+            lambda: self._call_tool(action.tool_name, tool_fn, action.parameters)
+        )
+    
+    async def _call_tool(self, tool_name: str, tool_fn: Callable, parameters: dict) -> dict:
+        """One real backend call, under the deadline and recorded in tool_metrics."""
+        timeout = self.config.tool_timeout_seconds
+        outcome = "ok"
+        start = time.perf_counter()
+        try:
+            if inspect.iscoroutinefunction(tool_fn):
+                call = asyncio.ensure_future(tool_fn(**parameters))
+            else:
+                # A thread can't be interrupted: a timed-out sync call holds its
+                # worker until it returns, and the per-tool pool bound caps how
+                # many threads a hung backend can tie up
+                call = asyncio.get_running_loop().run_in_executor(
+                    self._executor_for(tool_name), functools.partial(tool_fn, **parameters)
+                )
+            # wait() rather than wait_for(): a TimeoutError the tool raises
+            # itself (e.g. a socket timeout) is its error, not a missed deadline
+            try:
+                done, _ = await asyncio.wait({call}, timeout=timeout)
+            finally:
+                if not call.done():
+                    call.cancel()  # Missed the deadline, or this turn was cancelled
+            if not done:
+                outcome = "timeout"
+                self.logger.warning("tool_timeout", tool=tool_name, timeout=timeout)
+                raise ToolTimeout(tool_name, timeout)
+            return call.result()
+        except ToolTimeout:
+            raise
+        except Exception:
+            outcome = "error"
+            raise
+        finally:
+            self.tool_metrics.record(tool_name, time.perf_counter() - start, outcome)
+    
+    def _executor_for(self, tool_name: str) -> ThreadPoolExecutor:
+        """The worker pool for one synchronous tool, created on first use."""
+        with self._executors_lock:
+            executor = self._tool_executors.get(tool_name)
+            if executor is None:
+                executor = self._tool_executors[tool_name] = ThreadPoolExecutor(
+                    max_workers=self.config.max_tool_workers, thread_name_prefix=f"tool-{tool_name}"
+                )
+            return executor
     
     def _generate_response(self, user_input: str) -> str:
         """Generate a response without tool use."""
@@ -798,6 +2001,11 @@ class GuardedAgent:
                 f"Total: ${result['total']:.2f}."
             )
         
+        if action.tool_name == "check_inventory":
+            if result['in_stock']:
+                return f"{result['product_id']} is in stock ({result['quantity']} available)."
+            return f"{result['product_id']} is currently out of stock."
+        
         if action.tool_name == "process_refund":
             return (
                 f"I've processed your refund of ${result['amount']:.2f}. "
@@ -814,19 +2022,20 @@ class GuardedAgent:
         
         return f"Action completed: {result}"
     
-    def _finalize_response(self, response: str) -> AgentResponse:
+    async def _finalize_response(self, response: str) -> AgentResponse:
         """Apply output guardrails and finalize response."""
-        output_result = self.guardrails.check_output(response)
+        output_result = await self.guardrails.acheck_output(response)
+        metadata = {
+            "turn": self.state.turn_count,
+            "tool_calls": self.state.tool_calls
+        }
         
         final_content = output_result.output if output_result.output else response
+        metadata["guardrail_triggers"] = len(self.state.guardrail_triggers)
         
         return AgentResponse(
             content=final_content,
-            metadata={
-                "turn": self.state.turn_count,
-                "tool_calls": self.state.tool_calls,
-                "guardrail_triggers": len(self.guardrails.triggers)
-            }
+            metadata=metadata
         )
     
     def _handle_circuit_breaker(self, error: CircuitBreakerTripped) -> AgentResponse:
@@ -908,15 +2117,14 @@ if __name__ == "__main__":
         print(f"Test {i}: {user_input}")
         print("-" * 40)
         
+        # Each test is its own conversation, so refund limits don't carry over
         response = agent.process(user_input, conversation_id=f"test-{i}")
         
         print(f"Response: {response.content}")
         print(f"Escalated: {response.escalated}")
         print(f"Metadata: {response.metadata}")
         print()
-        
-        # Reset for next test
-        agent.state = None
     
+    agent.close()
     print("=" * 60)
     print("Tests complete.")